@@ -1,11 +1,24 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional, AsyncGenerator
-from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, AsyncGenerator, Set
+from dataclasses import dataclass, field, asdict
 from datetime import datetime
+from string import Template
+from urllib.parse import urlencode, urljoin
 import asyncio
 import aiohttp
 import hashlib
+import json
 import logging
+import os
+import time
+
+from .executor import ParseExecutor, get_parse_executor
+from .extraction import FIELDS, SELECTOR_ALIASES, Extractor, merge_spec
+from .parsing import Node, ParserBackend, create_parser_backend
+from .structured import StructuredExtractor, find_items_path, iter_records
+from app.core.config import settings
+from app.services.deduplication_service import calculate_listing_state_hash
+from app.services.raw_archive_service import ArchivedPage, get_raw_archive
 
 logger = logging.getLogger(__name__)
 
@@ -39,16 +52,114 @@ class ListingEventDraft:
     in_stock: Optional[bool] = None
 
 
-class RuntimeContext:
-    """Контекст выполнения агента."""
+@dataclass
+class PageResult:
+    """Результат обработки одной полученной страницы."""
+    url: str
+    hash: Optional[str]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    unchanged: bool = False  # 304 или тот же хэш тела — parse() не вызывался
+    failed: bool = False  # parse() завершился ошибкой — валидаторы страницы не сохраняются
+    events: List[ListingEventDraft] = field(default_factory=list)
+
+
+def get_header(headers: Dict[str, str], name: str) -> Optional[str]:
+    """Получить заголовок без учета регистра имени."""
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+class RateLimiter:
+    """Ограничитель частоты запросов (token bucket: rps + burst)."""
+
+    def __init__(self, rps: Optional[float] = None, burst: int = 1):
+        self.interval = 1.0 / rps if rps else 0.0
+        self.burst = max(int(burst or 1), 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        """Дождаться разрешения на следующий запрос."""
+        if not self.interval:
+            return
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) / self.interval)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.interval)
 
-    def __init__(self, agent_id: str, config: Dict[str, Any], secrets: Dict[str, Any]):
+
+class RuntimeContext:
+    """
+    Контекст выполнения агента.
+
+    http_cache включает запись и воспроизведение HTTP ответов сессии агента
+    (кассета vcrpy в HTTP_CACHE_DIR/<agent_id>.json):
+        off        - обычные запросы
+        record     - записанные ответы воспроизводятся, новые запросы записываются
+        replay     - если кассета есть, только воспроизведение (новый запрос - ошибка),
+                     иначе все ответы записываются
+        cache_only - только воспроизведение, без сети (CI, бенчмарки)
+    В режимах кэша валидаторы прошлых обходов не используются, чтобы записанные
+    страницы всегда разбирались заново.
+    """
+
+    # Режим кэша -> record_mode vcrpy
+    HTTP_CACHE_MODES = {'record': 'new_episodes', 'replay': 'once', 'cache_only': 'none'}
+
+    def __init__(
+        self,
+        agent_id: str,
+        config: Dict[str, Any],
+        secrets: Dict[str, Any],
+        validators: Optional[Dict[str, Dict[str, Optional[str]]]] = None,
+        known_listings: Optional[Set[str]] = None,
+        http_cache: Optional[str] = None,
+        http_cache_dir: Optional[str] = None
+    ):
         self.agent_id = agent_id
         self.config = config
         self.secrets = secrets
+        self.http_cache = http_cache or settings.HTTP_CACHE_MODE
+        self.http_cache_dir = http_cache_dir or settings.HTTP_CACHE_DIR
+        if self.http_cache != 'off' and self.http_cache not in self.HTTP_CACHE_MODES:
+            raise ValueError(f"Unknown HTTP cache mode: {self.http_cache}")
+        # Валидаторы предыдущих обходов: url -> {'etag', 'last_modified', 'hash'}
+        self.validators = (validators or {}) if self.http_cache == 'off' else {}
+        # Хэши состояний уже известных листингов (для раннего останова пагинации)
+        self.known_listings = known_listings or set()
         self.session: Optional[aiohttp.ClientSession] = None
+        self._cassette = None
+
+    @property
+    def cassette_path(self) -> str:
+        """Файл кассеты HTTP кэша агента."""
+        return os.path.join(self.http_cache_dir, f"{self.agent_id}.json")
 
     async def __aenter__(self):
+        if self.http_cache != 'off':
+            import vcr
+
+            # vcrpy подменяет запросы aiohttp на время работы кассеты
+            self._cassette = vcr.VCR(
+                serializer='json',
+                record_mode=self.HTTP_CACHE_MODES[self.http_cache],
+                match_on=['method', 'uri', 'body'],
+                filter_headers=['authorization', 'cookie', 'set-cookie'],
+                decode_compressed_response=True
+            ).use_cassette(self.cassette_path, allow_playback_repeats=True)
+            self._cassette.__enter__()
+
         self.session = aiohttp.ClientSession(
             timeout=aiohttp.ClientTimeout(total=30),
             headers={'User-Agent': 'BoardGamesMonitor/1.0'}
@@ -58,6 +169,9 @@ class RuntimeContext:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         if self.session:
             await self.session.close()
+        if self._cassette is not None:
+            self._cassette.__exit__(exc_type, exc_val, exc_tb)
+            self._cassette = None
 
 
 class BaseAgent(ABC):
@@ -65,6 +179,8 @@ class BaseAgent(ABC):
 
     TYPE = "html"  # 'api' | 'html' | 'headless' | 'telegram_public'
     CONFIG_SCHEMA: Dict[str, Any] = {}
+    # Спецификация декларативного извлечения (см. extraction.py)
+    EXTRACTION: Optional[Dict[str, Any]] = None
 
     def __init__(self, config: Dict[str, Any], secrets: Dict[str, Any], ctx: RuntimeContext):
         self.config = config
@@ -72,6 +188,112 @@ class BaseAgent(ABC):
         self.ctx = ctx
         self.rate_limit = config.get('rate_limit', {})
         self.schedule = config.get('schedule', {})
+        self.pages: List[PageResult] = []
+        self.conditional_fetch = config.get('conditional_fetch', True)
+        # Без сети (cache_only) ограничивать частоту запросов незачем
+        self.rate_limiter = RateLimiter(
+            self.rate_limit.get('rps') if ctx.http_cache != 'cache_only' else None,
+            self.rate_limit.get('burst', 1)
+        )
+        self._parser: Optional[ParserBackend] = None
+        self._extractor: Optional[Extractor] = None
+        self._structured: Optional[StructuredExtractor] = None
+        self._parse_tasks: Dict[str, asyncio.Task] = {}
+        # Изменения config, найденные во время запуска; сохраняются в SourceAgent.config
+        self.config_updates: Dict[str, Any] = {}
+
+    @property
+    def parser(self) -> ParserBackend:
+        """Бэкенд разбора HTML (config['parser'], по умолчанию lxml)."""
+        if self._parser is None:
+            self._parser = create_parser_backend(self.config.get('parser'))
+        return self._parser
+
+    def soup(self, fetched: Fetched) -> Node:
+        """Разобрать тело страницы выбранным бэкендом."""
+        return self.parser.parse(fetched.body)
+
+    def extraction_spec(self) -> Optional[Dict[str, Any]]:
+        """
+        Спецификация извлечения: EXTRACTION класса, дополненная config['extract'].
+
+        Ключи config['selectors'] (item, title, price, ...) переопределяют
+        селекторы спецификации, как и раньше переопределяли селекторы parse().
+        """
+        if not self.EXTRACTION and not self.config.get('extract'):
+            return None
+
+        spec = merge_spec(self.EXTRACTION, self.config.get('extract'))
+        for key, selector in (self.config.get('selectors') or {}).items():
+            key = SELECTOR_ALIASES.get(key, key)
+            if key == 'item':
+                spec['item'] = selector
+            elif key in FIELDS:
+                spec['fields'][key] = selector
+
+        return spec if spec.get('item') else None
+
+    @property
+    def extractor(self) -> Optional[Extractor]:
+        """Скомпилированный исполнитель спецификации извлечения."""
+        if self._extractor is None:
+            spec = self.extraction_spec()
+            if spec:
+                self._extractor = Extractor(spec, self.parser)
+        return self._extractor
+
+    def structured_spec(self) -> Optional[Dict[str, Any]]:
+        """
+        Настройки извлечения из структурированных данных (config['structured']).
+
+        Агенту без спецификации извлечения включено по умолчанию ("structured":
+        false отключает). Агенту с CSS спецификацией - только по явному
+        "structured": true или блоку настроек: структурированные данные
+        заменяют разбор всей страницы, а kind_keywords, in_stock и прочие
+        правила спецификации к ним не применяются. store_id, base_url и
+        default_kind берутся из спецификации извлечения.
+        """
+        extraction = self.extraction_spec() or {}
+        options = self.config.get('structured', not extraction)
+        if not options:
+            return None
+
+        spec = dict(options) if isinstance(options, dict) else {}
+        for key in ('store_id', 'base_url', 'default_kind'):
+            spec.setdefault(key, extraction.get(key) or self.config.get(key))
+        spec['store_id'] = spec['store_id'] or self.ctx.agent_id
+        return spec
+
+    @property
+    def structured(self) -> Optional[StructuredExtractor]:
+        """Извлечение из JSON-LD, microdata и встроенного состояния страницы."""
+        if self._structured is None:
+            spec = self.structured_spec()
+            if spec is not None:
+                self._structured = StructuredExtractor(spec)
+        return self._structured
+
+    async def extract(self, fetched: Fetched) -> AsyncGenerator[ListingEventDraft, None]:
+        """
+        Извлечь события из HTML страницы.
+
+        Сначала без построения DOM ищутся структурированные данные (JSON-LD,
+        microdata, __NEXT_DATA__, window.__INITIAL_STATE__); если товаров в них
+        нет, страница разбирается по спецификации EXTRACTION / config['extract'].
+        """
+        if self.structured is not None:
+            drafts = self.structured.extract(fetched.body)
+            if drafts:
+                for draft in drafts:
+                    yield draft
+                return
+
+        extractor = self.extractor
+        if extractor is None:
+            raise NotImplementedError(f"{type(self).__name__} has no extraction spec")
+
+        for draft in extractor.extract(self.soup(fetched)):
+            yield draft
 
     @abstractmethod
     async def fetch(self) -> AsyncGenerator[Fetched, None]:
@@ -97,19 +319,141 @@ class BaseAgent(ABC):
         pass
 
     async def run(self) -> List[ListingEventDraft]:
-        """Запустить агента и вернуть все найденные события."""
-        events = []
+        """
+        Запустить агента и вернуть все найденные события.
+
+        Страницы разбираются исполнителем разбора (пул процессов) параллельно с
+        загрузкой следующих; если в очереди на разбор уже max_pending страниц,
+        загрузка ждет.
+        """
+        executor = get_parse_executor()
+        slots = asyncio.Semaphore(executor.max_pending)
+        self._parse_tasks = {}
+        archive = get_raw_archive()
+        store_id = self.archive_store_id()
 
         async with self.ctx:
             async for fetched in self.fetch():
-                try:
-                    async for event in self.parse(fetched):
-                        events.append(event)
-                except Exception as e:
-                    logger.error(f"Error parsing {fetched.url}: {e}")
+                previous = self.ctx.validators.get(fetched.url, {})
+                page = PageResult(
+                    url=fetched.url,
+                    hash=previous.get('hash') if fetched.status == 304 else fetched.hash,
+                    etag=get_header(fetched.headers, 'ETag') or previous.get('etag'),
+                    last_modified=get_header(fetched.headers, 'Last-Modified') or previous.get('last_modified')
+                )
+                self.pages.append(page)
+
+                if archive is not None and fetched.status == 200:
+                    archive.submit(ArchivedPage(
+                        agent_id=self.ctx.agent_id,
+                        store_id=store_id,
+                        url=fetched.url,
+                        hash=fetched.hash,
+                        body=fetched.body,
+                        fetched_at=fetched.fetched_at
+                    ))
+
+                # Страница не изменилась с прошлого обхода — парсить нечего
+                if fetched.status == 304 or (
+                    self.conditional_fetch and page.hash == previous.get('hash')
+                ):
+                    page.unchanged = True
                     continue
 
-        return events
+                await slots.acquire()
+                self._parse_tasks[fetched.url] = asyncio.create_task(
+                    self._parse_page(executor, fetched, page, slots)
+                )
+
+            await asyncio.gather(*self._parse_tasks.values())
+
+        if self._extractor is not None and self._extractor.stats['pages']:
+            throughput = self._extractor.throughput()
+            logger.info(
+                f"Agent {self.ctx.agent_id} extracted {self._extractor.stats['items']} items "
+                f"from {self._extractor.stats['pages']} pages: "
+                f"{throughput['cards_per_sec']:.0f} cards/s, {throughput['items_per_sec']:.0f} items/s"
+            )
+
+        return [event for page in self.pages for event in page.events]
+
+    def archive_store_id(self) -> str:
+        """Магазин, словарем которого сжимаются страницы агента в архиве."""
+        return (self.extraction_spec() or {}).get('store_id') or self.config.get('store_id') or self.ctx.agent_id
+
+    async def _parse_page(self, executor: ParseExecutor, fetched: Fetched, page: PageResult, slots: asyncio.Semaphore):
+        """Разобрать страницу и сохранить события в ее PageResult."""
+        try:
+            page.events.extend(await executor.parse(self, fetched))
+        except Exception as e:
+            page.failed = True
+            logger.error(f"Error parsing {fetched.url}: {e}")
+        finally:
+            slots.release()
+
+    async def wait_parsed(self, url: str):
+        """Дождаться разбора страницы url, если он еще идет."""
+        task = self._parse_tasks.get(url)
+        if task is not None:
+            await task
+
+    async def _fetch_page(
+        self,
+        url: str,
+        method: str = 'GET',
+        params: Optional[Dict[str, Any]] = None,
+        json_body: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        data: Optional[str] = None
+    ) -> Optional[Fetched]:
+        """Загрузить одну страницу с учетом rate limiting и условных заголовков."""
+        if params:
+            url = f"{url}{'&' if '?' in url else '?'}{urlencode(params)}"
+
+        await self.rate_limiter.wait()
+
+        try:
+            request_headers = {**(headers or {}), **self.conditional_headers(url)}
+            async with self.ctx.session.request(
+                method, url, headers=request_headers, json=json_body, data=data
+            ) as response:
+                if response.status == 304:
+                    return Fetched(
+                        url=url,
+                        status=response.status,
+                        body='',
+                        headers=dict(response.headers),
+                        fetched_at=datetime.now()
+                    )
+                elif response.status == 200:
+                    body = await response.text()
+                    return Fetched(
+                        url=url,
+                        status=response.status,
+                        body=body,
+                        headers=dict(response.headers),
+                        fetched_at=datetime.now()
+                    )
+                else:
+                    logger.warning(f"Failed to fetch {url}: {response.status}")
+
+        except Exception as e:
+            logger.error(f"Error fetching {url}: {e}")
+
+        return None
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Заголовки условного запроса по валидаторам прошлого обхода."""
+        if not self.conditional_fetch:
+            return {}
+
+        validators = self.ctx.validators.get(url, {})
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
 
     def validate_config(self) -> bool:
         """Проверить конфигурацию агента."""
@@ -126,42 +470,206 @@ class HTMLAgent(BaseAgent):
         super().__init__(*args, **kwargs)
         self.selectors = self.config.get('selectors', {})
         self.start_urls = self.config.get('start_urls', [])
+        self.pagination = self.config.get('pagination') or {}
+
+    async def parse(self, fetched: Fetched) -> AsyncGenerator[ListingEventDraft, None]:
+        """Извлечь события из структурированных данных или по спецификации."""
+        async for draft in self.extract(fetched):
+            yield draft
 
     async def fetch(self) -> AsyncGenerator[Fetched, None]:
         """Получить HTML страницы."""
         for url in self.start_urls:
-            try:
-                async with self.ctx.session.get(url) as response:
-                    if response.status == 200:
-                        body = await response.text()
-                        yield Fetched(
-                            url=url,
-                            status=response.status,
-                            body=body,
-                            headers=dict(response.headers),
-                            fetched_at=datetime.now()
-                        )
-                    else:
-                        logger.warning(f"Failed to fetch {url}: {response.status}")
-
-                # Учитываем rate limiting
-                if 'rps' in self.rate_limit:
-                    await asyncio.sleep(1.0 / self.rate_limit['rps'])
-
-            except Exception as e:
-                logger.error(f"Error fetching {url}: {e}")
-                continue
+            if self.pagination:
+                async for fetched in self._fetch_paginated(url):
+                    yield fetched
+            else:
+                fetched = await self._fetch_page(url)
+                if fetched:
+                    yield fetched
+
+    async def _fetch_paginated(self, start_url: str) -> AsyncGenerator[Fetched, None]:
+        """
+        Обойти страницы каталога начиная со start_url.
+
+        Следующие страницы берутся по шаблону URL (загружаются пачками по
+        `concurrency` страниц) либо по ссылке из селектора `next`.
+        Обход останавливается на странице без изменений или без новых товаров.
+        """
+        options = self.pagination
+        max_pages = int(options.get('max_pages', self.config.get('max_pages', 10)))
+
+        template = options.get('template')
+        if template:
+            concurrency = max(int(options.get('concurrency', 2)), 1)
+            page_number = 1
+            while page_number <= max_pages:
+                numbers = range(page_number, min(page_number + concurrency, max_pages + 1))
+                urls = [
+                    start_url if number == 1 else template.format(url=start_url, page=number)
+                    for number in numbers
+                ]
+                batch = await asyncio.gather(*(self._fetch_page(url) for url in urls))
+
+                # Ошибка или страница за концом каталога
+                exhausted = any(fetched is None for fetched in batch)
+                batch = [fetched for fetched in batch if fetched is not None]
+                for fetched in batch:
+                    yield fetched
+
+                # Страницы пачки разбираются параллельно; решение — после разбора всех
+                for fetched in batch:
+                    exhausted = await self._is_exhausted(fetched.url) or exhausted
+
+                if exhausted:
+                    return
+                page_number += concurrency
+            return
+
+        next_selector = options.get('next')
+        url = start_url
+        visited = set()
+        for _ in range(max_pages):
+            fetched = await self._fetch_page(url)
+            if fetched is None:
+                return
+
+            visited.add(url)
+            yield fetched
+            if await self._is_exhausted(url) or not next_selector:
+                return
+
+            next_url = self._find_next_url(fetched, next_selector)
+            if not next_url or next_url in visited:
+                return
+            url = next_url
+
+    def _find_next_url(self, fetched: Fetched, selector: str) -> Optional[str]:
+        """Найти ссылку на следующую страницу."""
+        link = self.soup(fetched).select_one(selector)
+        if link is None or not link.get('href'):
+            return None
+        return urljoin(fetched.url, link.get('href'))
+
+    async def _is_exhausted(self, url: str) -> bool:
+        """
+        Можно ли прекратить пагинацию после страницы url.
+
+        Да, если страница не изменилась, пуста или (при stop_on_seen)
+        содержит только товары, уже известные в том же состоянии.
+        """
+        await self.wait_parsed(url)
+        page = next((page for page in reversed(self.pages) if page.url == url), None)
+        if page is None:
+            # fetch() используется без run() — результатов разбора нет
+            return False
+
+        if page.unchanged or not page.events:
+            return True
+
+        if not self.pagination.get('stop_on_seen', True):
+            return False
+
+        known = self.ctx.known_listings
+        return all(
+            calculate_listing_state_hash(asdict(event)) in known
+            for event in page.events
+        )
 
 
 class Agent(BaseAgent):
-    """Агент для работы с API."""
+    """
+    Агент для работы с JSON API.
+
+    Товары из ответа берутся по config['items_path'] и приводятся к событиям
+    картой config['fields'] (пути к полям записи), как и встроенное состояние
+    HTML страниц.
+    """
 
     TYPE = "api"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.api_base_url = self.config.get('api_base_url', '')
+        self.endpoints = self.config.get('endpoints') or [
+            {'path': url} for url in self.config.get('start_urls', [])
+        ]
+        self.pagination = self.config.get('pagination') or {}
+        self.headers = {
+            'Accept': 'application/json',
+            **{
+                name: Template(str(value)).safe_substitute(self.secrets)
+                for name, value in (self.config.get('headers') or {}).items()
+            }
+        }
+
+    def structured_spec(self) -> Optional[Dict[str, Any]]:
+        """Путь к списку товаров и карта полей ответа API."""
+        spec = {
+            key: self.config[key]
+            for key in ('items_path', 'fields', 'store_id', 'base_url', 'default_kind')
+            if self.config.get(key)
+        }
+        spec.setdefault('store_id', self.ctx.agent_id)
+        return spec
+
     async def fetch(self) -> AsyncGenerator[Fetched, None]:
         """Получить данные из API."""
-        # TODO: Implement API fetching logic
-        pass
+        for endpoint in self.endpoints:
+            url = endpoint['path']
+            if not url.startswith('http'):
+                url = urljoin(self.api_base_url.rstrip('/') + '/', url.lstrip('/'))
+
+            async for fetched in self._fetch_endpoint(url, endpoint):
+                yield fetched
+
+    async def _fetch_endpoint(self, url: str, endpoint: Dict[str, Any]) -> AsyncGenerator[Fetched, None]:
+        """
+        Обойти страницы одного эндпоинта.
+
+        pagination.type: 'offset' (offset/limit) или 'page' (номер страницы).
+        Обход прекращается на неполной, пустой или неизменившейся странице.
+        """
+        method = endpoint.get('method', 'GET').upper()
+        base_params = dict(endpoint.get('params') or {})
+        pagination_type = self.pagination.get('type')
+        page_size = int(self.pagination.get('page_size', 100))
+        max_pages = int(self.pagination.get('max_pages', 1)) if pagination_type else 1
+
+        for number in range(max_pages):
+            params = dict(base_params)
+            if pagination_type == 'offset':
+                params[self.pagination.get('offset_param', 'offset')] = number * page_size
+                params[self.pagination.get('limit_param', 'limit')] = page_size
+            elif pagination_type == 'page':
+                params[self.pagination.get('page_param', 'page')] = number + 1
+                params.setdefault(self.pagination.get('limit_param', 'limit'), page_size)
+
+            if method == 'GET':
+                fetched = await self._fetch_page(url, params=params, headers=self.headers)
+            else:
+                body = {**(endpoint.get('json') or {}), **params}
+                fetched = await self._fetch_page(url, method=method, json_body=body, headers=self.headers)
+            if fetched is None:
+                return
+            yield fetched
+
+            # Результаты разбора есть, только если fetch() вызван из run()
+            await self.wait_parsed(fetched.url)
+            page = next((page for page in reversed(self.pages) if page.url == fetched.url), None)
+            if page is not None and (page.unchanged or len(page.events) < page_size):
+                return
+
+    async def parse(self, fetched: Fetched) -> AsyncGenerator[ListingEventDraft, None]:
+        """Извлечь события из JSON ответа."""
+        try:
+            data = json.loads(fetched.body)
+        except ValueError as e:
+            logger.error(f"Invalid JSON from {fetched.url}: {e}")
+            return
+
+        for draft in self.structured.map_records(data):
+            yield draft
 
 
 class HeadlessAgent(BaseAgent):
@@ -174,53 +682,198 @@ class HeadlessAgent(BaseAgent):
         self.start_urls = self.config.get('start_urls', [])
         self.selectors = self.config.get('selectors', {})
         self.wait_for = self.config.get('wait_for', None)
+        self.wait_until = self.config.get('wait_until', 'domcontentloaded')
         self.screenshot = self.config.get('screenshot', False)
+        self.concurrency = int(self.config.get('concurrency') or settings.HEADLESS_CONCURRENCY)
+        self.page_timings: List['PageTiming'] = []
+        # Обнаружение API: JSON ответы XHR страницы сохраняются как шаблоны запросов
+        self.api_discovery = bool(self.config.get('api_discovery', False))
+        self.api_min_items = int(self.config.get('api_min_items', 3))
+        self.api_templates: List[Dict[str, Any]] = list(self.config.get('api_templates') or [])
+        self._api_items_paths = {template['url']: template.get('items_path') or '' for template in self.api_templates}
+        self._api_extractor: Optional[StructuredExtractor] = None
+
+    def render_options(self) -> 'RenderOptions':
+        """Параметры загрузки страниц из config агента."""
+        from .browser import RenderOptions
+
+        options = RenderOptions(
+            wait_until=self.wait_until,
+            wait_for=self.wait_for,
+            screenshot=self.screenshot
+        )
+        item = (self.extraction_spec() or {}).get('item')
+        if not self.wait_for and item:
+            # Без явного wait_for страница готова, когда появились карточки товаров
+            options.wait_for = item
+
+        if self.config.get('user_agent'):
+            options.user_agent = self.config['user_agent']
+        if self.config.get('viewport'):
+            options.viewport = self.config['viewport']
+        if 'block_resources' in self.config:
+            options.block_resource_types = tuple(self.config['block_resources'] or ())
+        if 'block_hosts' in self.config:
+            options.block_hosts = tuple(self.config['block_hosts'] or ())
+        options.block_third_party = bool(self.config.get('block_third_party', False))
+        options.allow_hosts = tuple(self.config.get('allow_hosts') or ())
+
+        scroll = self.config.get('scroll')
+        if scroll:
+            options.scroll = dict(scroll)
+            options.scroll.setdefault('item', options.wait_for)
+            if not options.scroll['item']:
+                logger.warning(f"Agent {self.ctx.agent_id}: scroll needs an item selector, disabled")
+                options.scroll = None
+        return options
+
+    @property
+    def api_extractor(self) -> StructuredExtractor:
+        """Приведение ответов найденного API к черновикам событий."""
+        if self._api_extractor is None:
+            self._api_extractor = self.structured or StructuredExtractor({'store_id': self.ctx.agent_id})
+        return self._api_extractor
+
+    async def parse(self, fetched: Fetched) -> AsyncGenerator[ListingEventDraft, None]:
+        """Извлечь события из ответа API, структурированных данных или по спецификации."""
+        items_path = self._api_items_paths.get(fetched.url)
+        if items_path is not None:
+            for draft in self.api_extractor.map_records(json.loads(fetched.body), items_path):
+                yield draft
+            return
+
+        async for draft in self.extract(fetched):
+            yield draft
 
     async def fetch(self) -> AsyncGenerator[Fetched, None]:
-        """Получить HTML через Playwright."""
-        from playwright.async_api import async_playwright
-
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context(
-                user_agent='BoardGamesMonitor/1.0',
-                viewport={'width': 1920, 'height': 1080}
-            )
+        """
+        Получить данные страниц: через сохраненные шаблоны API или браузером.
 
-            for url in self.start_urls:
-                try:
-                    page = await context.new_page()
-                    await page.goto(url, wait_until='networkidle')
+        Если у страницы есть шаблоны запросов API, они повторяются обычным
+        HTTP. Страница загружается браузером, если шаблонов нет или повтор не
+        удался (ошибка, не JSON, нет товаров); при включенном api_discovery
+        шаблоны страницы при этом находятся заново.
+        """
+        by_page: Dict[str, List[Dict[str, Any]]] = {}
+        for template in self.api_templates:
+            by_page.setdefault(template['page_url'], []).append(template)
 
-                    # Ждем появления элементов если нужно
-                    if self.wait_for:
-                        await page.wait_for_selector(self.wait_for, timeout=10000)
+        browser_urls = []
+        for url in self.start_urls:
+            templates = by_page.get(url)
+            if not templates:
+                browser_urls.append(url)
+                continue
 
-                    # Делаем скриншот если нужно
-                    if self.screenshot:
-                        screenshot_path = f"screenshot_{int(datetime.now().timestamp())}.png"
-                        await page.screenshot(path=screenshot_path)
-                        logger.info(f"Screenshot saved: {screenshot_path}")
+            replayed = []
+            for template in templates:
+                fetched = await self._replay(template)
+                if fetched is None:
+                    break
+                replayed.append(fetched)
+            else:
+                for fetched in replayed:
+                    yield fetched
+                continue
 
-                    # Получаем HTML
-                    body = await page.content()
+            logger.warning(f"API replay for {url} failed, falling back to browser")
+            browser_urls.append(url)
 
-                    yield Fetched(
-                        url=url,
-                        status=200,
-                        body=body,
-                        headers={},  # Playwright headers are complex
-                        fetched_at=datetime.now()
-                    )
+        async for fetched in self._render_pages(browser_urls):
+            yield fetched
+
+    async def _replay(self, template: Dict[str, Any]) -> Optional[Fetched]:
+        """Повторить запрос API по шаблону; None, если ответ не похож на каталог."""
+        fetched = await self._fetch_page(
+            template['url'],
+            method=template.get('method', 'GET'),
+            headers=template.get('headers'),
+            data=template.get('body')
+        )
+        if fetched is None or fetched.status == 304:
+            return fetched
+
+        try:
+            data = json.loads(fetched.body)
+        except ValueError:
+            logger.warning(f"API replay {template['url']} returned non-JSON response")
+            return None
+
+        if next(iter_records(data, template.get('items_path')), None) is None:
+            logger.warning(f"API replay {template['url']} returned no items")
+            return None
+        return fetched
+
+    def _discover_api(self, page_url: str, captured: List['CapturedResponse']):
+        """Заменить шаблоны API страницы найденными в ее JSON ответах."""
+        templates = []
+        seen = set()
+        for response in captured:
+            found = find_items_path(response.data)
+            key = (response.method, response.url, response.post_data)
+            if not found or found[1] < self.api_min_items or key in seen:
+                continue
+            seen.add(key)
+            templates.append({
+                'page_url': page_url,
+                'url': response.url,
+                'method': response.method,
+                'headers': response.headers,
+                'body': response.post_data,
+                'items_path': found[0],
+            })
+
+        updated = [template for template in self.api_templates if template['page_url'] != page_url] + templates
+        if updated != self.api_templates:
+            logger.info(f"Agent {self.ctx.agent_id}: {len(templates)} API endpoints discovered on {page_url}")
+            self.api_templates = updated
+            self.config_updates['api_templates'] = updated
+
+    async def _render_pages(self, urls: List[str]) -> AsyncGenerator[Fetched, None]:
+        """
+        Получить HTML через общий пул браузера.
+
+        Страницы загружаются параллельно (не больше `concurrency`) в
+        изолированном контексте агента и с учетом rate limiting.
+        """
+        if not urls:
+            return
 
-                    await page.close()
+        from .browser import get_browser_pool
+        from app.metrics import MetricsCollector
 
-                    # Учитываем rate limiting
-                    if 'rps' in self.rate_limit:
-                        await asyncio.sleep(1.0 / self.rate_limit['rps'])
+        pool = get_browser_pool()
+        options = self.render_options()
+        options.capture_json = self.api_discovery
+        slots = asyncio.Semaphore(max(self.concurrency, 1))
 
+        async def render(url: str) -> Optional[Fetched]:
+            async with slots:
+                await self.rate_limiter.wait()
+                try:
+                    fetched, timing, captured = await pool.render(self.ctx.agent_id, url, options)
                 except Exception as e:
                     logger.error(f"Error fetching {url} with Playwright: {e}")
-                    continue
-
-            await browser.close()
\ No newline at end of file
+                    return None
+
+                if options.capture_json:
+                    self._discover_api(url, captured)
+                self.page_timings.append(timing)
+                MetricsCollector.record_headless_page(self.ctx.agent_id, timing)
+                logger.info(
+                    f"Rendered {url}: dom {timing.dom_ms:.0f}ms, wait {timing.wait_ms:.0f}ms, "
+                    f"scroll {timing.scroll_ms:.0f}ms, total {timing.total_ms:.0f}ms, "
+                    f"requests {timing.requests}, blocked {timing.blocked}"
+                    + (f", items {timing.items}" if timing.items is not None else "")
+                )
+                return fetched
+
+        tasks = [asyncio.create_task(render(url)) for url in urls]
+        try:
+            for completed in asyncio.as_completed(tasks):
+                fetched = await completed
+                if fetched is not None:
+                    yield fetched
+        finally:
+            for task in tasks:
+                task.cancel()
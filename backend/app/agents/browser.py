@@ -0,0 +1,475 @@
+"""
+Общий пул браузера Playwright для headless агентов.
+
+Chromium запускается один раз на процесс воркера и живет в отдельном потоке со
+своим циклом событий: каждый запуск агента выполняется в новом цикле событий,
+а объекты Playwright привязаны к циклу, в котором созданы. Агенты получают
+страницы через render(), который выполняется в потоке пула.
+
+Каждый агент работает в своем изолированном контексте браузера (cookies,
+кэш, localStorage). Контекст пересоздается после HEADLESS_CONTEXT_MAX_PAGES
+страниц, а браузер - если процессы Chromium заняли больше
+HEADLESS_MAX_MEMORY_MB памяти.
+
+Запросы страницы перехватываются: картинки, шрифты, медиа, счетчики и реклама
+не загружаются. Загрузка считается завершенной на DOMContentLoaded и появлении
+селектора wait_for (а не на networkidle); для каталогов с бесконечной прокруткой
+страница прокручивается, пока не наберется нужное число товаров.
+
+С capture_json пул запоминает JSON ответы XHR/fetch страницы вместе с
+запросами: по ним HeadlessAgent находит API магазина и в следующих запусках
+обходится без браузера.
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+from .base import Fetched
+
+logger = logging.getLogger(__name__)
+
+# Проверять память браузера раз в столько страниц
+MEMORY_CHECK_EVERY = 10
+
+DEFAULT_BLOCKED_RESOURCES = ('image', 'media', 'font')
+
+# Заголовки запроса, которые переносятся в шаблон API (без cookies и служебных)
+REPLAY_HEADERS = ('accept', 'content-type', 'x-requested-with', 'referer')
+
+# Ответы XHR больше этого размера не запоминаются
+MAX_CAPTURED_BYTES = 5 * 1024 * 1024
+
+# Аналитика и реклама, которые не влияют на содержимое каталога
+DEFAULT_BLOCKED_HOSTS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'googlesyndication.com',
+    'mc.yandex.ru',
+    'an.yandex.ru',
+    'top-fwz1.mail.ru',
+    'connect.facebook.net',
+    'vk.com',
+    'hotjar.com',
+    'criteo.com',
+    'jivosite.com',
+)
+
+
+@dataclass
+class RenderOptions:
+    """Параметры загрузки одной страницы."""
+
+    wait_until: str = 'domcontentloaded'
+    wait_for: Optional[str] = None
+    wait_for_timeout: int = 10000
+    timeout: int = 30000
+    screenshot: bool = False
+    user_agent: str = 'BoardGamesMonitor/1.0'
+    viewport: Dict[str, int] = field(default_factory=lambda: {'width': 1920, 'height': 1080})
+    block_resource_types: Tuple[str, ...] = DEFAULT_BLOCKED_RESOURCES
+    block_hosts: Tuple[str, ...] = DEFAULT_BLOCKED_HOSTS
+    block_third_party: bool = False
+    allow_hosts: Tuple[str, ...] = ()
+    # {"item": ".product", "min_items": 100, "max_scrolls": 20, "timeout": 3000}
+    scroll: Optional[Dict[str, Any]] = None
+    capture_json: bool = False
+
+
+@dataclass
+class PageTiming:
+    """Время этапов загрузки страницы (мс) и счетчики запросов."""
+
+    url: str
+    dom_ms: float = 0.0
+    wait_ms: float = 0.0
+    scroll_ms: float = 0.0
+    content_ms: float = 0.0
+    total_ms: float = 0.0
+    requests: int = 0
+    blocked: int = 0
+    items: Optional[int] = None
+
+
+@dataclass
+class CapturedResponse:
+    """JSON ответ XHR/fetch страницы и запрос, которым он получен."""
+
+    url: str
+    method: str
+    headers: Dict[str, str]
+    post_data: Optional[str]
+    data: Any
+
+
+class RenderResult(NamedTuple):
+    """Результат загрузки страницы браузером."""
+
+    fetched: Fetched
+    timing: PageTiming
+    captured: List[CapturedResponse]
+
+
+def _host_matches(host: str, patterns) -> bool:
+    return any(host == pattern or host.endswith('.' + pattern) for pattern in patterns)
+
+
+def _site(host: str) -> str:
+    """Приближение регистрируемого домена: два последних уровня."""
+    return '.'.join(host.split('.')[-2:])
+
+
+def should_block(resource_type: str, url: str, page_host: str, options: RenderOptions) -> bool:
+    """Нужно ли отменить запрос страницы."""
+    if resource_type == 'document':
+        return False
+    if resource_type in options.block_resource_types:
+        return True
+
+    host = urlsplit(url).hostname or ''
+    if not host or _host_matches(host, options.allow_hosts):
+        return False
+    if _host_matches(host, options.block_hosts):
+        return True
+    return options.block_third_party and _site(host) != _site(page_host)
+
+
+@dataclass
+class _ContextSlot:
+    """Контекст браузера одного агента и счетчики для его пересоздания."""
+
+    context: Any
+    browser: Any
+    pages_served: int = 0
+    active: int = 0
+    retired: bool = False
+
+
+class BrowserPool:
+    """Долгоживущий Chromium с изолированными контекстами для агентов."""
+
+    def __init__(self, context_max_pages: int = 50, max_memory_mb: int = 1024):
+        self.context_max_pages = context_max_pages
+        self.max_memory_mb = max_memory_mb
+        self.pid = os.getpid()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+        # Состояние ниже используется только из потока пула
+        self._playwright = None
+        self._browser = None
+        self._browser_lock: Optional[asyncio.Lock] = None
+        self._slots_lock: Optional[asyncio.Lock] = None
+        self._slots: Dict[Tuple, _ContextSlot] = {}
+        self._retired: List[_ContextSlot] = []
+        self._pages_since_check = 0
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._thread_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name='browser-pool', daemon=True)
+                self._thread.start()
+                self._loop = loop
+                atexit.register(self.close)
+        return self._loop
+
+    async def render(self, key: str, url: str, options: RenderOptions) -> RenderResult:
+        """Загрузить страницу в контексте агента key (из любого цикла событий)."""
+        future = asyncio.run_coroutine_threadsafe(self._render(key, url, options), self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    async def _get_browser(self):
+        if self._browser_lock is None:
+            self._browser_lock = asyncio.Lock()
+
+        async with self._browser_lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._playwright is None:
+                    from playwright.async_api import async_playwright
+
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True)
+                logger.info("Browser pool started Chromium")
+            return self._browser
+
+    async def _acquire_slot(self, key: str, options: RenderOptions) -> _ContextSlot:
+        browser = await self._get_browser()
+        slot_key = (key, options.user_agent, tuple(sorted(options.viewport.items())))
+
+        if self._slots_lock is None:
+            self._slots_lock = asyncio.Lock()
+
+        async with self._slots_lock:
+            slot = self._slots.get(slot_key)
+            if slot is None or slot.retired or slot.browser is not browser:
+                if slot is not None:
+                    await self._retire(slot_key)
+                context = await browser.new_context(user_agent=options.user_agent, viewport=options.viewport)
+                slot = self._slots[slot_key] = _ContextSlot(context=context, browser=browser)
+
+        slot.active += 1
+        slot.pages_served += 1
+        if slot.pages_served >= self.context_max_pages:
+            # Новые страницы агента откроются уже в новом контексте
+            slot.retired = True
+        return slot
+
+    async def _release_slot(self, slot: _ContextSlot):
+        slot.active -= 1
+        if slot.retired and slot.active == 0:
+            for slot_key, current in list(self._slots.items()):
+                if current is slot:
+                    del self._slots[slot_key]
+            if slot in self._retired:
+                self._retired.remove(slot)
+            await self._close_slot(slot)
+
+    async def _retire(self, slot_key: Tuple):
+        slot = self._slots.pop(slot_key)
+        slot.retired = True
+        if slot.active:
+            self._retired.append(slot)
+        else:
+            await self._close_slot(slot)
+
+    async def _close_slot(self, slot: _ContextSlot):
+        try:
+            await slot.context.close()
+        except Exception as e:
+            logger.debug(f"Error closing browser context: {e}")
+
+        # Старый браузер (после превышения памяти) закрывается с последним контекстом
+        browser = slot.browser
+        if browser is not self._browser and not any(
+            other.browser is browser for other in [*self._slots.values(), *self._retired]
+        ):
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.debug(f"Error closing browser: {e}")
+
+    async def _render(self, key: str, url: str, options: RenderOptions) -> RenderResult:
+        timing = PageTiming(url=url)
+        captured: List[CapturedResponse] = []
+        pending_reads: List[asyncio.Future] = []
+        started = time.perf_counter()
+        slot = await self._acquire_slot(key, options)
+        page = None
+        try:
+            page = await slot.context.new_page()
+            page_host = urlsplit(url).hostname or ''
+
+            if options.capture_json:
+                page.on('response', lambda response: pending_reads.append(
+                    asyncio.ensure_future(self._capture(response, captured))
+                ))
+
+            async def handle_route(route):
+                request = route.request
+                if should_block(request.resource_type, request.url, page_host, options):
+                    timing.blocked += 1
+                    await route.abort()
+                else:
+                    timing.requests += 1
+                    await route.continue_()
+
+            await page.route('**/*', handle_route)
+
+            response = await page.goto(url, wait_until=options.wait_until, timeout=options.timeout)
+            mark = time.perf_counter()
+            timing.dom_ms = (mark - started) * 1000
+
+            # Ждем появления элементов если нужно
+            if options.wait_for:
+                try:
+                    await page.wait_for_selector(options.wait_for, state='attached', timeout=options.wait_for_timeout)
+                except Exception as e:
+                    logger.warning(f"{options.wait_for} did not appear on {url}: {e}")
+                timing.wait_ms = (time.perf_counter() - mark) * 1000
+
+            if options.scroll:
+                mark = time.perf_counter()
+                timing.items = await self._scroll_until(page, options.scroll)
+                timing.scroll_ms = (time.perf_counter() - mark) * 1000
+
+            # Делаем скриншот если нужно
+            if options.screenshot:
+                screenshot_path = f"screenshot_{int(datetime.now().timestamp())}.png"
+                await page.screenshot(path=screenshot_path)
+                logger.info(f"Screenshot saved: {screenshot_path}")
+
+            mark = time.perf_counter()
+            body = await page.content()
+            timing.content_ms = (time.perf_counter() - mark) * 1000
+
+            if pending_reads:
+                await asyncio.gather(*pending_reads, return_exceptions=True)
+
+            fetched = Fetched(
+                url=url,
+                status=response.status if response else 200,
+                body=body,
+                headers=await response.all_headers() if response else {},
+                fetched_at=datetime.now()
+            )
+            timing.total_ms = (time.perf_counter() - started) * 1000
+            return RenderResult(fetched, timing, captured)
+        finally:
+            if page is not None:
+                try:
+                    await page.close()
+                except Exception as e:
+                    logger.debug(f"Error closing page: {e}")
+            await self._release_slot(slot)
+            await self._check_memory()
+
+    @staticmethod
+    async def _capture(response, captured: List[CapturedResponse]):
+        """Запомнить JSON ответ XHR/fetch запроса."""
+        request = response.request
+        if request.resource_type not in ('xhr', 'fetch') or response.status != 200:
+            return
+
+        headers = await response.all_headers()
+        if 'json' not in headers.get('content-type', ''):
+            return
+        if int(headers.get('content-length') or 0) > MAX_CAPTURED_BYTES:
+            return
+
+        try:
+            data = await response.json()
+        except Exception as e:
+            logger.debug(f"Could not read JSON response {response.url}: {e}")
+            return
+
+        request_headers = await request.all_headers()
+        captured.append(CapturedResponse(
+            url=request.url,
+            method=request.method,
+            headers={name: value for name, value in request_headers.items() if name.lower() in REPLAY_HEADERS},
+            post_data=request.post_data,
+            data=data
+        ))
+
+    async def _scroll_until(self, page, scroll: Dict[str, Any]) -> int:
+        """
+        Прокручивать страницу, пока товаров меньше min_items.
+
+        Останавливается, если после прокрутки за timeout мс не появилось новых
+        товаров или сделано max_scrolls прокруток. Возвращает число товаров.
+        """
+        selector = scroll['item']
+        min_items = int(scroll.get('min_items', 0))
+        timeout = int(scroll.get('timeout', 3000))
+
+        count = await page.locator(selector).count()
+        for _ in range(int(scroll.get('max_scrolls', 20))):
+            if min_items and count >= min_items:
+                break
+
+            await page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
+            try:
+                await page.wait_for_function(
+                    '([selector, count]) => document.querySelectorAll(selector).length > count',
+                    arg=[selector, count],
+                    timeout=timeout
+                )
+            except Exception:
+                # Новые товары не подгрузились — каталог закончился
+                break
+            count = await page.locator(selector).count()
+
+        return count
+
+    def browser_memory_mb(self) -> Optional[float]:
+        """Память процессов Chromium, запущенных этим процессом (нужен psutil)."""
+        try:
+            import psutil
+        except ImportError:
+            return None
+
+        total = 0
+        for child in psutil.Process().children(recursive=True):
+            try:
+                name = child.name().lower()
+                if 'chrom' in name or 'headless_shell' in name:
+                    total += child.memory_info().rss
+            except psutil.Error:
+                continue
+        return total / (1024 * 1024)
+
+    async def _check_memory(self):
+        self._pages_since_check += 1
+        if not self.max_memory_mb or self._pages_since_check < MEMORY_CHECK_EVERY:
+            return
+        self._pages_since_check = 0
+
+        used = self.browser_memory_mb()
+        if used is None or used <= self.max_memory_mb or self._browser is None:
+            return
+
+        logger.warning(f"Browser uses {used:.0f} MB (limit {self.max_memory_mb} MB), restarting")
+        # Текущие страницы дорабатывают в старом браузере, новые откроются в новом
+        old_browser, self._browser = self._browser, None
+        for slot_key in list(self._slots):
+            await self._retire(slot_key)
+        if not any(slot.browser is old_browser for slot in self._retired):
+            try:
+                await old_browser.close()
+            except Exception as e:
+                logger.debug(f"Error closing browser: {e}")
+
+    async def _close(self):
+        for slot in [*self._slots.values(), *self._retired]:
+            try:
+                await slot.context.close()
+            except Exception:
+                pass
+        self._slots.clear()
+        self._retired.clear()
+
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    def close(self):
+        """Закрыть браузер и остановить поток пула."""
+        loop = self._loop
+        if loop is None or not loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close(), loop).result(timeout=30)
+        except Exception as e:
+            logger.warning(f"Error closing browser pool: {e}")
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            self._loop = None
+
+
+_browser_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """Общий пул браузера текущего процесса."""
+    global _browser_pool
+    if _browser_pool is None or _browser_pool.pid != os.getpid():
+        _browser_pool = BrowserPool(
+            context_max_pages=settings.HEADLESS_CONTEXT_MAX_PAGES,
+            max_memory_mb=settings.HEADLESS_MAX_MEMORY_MB
+        )
+    return _browser_pool
@@ -1,5 +1,4 @@
 """Агент для Nastol.io."""
-from bs4 import BeautifulSoup
 import re
 from typing import AsyncGenerator
 from ..base import HTMLAgent, Fetched, ListingEventDraft
@@ -10,7 +9,7 @@ class NastolPublicationsAgent(HTMLAgent):
 
     async def parse(self, fetched: Fetched) -> AsyncGenerator[ListingEventDraft, None]:
         """Извлечь события из HTML."""
-        soup = BeautifulSoup(fetched.body, 'html.parser')
+        soup = self.soup(fetched)
 
         # Ищем карточки постов
         items = soup.select(self.selectors.get('item', '.post-card, .article-item, .post'))
@@ -86,7 +85,7 @@ class NastolSpecificArticleAgent(NastolPublicationsAgent):
 
     async def parse(self, fetched: Fetched) -> AsyncGenerator[ListingEventDraft, None]:
         """Извлечь события из конкретной статьи."""
-        soup = BeautifulSoup(fetched.body, 'html.parser')
+        soup = self.soup(fetched)
 
         # Для конкретной статьи ищем игры в тексте
         content_elem = soup.select_one('.article-content, .post-content')
@@ -0,0 +1,218 @@
+"""
+Исполнитель разбора страниц в пуле процессов.
+
+Разбор HTML упирается в CPU и, выполняясь прямо в цикле событий, блокирует
+загрузку остальных страниц. Исполнитель отправляет страницу в
+ProcessPoolExecutor: в процесс передаются спецификация разбора (путь к классу
+агента и его config) и сырое тело в байтах, обратно возвращаются кортежи полей
+ListingEventDraft и прирост статистики Extractor агента (для отчета о
+производительности в BaseAgent.run). Экземпляры агентов кэшируются в процессах
+пула.
+
+Демонический процесс (prefork воркер Celery) не может запускать дочерние
+процессы, поэтому задачи агентов идут в очередь agents, которую обслуживает
+воркер с пулом потоков (worker -Q agents -P threads): агенты обходятся
+параллельно в потоках, каждый в своем цикле событий, и разбирают страницы в
+общем пуле процессов. Если пул все же недоступен или класс агента нельзя
+импортировать по имени, страница разбирается в текущем процессе, как раньше.
+"""
+
+import asyncio
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import astuple
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DraftTuple = Tuple[Any, ...]
+
+
+class ParseSpec(NamedTuple):
+    """Все, что нужно процессу пула, чтобы создать агента и разобрать страницу."""
+
+    agent_path: str  # 'module:QualName'
+    agent_id: str
+    config_json: str
+
+
+# Кэш агентов в процессе пула: ключ - ParseSpec
+_worker_agents: Dict[ParseSpec, Any] = {}
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _load_agent(spec: ParseSpec):
+    agent = _worker_agents.get(spec)
+    if agent is None:
+        from .base import RuntimeContext
+
+        module_name, qualname = spec.agent_path.split(':')
+        agent_class = importlib.import_module(module_name)
+        for part in qualname.split('.'):
+            agent_class = getattr(agent_class, part)
+
+        config = json.loads(spec.config_json)
+        if len(_worker_agents) >= 32:
+            _worker_agents.clear()
+        agent = _worker_agents[spec] = agent_class(config, {}, RuntimeContext(spec.agent_id, config, {}))
+    return agent
+
+
+def parse_in_worker(
+    spec: ParseSpec,
+    url: str,
+    status: int,
+    headers: Dict[str, str],
+    body: bytes
+) -> Tuple[List[DraftTuple], Optional[Dict[str, float]]]:
+    """Разобрать страницу в процессе пула: кортежи черновиков и прирост статистики Extractor."""
+    global _worker_loop
+    from .base import Fetched
+
+    agent = _load_agent(spec)
+    fetched = Fetched(
+        url=url,
+        status=status,
+        body=body.decode('utf-8'),
+        headers=headers,
+        fetched_at=datetime.now()
+    )
+
+    async def collect():
+        return [astuple(draft) async for draft in agent.parse(fetched)]
+
+    extractor = getattr(agent, 'extractor', None)
+    before = dict(extractor.stats) if extractor is not None else None
+
+    if _worker_loop is None:
+        _worker_loop = asyncio.new_event_loop()
+    rows = _worker_loop.run_until_complete(collect())
+
+    stats = {key: value - before[key] for key, value in extractor.stats.items()} if extractor is not None else None
+    return rows, stats
+
+
+def get_parse_spec(agent) -> Optional[ParseSpec]:
+    """Спецификация разбора агента или None, если агента нельзя воссоздать в другом процессе."""
+    agent_class = type(agent)
+    if not getattr(agent_class, 'PARSE_IN_POOL', True) or '<locals>' in agent_class.__qualname__:
+        return None
+
+    try:
+        config_json = json.dumps(agent.config, sort_keys=True, default=str)
+    except (TypeError, ValueError):
+        return None
+
+    return ParseSpec(f"{agent_class.__module__}:{agent_class.__qualname__}", agent.ctx.agent_id, config_json)
+
+
+class ParseExecutor:
+    """Пул процессов для разбора страниц (один на процесс воркера)."""
+
+    def __init__(self, mode: str = 'process', workers: int = 0, max_pending: int = 0):
+        self.mode = mode
+        self.pid = os.getpid()
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._disabled = mode != 'process'
+        # Исполнитель общий для потоков воркера (-P threads)
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> Optional[ProcessPoolExecutor]:
+        """Пул процессов; создается при первом обращении."""
+        with self._lock:
+            return self._get_pool()
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self._pool is None and not self._disabled:
+            if multiprocessing.current_process().daemon:
+                logger.warning(
+                    "Parse process pool is unavailable in a daemonic process (Celery prefork), parsing inline; "
+                    "run agent tasks on a worker with -P threads"
+                )
+                self._disabled = True
+                return None
+            try:
+                # forkserver: процессы пула не наследуют сокеты БД, Redis и HTTP сессий воркера
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(method)
+                )
+            except (OSError, ValueError) as e:
+                logger.warning(f"Parse process pool is unavailable, parsing inline: {e}")
+                self._disabled = True
+        return self._pool
+
+    async def parse(self, agent, fetched) -> List['ListingEventDraft']:
+        """Разобрать страницу в пуле процессов (или в текущем процессе)."""
+        from .base import ListingEventDraft
+
+        spec = get_parse_spec(agent)
+        pool = self.pool if spec is not None else None
+        if pool is None:
+            return [draft async for draft in agent.parse(fetched)]
+
+        loop = asyncio.get_running_loop()
+        try:
+            rows, stats = await loop.run_in_executor(
+                pool,
+                parse_in_worker,
+                spec,
+                fetched.url,
+                fetched.status,
+                dict(fetched.headers),
+                fetched.body.encode('utf-8')
+            )
+        except BrokenProcessPool as e:
+            logger.error(f"Parse process pool is broken, recreating: {e}")
+            self.shutdown()
+            return [draft async for draft in agent.parse(fetched)]
+        except AssertionError as e:
+            # Процессы пула запускаются при первой отправке задачи; prefork воркер
+            # Celery - демонический процесс, дочерние процессы ему запрещены
+            logger.warning(f"Parse process pool is unavailable, parsing inline: {e}")
+            self.shutdown()
+            self._disabled = True
+            return [draft async for draft in agent.parse(fetched)]
+
+        if stats:
+            # Статистика разбора в пуле учитывается в Extractor агента
+            for key, value in stats.items():
+                agent.extractor.stats[key] += value
+        return [ListingEventDraft(*row) for row in rows]
+
+    def shutdown(self):
+        """Остановить пул процессов."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+_parse_executor: Optional[ParseExecutor] = None
+_parse_executor_lock = threading.Lock()
+
+
+def get_parse_executor() -> ParseExecutor:
+    """Общий исполнитель разбора для текущего процесса."""
+    global _parse_executor
+    with _parse_executor_lock:
+        if _parse_executor is None or _parse_executor.pid != os.getpid():
+            _parse_executor = ParseExecutor(
+                mode=settings.PARSE_EXECUTOR,
+                workers=settings.PARSE_WORKERS,
+                max_pending=settings.PARSE_MAX_PENDING
+            )
+        return _parse_executor
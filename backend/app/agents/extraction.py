@@ -0,0 +1,347 @@
+"""
+Декларативное извлечение товаров из HTML.
+
+Спецификация описывает селекторы карточки и ее полей, разбор цены и скидки
+и таблицы ключевых слов для определения типа события:
+
+    {
+        "item": ".product-item",
+        "fields": {
+            "title": ".product-item__title",
+            "price": ".product-item__price",
+            "url": "a.product-item__link",
+            "badge": ".product-item__label",
+            "availability": ".stock",
+            "old_price": ".old-price",
+            "edition": ".edition"
+        },
+        "base_url": "https://hobbygames.ru",
+        "store_id": "hobbygames",
+        "default_kind": "price",
+        "kind_keywords": {"preorder": ["предзаказ"], "release": ["новинка"]},
+        "price_regex": "(\\d[\\d\\s]*)\\s*₽",
+        "price_pick": "first",
+        "discount_regex": "-(\\d+)%",
+        "discount_sources": ["price"],
+        "prefer_old_price": false,
+        "out_of_stock_keywords": ["нет в наличии"],
+        "card_out_of_stock_keywords": [],
+        "edition_keywords": ["делюкс"],
+        "in_stock": null
+    }
+
+Регулярные выражения и таблицы ключевых слов компилируются один раз.
+Для бэкенда lxml поля с простыми селекторами (тег, классы, атрибуты)
+находятся за один обход потомков карточки вместо отдельного select_one
+на каждое поле.
+"""
+
+import logging
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from .parsing import LxmlBackend, LxmlNode, Node, ParserBackend
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('title', 'price', 'url', 'badge', 'availability', 'old_price', 'edition')
+
+# Старые ключи config['selectors'] -> поля спецификации
+SELECTOR_ALIASES = {'stock': 'availability'}
+
+DEFAULT_SPEC: Dict[str, Any] = {
+    'fields': {},
+    'default_kind': 'price',
+    'kind_keywords': {},
+    'price_regex': r'(\d[\d\s]*)\s*₽',
+    'price_pick': 'first',
+    'discount_regex': None,
+    'discount_sources': ['price'],
+    'prefer_old_price': False,
+    'out_of_stock_keywords': [],
+    'card_out_of_stock_keywords': [],
+    'edition_keywords': [],
+    'in_stock': None,
+}
+
+_WHITESPACE = re.compile(r'\s+')
+_SIMPLE_SELECTOR = re.compile(
+    r'^(?P<tag>[a-zA-Z][\w-]*)?'
+    r'(?P<classes>(?:\.[\w-]+)*)'
+    r'(?P<attrs>(?:\[[\w-]+(?:=(?:"[^"]*"|\'[^\']*\'|[\w-]+))?\])*)$'
+)
+_ATTR = re.compile(r'\[([\w-]+)(?:=(?:"([^"]*)"|\'([^\']*)\'|([\w-]+)))?\]')
+
+
+def merge_spec(*specs: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Объединить спецификации; поля 'fields' сливаются по ключам."""
+    merged = dict(DEFAULT_SPEC)
+    merged['fields'] = {}
+    for spec in specs:
+        if not spec:
+            continue
+        for key, value in spec.items():
+            if key == 'fields':
+                merged['fields'].update(value)
+            else:
+                merged[key] = value
+    return merged
+
+
+class KeywordTable:
+    """Таблица «метка -> ключевые слова», скомпилированная в одно регулярное выражение."""
+
+    def __init__(self, table: Dict[str, List[str]]):
+        self.labels = [label for label, words in table.items() if words]
+        groups = [
+            f"(?P<k{index}>{'|'.join(re.escape(w.lower()) for w in sorted(table[label], key=len, reverse=True))})"
+            for index, label in enumerate(self.labels)
+        ]
+        self._regex = re.compile('|'.join(groups)) if groups else None
+
+    def first(self, text: str) -> Optional[str]:
+        """Метка с наивысшим приоритетом, слово которой встречается в тексте."""
+        if self._regex is None or not text:
+            return None
+
+        found = {match.lastgroup for match in self._regex.finditer(text)}
+        for index, label in enumerate(self.labels):
+            if f"k{index}" in found:
+                return label
+        return None
+
+    def search(self, text: str) -> bool:
+        """Встречается ли в тексте хотя бы одно слово."""
+        return bool(self._regex is not None and text and self._regex.search(text))
+
+
+class SimpleSelector:
+    """Селектор вида tag.class[attr=value], проверяемый без XPath."""
+
+    __slots__ = ('tag', 'classes', 'attrs')
+
+    def __init__(self, tag: Optional[str], classes: frozenset, attrs: Tuple[Tuple[str, Optional[str]], ...]):
+        self.tag = tag
+        self.classes = classes
+        self.attrs = attrs
+
+    def matches(self, element) -> bool:
+        if self.tag and element.tag != self.tag:
+            return False
+        if self.classes:
+            class_attr = element.get('class')
+            if not class_attr or not self.classes.issubset(class_attr.split()):
+                return False
+        for name, value in self.attrs:
+            actual = element.get(name)
+            if actual is None or (value is not None and actual != value):
+                return False
+        return True
+
+
+def compile_simple_selector(selector: str) -> Optional[List[SimpleSelector]]:
+    """Скомпилировать список простых селекторов или None, если селектор сложный."""
+    compiled = []
+    for part in selector.split(','):
+        match = _SIMPLE_SELECTOR.match(part.strip())
+        if not match or not part.strip():
+            return None
+
+        classes = frozenset(c for c in match.group('classes').split('.') if c)
+        attrs = tuple(
+            (name, next((v for v in values if v), None) if any(values) else None)
+            for name, *values in _ATTR.findall(match.group('attrs'))
+        )
+        tag = match.group('tag').lower() if match.group('tag') else None
+        compiled.append(SimpleSelector(tag, classes, attrs))
+    return compiled
+
+
+class Extractor:
+    """Исполнитель спецификации извлечения для одного агента."""
+
+    def __init__(self, spec: Dict[str, Any], backend: ParserBackend):
+        self.spec = spec
+        self.backend = backend
+        self.item_selector = spec['item']
+        self.fields = {name: spec['fields'][name] for name in FIELDS if spec['fields'].get(name)}
+        self.base_url = spec.get('base_url')
+        self.store_id = spec.get('store_id')
+        self.default_kind = spec.get('default_kind', 'price')
+        self.forced_in_stock = spec.get('in_stock')
+
+        self.kinds = KeywordTable(spec.get('kind_keywords') or {})
+        self.out_of_stock = KeywordTable({'out': spec.get('out_of_stock_keywords') or []})
+        self.card_out_of_stock = KeywordTable({'out': spec.get('card_out_of_stock_keywords') or []})
+        self.edition_keywords = KeywordTable({'edition': spec.get('edition_keywords') or []})
+
+        self.price_regex = re.compile(spec['price_regex'])
+        self.price_pick_last = spec.get('price_pick') == 'last'
+        self.discount_regex = re.compile(spec['discount_regex']) if spec.get('discount_regex') else None
+        self.discount_sources = tuple(spec.get('discount_sources') or ('price',))
+        # Скидка по старой цене заменяет найденную в тексте, а не дополняет ее
+        self.prefer_old_price = bool(spec.get('prefer_old_price'))
+
+        # Поля, которые можно найти за один обход карточки (только lxml)
+        self.single_pass: Dict[str, List[SimpleSelector]] = {}
+        if isinstance(backend, LxmlBackend):
+            for name, selector in self.fields.items():
+                compiled = compile_simple_selector(selector)
+                if compiled:
+                    self.single_pass[name] = compiled
+
+        self.stats = {'pages': 0, 'cards': 0, 'items': 0, 'seconds': 0.0}
+
+    def extract(self, root: Node) -> Iterator['ListingEventDraft']:
+        """Извлечь черновики событий из разобранного документа."""
+        started = time.perf_counter()
+        cards = root.select(self.item_selector)
+        self.stats['pages'] += 1
+        self.stats['cards'] += len(cards)
+
+        try:
+            for card in cards:
+                try:
+                    draft = self._extract_card(card)
+                except Exception as e:
+                    logger.warning(f"Error extracting item: {e}")
+                    continue
+
+                if draft is not None:
+                    self.stats['items'] += 1
+                    yield draft
+        finally:
+            self.stats['seconds'] += time.perf_counter() - started
+
+    def throughput(self) -> Dict[str, float]:
+        """Производительность извлечения: карточек и товаров в секунду."""
+        seconds = self.stats['seconds'] or 1e-9
+        return {
+            'cards_per_sec': self.stats['cards'] / seconds,
+            'items_per_sec': self.stats['items'] / seconds,
+        }
+
+    def _find_fields(self, card: Node) -> Dict[str, Optional[Node]]:
+        found: Dict[str, Optional[Node]] = {}
+
+        if self.single_pass:
+            pending = dict(self.single_pass)
+            for element in card.element.iterdescendants():
+                if not isinstance(element.tag, str):
+                    continue  # комментарии и инструкции
+                for name, selectors in list(pending.items()):
+                    if any(selector.matches(element) for selector in selectors):
+                        found[name] = LxmlNode(self.backend, element)
+                        del pending[name]
+                if not pending:
+                    break
+
+        for name, selector in self.fields.items():
+            if name not in found and name not in self.single_pass:
+                found[name] = card.select_one(selector)
+
+        return found
+
+    def _extract_card(self, card: Node) -> Optional['ListingEventDraft']:
+        from .base import ListingEventDraft
+
+        fields = self._find_fields(card)
+
+        title_node = fields.get('title')
+        if title_node is None:
+            return None
+        title = title_node.get_text(strip=True)
+
+        url_node = fields.get('url')
+        url = url_node.get('href') if url_node is not None else None
+        if url and self.base_url and not url.startswith('http'):
+            # urljoin заметно медленнее склейки, а абсолютные пути — основной случай
+            url = self.base_url + url if url.startswith('/') else urljoin(self.base_url + '/', url)
+
+        badge_node = fields.get('badge')
+        badge_text = badge_node.get_text(strip=True) if badge_node is not None else ''
+        badge_lower = badge_text.lower()
+        kind = self.kinds.first(badge_lower) or self.default_kind
+
+        price_node = fields.get('price')
+        price_text = price_node.get_text(strip=True) if price_node is not None else ''
+        price = self._parse_price(price_text)
+
+        discount_pct = None
+        if self.discount_regex is not None:
+            sources = {'price': price_text, 'badge': badge_lower}
+            for source in self.discount_sources:
+                discount_pct = self._parse_discount(sources.get(source, ''))
+                if discount_pct is not None:
+                    break
+
+        old_price_node = fields.get('old_price')
+        if old_price_node is not None and price and (discount_pct is None or self.prefer_old_price):
+            old_price = self._parse_price(old_price_node.get_text(strip=True))
+            if old_price and old_price > price:
+                discount_pct = round(((old_price - price) / old_price) * 100, 2)
+
+        edition_node = fields.get('edition')
+        edition = None
+        if edition_node is not None:
+            edition = edition_node.get_text(strip=True)
+        elif badge_text and self.edition_keywords.search(badge_lower):
+            edition = badge_text
+
+        if self.forced_in_stock is not None:
+            in_stock = self.forced_in_stock
+        else:
+            in_stock = True
+            availability_node = fields.get('availability')
+            if availability_node is not None and \
+                    self.out_of_stock.search(availability_node.get_text(strip=True).lower()):
+                in_stock = False
+            if in_stock and self.card_out_of_stock.labels and \
+                    self.card_out_of_stock.search(card.get_text().lower()):
+                in_stock = False
+
+        return ListingEventDraft(
+            title=title,
+            url=url,
+            store_id=self.store_id,
+            kind=kind,
+            price=price,
+            discount_pct=discount_pct,
+            edition=edition,
+            in_stock=in_stock
+        )
+
+    def _parse_price(self, text: str) -> Optional[float]:
+        if not text:
+            return None
+
+        if self.price_pick_last:
+            matches = self.price_regex.findall(text)
+            if not matches:
+                return None
+            value = matches[-1]
+        else:
+            match = self.price_regex.search(text)
+            if not match:
+                return None
+            value = match.group(1)
+
+        if isinstance(value, tuple):
+            value = next((v for v in value if v), '')
+        try:
+            return float(_WHITESPACE.sub('', value))
+        except ValueError:
+            return None
+
+    def _parse_discount(self, text: str) -> Optional[float]:
+        if not text:
+            return None
+
+        match = self.discount_regex.search(text)
+        if not match:
+            return None
+
+        value = next((group for group in match.groups() if group), None)
+        return float(value) if value else None
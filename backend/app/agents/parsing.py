@@ -0,0 +1,221 @@
+"""
+Бэкенды разбора HTML для агентов.
+
+Узлы всех бэкендов поддерживают то подмножество API BeautifulSoup, которым
+пользуются агенты: select(), select_one(), get_text(), get(). Поэтому агент
+переходит на быстрый бэкенд заменой BeautifulSoup(fetched.body, 'html.parser')
+на self.soup(fetched), не меняя логику parse().
+
+CSS селекторы компилируются один раз на экземпляр бэкенда (то есть на агента).
+
+Доступные бэкенды:
+    lxml        - lxml.html + cssselect (по умолчанию)
+    selectolax  - selectolax (Lexbor), опционально
+    bs4-lxml    - BeautifulSoup с парсером lxml
+    html.parser - BeautifulSoup с html.parser (прежнее поведение)
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARSER = 'lxml'
+
+
+class Node(ABC):
+    """Узел документа с API, совместимым с BeautifulSoup Tag."""
+
+    __slots__ = ('backend', 'element')
+
+    def __init__(self, backend: 'ParserBackend', element: Any):
+        self.backend = backend
+        self.element = element
+
+    @abstractmethod
+    def select(self, selector: str) -> List['Node']:
+        """Все потомки, подходящие под селектор."""
+
+    def select_one(self, selector: str) -> Optional['Node']:
+        """Первый потомок, подходящий под селектор."""
+        found = self.select(selector)
+        return found[0] if found else None
+
+    @abstractmethod
+    def get_text(self, separator: str = '', strip: bool = False) -> str:
+        """Текст узла (как Tag.get_text)."""
+
+    @abstractmethod
+    def get(self, attr: str, default: Any = None) -> Any:
+        """Значение атрибута."""
+
+    def __getitem__(self, attr: str) -> Any:
+        value = self.get(attr)
+        if value is None:
+            raise KeyError(attr)
+        return value
+
+
+class ParserBackend(ABC):
+    """Бэкенд разбора HTML с кэшем скомпилированных селекторов."""
+
+    name = ''
+
+    def __init__(self):
+        self._compiled: Dict[str, Any] = {}
+
+    @abstractmethod
+    def parse(self, body: str) -> Node:
+        """Разобрать документ и вернуть корневой узел."""
+
+    @abstractmethod
+    def _compile(self, selector: str) -> Any:
+        pass
+
+    def compile(self, selector: str) -> Any:
+        """Скомпилировать селектор (один раз на бэкенд)."""
+        compiled = self._compiled.get(selector)
+        if compiled is None:
+            compiled = self._compiled[selector] = self._compile(selector)
+        return compiled
+
+
+class Bs4Node(Node):
+    __slots__ = ()
+
+    def select(self, selector: str) -> List[Node]:
+        return [Bs4Node(self.backend, tag) for tag in self.backend.compile(selector).select(self.element)]
+
+    def select_one(self, selector: str) -> Optional[Node]:
+        tag = self.backend.compile(selector).select_one(self.element)
+        return Bs4Node(self.backend, tag) if tag is not None else None
+
+    def get_text(self, separator: str = '', strip: bool = False) -> str:
+        return self.element.get_text(separator, strip=strip)
+
+    def get(self, attr: str, default: Any = None) -> Any:
+        return self.element.get(attr, default)
+
+
+class Bs4Backend(ParserBackend):
+    """BeautifulSoup с выбранным парсером и селекторами soupsieve."""
+
+    def __init__(self, features: str = 'html.parser'):
+        super().__init__()
+        self.name = 'bs4-lxml' if features == 'lxml' else features
+        self.features = features
+
+    def parse(self, body: str) -> Node:
+        from bs4 import BeautifulSoup
+
+        return Bs4Node(self, BeautifulSoup(body, self.features))
+
+    def _compile(self, selector: str) -> Any:
+        import soupsieve
+
+        return soupsieve.compile(selector)
+
+
+class LxmlNode(Node):
+    __slots__ = ()
+
+    def select(self, selector: str) -> List[Node]:
+        element = self.element
+        # CSSSelector ищет по descendant-or-self, BeautifulSoup — только среди потомков
+        return [
+            LxmlNode(self.backend, found)
+            for found in self.backend.compile(selector)(element)
+            if found is not element
+        ]
+
+    def get_text(self, separator: str = '', strip: bool = False) -> str:
+        if strip:
+            return separator.join(text.strip() for text in self.element.itertext() if text.strip())
+        return separator.join(self.element.itertext())
+
+    def get(self, attr: str, default: Any = None) -> Any:
+        return self.element.get(attr, default)
+
+
+class LxmlBackend(ParserBackend):
+    """lxml.html с селекторами, скомпилированными в XPath."""
+
+    name = 'lxml'
+
+    def __init__(self):
+        super().__init__()
+        from lxml import html
+        from lxml.cssselect import CSSSelector  # требует пакет cssselect
+
+        self._html = html
+        self._selector_class = CSSSelector
+        self._parser = html.HTMLParser(encoding='utf-8')
+
+    def parse(self, body: str) -> Node:
+        data = body.encode('utf-8') if body.strip() else b'<html></html>'
+        return LxmlNode(self, self._html.document_fromstring(data, parser=self._parser))
+
+    def _compile(self, selector: str) -> Any:
+        return self._selector_class(selector, translator='html')
+
+
+class SelectolaxNode(Node):
+    __slots__ = ()
+
+    def select(self, selector: str) -> List[Node]:
+        return [SelectolaxNode(self.backend, found) for found in self.element.css(selector)]
+
+    def select_one(self, selector: str) -> Optional[Node]:
+        found = self.element.css_first(selector)
+        return SelectolaxNode(self.backend, found) if found is not None else None
+
+    def get_text(self, separator: str = '', strip: bool = False) -> str:
+        return self.element.text(deep=True, separator=separator, strip=strip)
+
+    def get(self, attr: str, default: Any = None) -> Any:
+        value = self.element.attributes.get(attr, default)
+        return default if value is None else value
+
+
+class SelectolaxBackend(ParserBackend):
+    """selectolax (Lexbor); селекторы компилируются самим движком."""
+
+    name = 'selectolax'
+
+    def __init__(self):
+        super().__init__()
+        from selectolax.lexbor import LexborHTMLParser
+
+        self._parser_class = LexborHTMLParser
+
+    def parse(self, body: str) -> Node:
+        return SelectolaxNode(self, self._parser_class(body).root)
+
+    def _compile(self, selector: str) -> Any:
+        return selector
+
+
+PARSER_BACKENDS = {
+    'lxml': LxmlBackend,
+    'selectolax': SelectolaxBackend,
+    'bs4-lxml': lambda: Bs4Backend('lxml'),
+    'html.parser': lambda: Bs4Backend('html.parser'),
+}
+
+
+def create_parser_backend(name: Optional[str] = None) -> ParserBackend:
+    """
+    Создать бэкенд разбора по имени.
+
+    Если зависимости бэкенда не установлены, используется BeautifulSoup с lxml.
+    """
+    name = name or DEFAULT_PARSER
+    if name not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend: {name}")
+
+    try:
+        return PARSER_BACKENDS[name]()
+    except ImportError as e:
+        logger.warning(f"Parser backend {name} is unavailable ({e}), falling back to bs4-lxml")
+        return Bs4Backend('lxml')
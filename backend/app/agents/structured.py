@@ -0,0 +1,356 @@
+"""
+Извлечение товаров из структурированных данных страницы.
+
+Многие магазины встраивают в HTML полный каталог в машиночитаемом виде:
+    json_ld      - <script type="application/ld+json"> с Product / ItemList
+    microdata    - атрибуты itemscope/itemprop schema.org/Product
+    next_data    - <script id="__NEXT_DATA__"> (Next.js)
+    initial_state - window.__INITIAL_STATE__ = {...}
+
+Все источники читаются последовательным сканированием текста регулярными
+выражениями, без построения DOM. Записи JSON (а также ответы API агентов)
+приводятся к ListingEventDraft по пути до списка товаров и карте полей.
+"""
+
+import html
+import json
+import logging
+import re
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urljoin
+
+logger = logging.getLogger(__name__)
+
+SOURCES = ('json_ld', 'microdata', 'next_data', 'initial_state')
+
+# Пути к полям записи по умолчанию (первый найденный)
+DEFAULT_FIELDS: Dict[str, Sequence[str]] = {
+    'title': ('name', 'title'),
+    'price': ('price', 'price.value', 'price.current', 'offers.price', 'offers.lowPrice'),
+    'old_price': ('oldPrice', 'old_price', 'regularPrice', 'price.old'),
+    'url': ('url', 'link', 'href'),
+    'in_stock': ('inStock', 'in_stock', 'available', 'availability', 'offers.availability'),
+    'edition': ('edition',),
+    'kind': (),
+}
+
+_JSON_LD = re.compile(
+    r'<script\b[^>]*\btype\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script\s*>',
+    re.I | re.S
+)
+_NEXT_DATA = re.compile(r'<script\b[^>]*\bid\s*=\s*["\']?__NEXT_DATA__["\']?[^>]*>(.*?)</script\s*>', re.I | re.S)
+_INITIAL_STATE = re.compile(r'window\.__INITIAL_STATE__\s*=\s*')
+_MICRODATA_TAG = re.compile(r'<[a-zA-Z][\w-]*\b([^>]*\bitem(?:scope|prop)\b[^>]*)>', re.I)
+_TAG_ATTR = re.compile(r'([\w-]+)(?:\s*=\s*("[^"]*"|\'[^\']*\'|[^\s>]+))?')
+_PRICE_NUMBER = re.compile(r'\d[\d\s ]*(?:[.,]\d+)?')
+
+_OUT_OF_STOCK = ('outofstock', 'soldout', 'discontinued')
+_PREORDER = ('preorder', 'presale')
+
+
+def iter_json_ld(body: str) -> Iterator[Any]:
+    """Блоки application/ld+json страницы."""
+    for match in _JSON_LD.finditer(body):
+        try:
+            yield json.loads(match.group(1))
+        except ValueError as e:
+            logger.debug(f"Invalid JSON-LD block: {e}")
+
+
+def iter_embedded_state(body: str, sources: Sequence[str] = ('next_data', 'initial_state')) -> Iterator[Any]:
+    """JSON состояния приложения (__NEXT_DATA__, window.__INITIAL_STATE__)."""
+    if 'next_data' in sources:
+        match = _NEXT_DATA.search(body)
+        if match:
+            try:
+                yield json.loads(match.group(1))
+            except ValueError as e:
+                logger.debug(f"Invalid __NEXT_DATA__: {e}")
+
+    if 'initial_state' in sources:
+        match = _INITIAL_STATE.search(body)
+        if match:
+            try:
+                # raw_decode читает ровно один объект и не требует конца скрипта
+                state, _ = json.JSONDecoder().raw_decode(body, match.end())
+                yield state
+            except ValueError as e:
+                logger.debug(f"Invalid __INITIAL_STATE__: {e}")
+
+
+def iter_microdata(body: str) -> Iterator[Dict[str, Any]]:
+    """
+    Товары schema.org/Product из microdata в виде словарей JSON-LD.
+
+    Это сканирование тегов, а не полный разбор вложенности: свойства вложенных
+    сущностей (Brand, Rating и т.п.) пропускаются до следующего Product или Offer.
+    """
+    product: Optional[Dict[str, Any]] = None
+    scope: Optional[Dict[str, Any]] = None
+
+    for match in _MICRODATA_TAG.finditer(body):
+        attrs = {
+            name.lower(): html.unescape(value.strip('"\'')) if value else ''
+            for name, value in _TAG_ATTR.findall(match.group(1))
+        }
+        itemprop = attrs.get('itemprop')
+
+        if 'itemscope' in attrs:
+            itemtype = attrs.get('itemtype', '')
+            if itemtype.endswith('/Product'):
+                if product:
+                    yield product
+                product = scope = {'@type': 'Product'}
+            elif itemtype.endswith('Offer') and product is not None:
+                scope = product.setdefault('offers', {'@type': 'Offer'})
+            else:
+                scope = None
+            # Значение свойства-сущности — сама вложенная сущность
+            continue
+
+        if scope is None or not itemprop:
+            continue
+
+        value = attrs.get('content') or attrs.get('href')
+        if value is None:
+            end = body.find('<', match.end())
+            value = html.unescape(body[match.end():end if end != -1 else None]).strip()
+        scope.setdefault(itemprop, value)
+
+    if product:
+        yield product
+
+
+def iter_products(data: Any) -> Iterator[Dict[str, Any]]:
+    """Сущности Product в JSON-LD (включая @graph, ItemList и ProductGroup)."""
+    if isinstance(data, list):
+        for item in data:
+            yield from iter_products(item)
+        return
+
+    if not isinstance(data, dict):
+        return
+
+    types = data.get('@type', ())
+    types = (types,) if isinstance(types, str) else types
+
+    if 'Product' in types:
+        yield data
+    elif 'ProductGroup' in types:
+        yield from iter_products(data.get('hasVariant')) if data.get('hasVariant') else iter([data])
+    elif 'ItemList' in types:
+        for element in data.get('itemListElement') or ():
+            yield from iter_products(element.get('item', element) if isinstance(element, dict) else element)
+    elif 'ListItem' in types:
+        yield from iter_products(data.get('item'))
+    elif '@graph' in data:
+        yield from iter_products(data['@graph'])
+
+
+def get_path(data: Any, path: str) -> Any:
+    """Значение по пути вида 'props.pageProps.items' или 'offers.0.price'."""
+    for key in path.split('.') if path else ():
+        if isinstance(data, list):
+            if key.isdigit() and int(key) < len(data):
+                data = data[int(key)]
+            elif data:
+                # Список предложений и т.п. — берем первый элемент
+                data = data[0].get(key) if isinstance(data[0], dict) else None
+            else:
+                return None
+        elif isinstance(data, dict):
+            data = data.get(key)
+        else:
+            return None
+    return data
+
+
+def iter_records(data: Any, items_path: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Записи товаров в произвольном JSON.
+
+    С items_path берется список по пути; без него ищутся словари,
+    у которых есть и название, и цена.
+    """
+    if items_path:
+        items = get_path(data, items_path)
+        if isinstance(items, dict):
+            items = list(items.values())
+        for item in items or ():
+            if isinstance(item, dict):
+                yield item
+        return
+
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if _is_product_record(node):
+                yield node
+                continue
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def _is_product_record(node: Any) -> bool:
+    return isinstance(node, dict) and ('name' in node or 'title' in node) and ('price' in node or 'offers' in node)
+
+
+def find_items_path(data: Any) -> Optional[Tuple[str, int]]:
+    """
+    Путь к самому длинному списку записей товаров в JSON и их число.
+
+    Используется, чтобы по перехваченному ответу XHR понять, есть ли в нем
+    каталог и где он лежит. Для списка в корне путь — пустая строка.
+    """
+    best: Optional[Tuple[str, int]] = None
+    stack: List[Tuple[str, Any]] = [('', data)]
+    while stack:
+        path, node = stack.pop()
+        if isinstance(node, list):
+            count = sum(1 for item in node if _is_product_record(item))
+            if count and (best is None or count > best[1]):
+                best = (path, count)
+            if not count:
+                stack.extend((f"{path}.{index}".lstrip('.'), item) for index, item in enumerate(node[:50]))
+        elif isinstance(node, dict):
+            stack.extend((f"{path}.{key}".lstrip('.'), value) for key, value in node.items())
+    return best
+
+
+def parse_price(value: Any) -> Optional[float]:
+    """Цена из числа или строки ('1 990 ₽', '1990.00')."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        return parse_price(value.get('value') or value.get('amount'))
+
+    match = _PRICE_NUMBER.search(str(value))
+    if not match:
+        return None
+    number = re.sub(r'[\s ]', '', match.group(0)).replace(',', '.')
+    try:
+        return float(number)
+    except ValueError:
+        return None
+
+
+def parse_availability(value: Any) -> Optional[bool]:
+    """Наличие из bool или schema.org ItemAvailability."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value > 0
+
+    text = str(value).lower().rsplit('/', 1)[-1]
+    if any(word in text for word in _OUT_OF_STOCK) or text in ('false', 'no', 'нет в наличии'):
+        return False
+    return True
+
+
+class StructuredExtractor:
+    """Приведение структурированных данных страницы или ответа API к черновикам событий."""
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.sources = tuple(spec.get('sources') or SOURCES)
+        self.items_path = spec.get('items_path')
+        self.fields = dict(DEFAULT_FIELDS)
+        for name, path in (spec.get('fields') or {}).items():
+            self.fields[name] = (path,) if isinstance(path, str) else tuple(path)
+        self.store_id = spec.get('store_id')
+        self.base_url = spec.get('base_url')
+        self.default_kind = spec.get('default_kind', 'price')
+        self.min_items = int(spec.get('min_items', 1))
+        self.stats = {'pages': 0, 'items': 0}
+
+    def extract(self, body: str) -> List['ListingEventDraft']:
+        """
+        Черновики из первого источника страницы, где нашлись товары.
+
+        Пустой список означает, что нужно разбирать страницу CSS селекторами.
+        """
+        self.stats['pages'] += 1
+
+        for source in self.sources:
+            if source == 'json_ld':
+                products = [p for block in iter_json_ld(body) for p in iter_products(block)]
+            elif source == 'microdata':
+                products = list(iter_microdata(body)) if 'itemscope' in body else []
+            elif source in ('next_data', 'initial_state'):
+                products = [
+                    record
+                    for state in iter_embedded_state(body, (source,))
+                    for record in iter_records(state, self.items_path)
+                ]
+            else:
+                continue
+
+            drafts = [draft for draft in map(self.to_draft, products) if draft is not None]
+            if len(drafts) >= self.min_items:
+                self.stats['items'] += len(drafts)
+                return drafts
+
+        return []
+
+    def map_records(self, data: Any, items_path: Optional[str] = None) -> List['ListingEventDraft']:
+        """Черновики из JSON ответа API (items_path заменяет путь из спецификации)."""
+        records = iter_records(data, items_path if items_path is not None else self.items_path)
+        drafts = [draft for draft in map(self.to_draft, records) if draft is not None]
+        self.stats['pages'] += 1
+        self.stats['items'] += len(drafts)
+        return drafts
+
+    def _field(self, record: Dict[str, Any], name: str, parse=None) -> Any:
+        """Первое значение по путям поля (с parse — первое, которое удалось разобрать)."""
+        for path in self.fields.get(name, ()):
+            value = get_path(record, path)
+            if parse is not None:
+                value = parse(value)
+            if value not in (None, ''):
+                return value
+        return None
+
+    def to_draft(self, record: Dict[str, Any]) -> Optional['ListingEventDraft']:
+        """Запись товара (Product JSON-LD или произвольный JSON) -> ListingEventDraft."""
+        from .base import ListingEventDraft
+
+        title = self._field(record, 'title')
+        if not title or not isinstance(title, str):
+            return None
+
+        url = self._field(record, 'url')
+        if isinstance(url, str) and self.base_url and not url.startswith('http'):
+            url = urljoin(self.base_url + '/', url)
+        elif not isinstance(url, str):
+            url = None
+
+        price = self._field(record, 'price', parse_price)
+        old_price = self._field(record, 'old_price', parse_price)
+        discount_pct = None
+        if price and old_price and old_price > price:
+            discount_pct = round(((old_price - price) / old_price) * 100, 2)
+
+        availability = self._field(record, 'in_stock')
+        in_stock = parse_availability(availability)
+
+        kind = self._field(record, 'kind') or self.default_kind
+        if isinstance(availability, str) and any(word in availability.lower() for word in _PREORDER):
+            kind = 'preorder'
+
+        edition = self._field(record, 'edition')
+
+        return ListingEventDraft(
+            title=html.unescape(title).strip(),
+            url=url,
+            store_id=self.store_id,
+            kind=kind,
+            price=price,
+            discount_pct=discount_pct,
+            edition=edition if isinstance(edition, str) else None,
+            in_stock=True if in_stock is None else in_stock
+        )
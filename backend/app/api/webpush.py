@@ -8,6 +8,7 @@ from app.core.database import get_db
 from app.models.webpush_subscription import WebPushSubscription
 from app.services.webpush_service import webpush_service
 from app.schemas.webpush import (
+    WebPushPreferences,
     WebPushSubscriptionCreate,
     WebPushSubscriptionResponse,
     WebPushNotificationSend,
@@ -60,6 +61,8 @@ async def subscribe(
             existing.ip_address = ip_address
             existing.is_active = True
             existing.last_used_at = None
+            if subscription_data.preferences is not None:
+                existing.data = {**(existing.data or {}), 'preferences': subscription_data.preferences.to_data()}
             subscription_id = existing.id
         else:
             # Создаем новую подписку
@@ -69,7 +72,8 @@ async def subscribe(
                 endpoint=subscription_data.endpoint,
                 p256dh_key=subscription_data.keys.p256dh,
                 auth_key=subscription_data.keys.auth,
-                ip_address=ip_address
+                ip_address=ip_address,
+                data={'preferences': subscription_data.preferences.to_data()} if subscription_data.preferences else None
             )
             db.add(subscription)
 
@@ -111,6 +115,35 @@ async def unsubscribe(subscription_id: str, db: Session = Depends(get_db)):
         raise HTTPException(500, "Failed to unsubscribe")
 
 
+@router.put("/subscriptions/{subscription_id}/preferences")
+async def update_preferences(
+    subscription_id: str,
+    preferences: WebPushPreferences,
+    db: Session = Depends(get_db)
+):
+    """Задать предпочтения подписки: какие события она получает."""
+    try:
+        subscription = db.query(WebPushSubscription).filter(
+            WebPushSubscription.id == subscription_id
+        ).first()
+
+        if not subscription:
+            raise HTTPException(404, "Subscription not found")
+
+        # Новый словарь: JSON колонка не отслеживает изменения на месте
+        subscription.data = {**(subscription.data or {}), 'preferences': preferences.to_data()}
+        db.commit()
+
+        return {"status": "updated", "preferences": subscription.data['preferences']}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating subscription preferences: {e}")
+        db.rollback()
+        raise HTTPException(500, "Failed to update preferences")
+
+
 @router.post("/test")
 async def test_notification(
     payload: WebPushTestPayload,
@@ -146,11 +179,9 @@ async def test_notification(
 
         # Обрабатываем истекшие подписки
         if results['expired_subscriptions']:
-            expired_endpoints = [sub['endpoint'] for sub in results['expired_subscriptions']]
-            db.query(WebPushSubscription).filter(
-                WebPushSubscription.endpoint.in_(expired_endpoints)
-            ).update({"is_active": False}, synchronize_session=False)
-            db.commit()
+            webpush_service.deactivate_subscriptions(
+                db, [sub['endpoint'] for sub in results['expired_subscriptions']]
+            )
 
         return {
             "status": "sent",
@@ -186,7 +217,8 @@ async def get_subscriptions(
                 "ip_address": sub.ip_address,
                 "created_at": sub.created_at,
                 "last_used_at": sub.last_used_at,
-                "is_active": sub.is_active
+                "is_active": sub.is_active,
+                "preferences": (sub.data or {}).get('preferences')
             }
             for sub in subscriptions
         ]
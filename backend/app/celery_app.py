@@ -8,7 +8,8 @@ celery_app = Celery(
     include=[
         "app.tasks.agents",
         "app.tasks.notifications",
-        "app.tasks.cleanup"
+        "app.tasks.cleanup",
+        "app.tasks.reparse"
     ]
 )
 
@@ -19,11 +20,30 @@ celery_app.conf.update(
     result_serializer="json",
     timezone=settings.TZ,
     enable_utc=True,
+    # Доставка уведомлений - в отдельной очереди, чтобы медленные каналы
+    # не занимали воркеры обхода (worker -Q notifications). Обход и повторный
+    # разбор - в очереди agents: ее воркер работает с пулом потоков (worker -Q
+    # agents -P threads), иначе пул процессов разбора в нем не запустится
+    task_routes={
+        "app.tasks.notifications.*": {"queue": "notifications"},
+        "app.tasks.agents.*": {"queue": "agents"},
+        "app.tasks.reparse.*": {"queue": "agents"},
+    },
     beat_schedule={
         "cleanup-old-data": {
             "task": "app.tasks.cleanup.cleanup_old_data",
             "schedule": 24 * 60 * 60,  # ежедневно
         },
+        "deliver-notifications": {
+            "task": "app.tasks.notifications.process_pending_notifications",
+            "schedule": settings.NOTIFICATION_DELIVERY_INTERVAL,
+            "options": {"expires": settings.NOTIFICATION_DELIVERY_INTERVAL},
+        },
+        "flush-digests": {
+            "task": "app.tasks.notifications.flush_digests",
+            "schedule": settings.DIGEST_FLUSH_INTERVAL,
+            "options": {"expires": settings.DIGEST_FLUSH_INTERVAL},
+        },
         "backup-daily": {
             "task": "app.tasks.backup.backup_daily",
             "schedule": 24 * 60 * 60,  # ежедневно
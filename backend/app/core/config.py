@@ -39,17 +39,71 @@ class Settings(BaseSettings):
     # Telegram
     TELEGRAM_BOT_TOKEN: Optional[str] = None
     TELEGRAM_CHAT_ID: Optional[str] = None
+    TELEGRAM_API_URL: str = "https://api.telegram.org"  # свой Bot API сервер или заглушка нагрузочного теста
+    TELEGRAM_CHAT_INTERVAL: float = 1.0  # минимальный интервал между сообщениями в один чат, с
+    TELEGRAM_MAX_WAIT_SECONDS: float = 60.0  # дольше ждать очереди чата не будем: уведомление уйдет на повтор
+    TELEGRAM_DIGEST_THRESHOLD: int = 3  # с такого числа уведомлений в пачке они объединяются в сводки
+    TELEGRAM_TIMEOUT: float = 10.0
 
     # Web Push
     VAPID_PUBLIC_KEY: Optional[str] = None
     VAPID_PRIVATE_KEY: Optional[str] = None
     VAPID_ADMIN_EMAIL: Optional[str] = "admin@localhost"
+    WEBPUSH_CONCURRENCY: int = 200  # одновременных запросов к push-сервисам
+    WEBPUSH_ENCRYPT_EXECUTOR: str = "thread"  # 'thread' | 'process' | 'inline'
+    WEBPUSH_ENCRYPT_WORKERS: int = 0  # 0 - по числу ядер
+    WEBPUSH_VAPID_TTL: int = 12 * 60 * 60  # срок подписи VAPID, не больше суток
+    WEBPUSH_TIMEOUT: float = 10.0
+
+    # Доставка уведомлений (outbox)
+    NOTIFICATION_BATCH_SIZE: int = 100  # записей, забираемых воркером за раз
+    NOTIFICATION_LEASE_SECONDS: int = 300  # после этого забранная, но не доставленная запись берется снова
+    NOTIFICATION_MAX_ATTEMPTS: int = 5  # после стольких неудач запись переходит в 'dead'
+    NOTIFICATION_RETRY_BASE_SECONDS: float = 30.0  # пауза перед первым повтором, дальше удваивается
+    NOTIFICATION_RETRY_MAX_SECONDS: float = 3600.0
+    NOTIFICATION_TELEGRAM_CONCURRENCY: int = 1  # одновременных отправок на канал
+    NOTIFICATION_WEBPUSH_CONCURRENCY: int = 20
+    NOTIFICATION_DELIVERY_INTERVAL: int = 10  # как часто beat запускает доставку, секунд
+    NOTIFICATION_DELIVERY_MAX_SECONDS: int = 60  # длительность одного запуска доставки
+    NOTIFICATION_DELIVERY_KICK: bool = True  # запускать доставку сразу после обхода агента
+
+    # Сводки правил (AlertRule.digest)
+    DIGEST_FLUSH_INTERVAL: int = 300  # как часто beat собирает сводки закрывшихся периодов, секунд
+    DIGEST_DAILY_HOUR: int = 9  # час отправки дневной сводки (в часовом поясе TZ)
+    DIGEST_FLUSH_BATCH_SIZE: int = 5000  # записей буфера за транзакцию (правило не делится между транзакциями)
 
     # Ограничения
     MAX_DAILY_PAGES: int = 1000
     DEFAULT_RPS: float = 0.3
     DEFAULT_BURST: int = 1
 
+    # Планировщик агентов
+    AGENT_SCHEDULE_SYNC_SECONDS: int = 60  # как часто beat перечитывает source_agent
+    AGENT_SCHEDULE_JITTER_SECONDS: int = 120  # разброс старта запусков
+    AGENT_RUN_LOCK_TTL: int = 2 * 60 * 60  # максимальная длительность запуска агента
+
+    # Разбор страниц в пуле процессов
+    PARSE_EXECUTOR: str = "process"  # 'process' | 'inline'
+    PARSE_WORKERS: int = 0  # 0 - по числу ядер
+    PARSE_MAX_PENDING: int = 0  # страниц в очереди на разбор; 0 - 2 * PARSE_WORKERS
+
+    # Пул браузера для headless агентов
+    HEADLESS_CONTEXT_MAX_PAGES: int = 50  # страниц на контекст до его пересоздания
+    HEADLESS_MAX_MEMORY_MB: int = 1024  # перезапуск Chromium при превышении (нужен psutil)
+    HEADLESS_CONCURRENCY: int = 2  # параллельных страниц на агента
+
+    # Архив сырых страниц
+    RAW_ARCHIVE_BACKEND: str = "minio"  # 'minio' (S3_*) | 'local' | 'none'
+    RAW_ARCHIVE_DIR: str = "data/raw"  # каталог для бэкенда 'local'
+    RAW_ARCHIVE_LEVEL: int = 10  # уровень сжатия zstd
+    RAW_ARCHIVE_BATCH_SIZE: int = 50  # страниц в одной записи
+    RAW_ARCHIVE_FLUSH_SECONDS: float = 5.0  # максимальное ожидание неполной пачки
+    RAW_ARCHIVE_QUEUE_SIZE: int = 1000  # страниц в очереди; при переполнении страницы не архивируются
+
+    # HTTP кэш агентов для разработки и CI (кассеты vcrpy)
+    HTTP_CACHE_MODE: str = "off"  # 'off' | 'record' | 'replay' | 'cache_only'
+    HTTP_CACHE_DIR: str = "data/http_cache"
+
     # Настройки Celery
     CELERY_BROKER_URL: str = "redis://localhost:6379/0"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/0"
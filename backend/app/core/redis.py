@@ -0,0 +1,12 @@
+"""Подключение к Redis."""
+from functools import lru_cache
+
+import redis
+
+from app.core.config import settings
+
+
+@lru_cache()
+def get_redis() -> redis.Redis:
+    """Получить общий клиент Redis (один на процесс)."""
+    return redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
@@ -64,6 +64,13 @@ API_REQUESTS_TOTAL = Counter(
     registry=REGISTRY
 )
 
+HEADLESS_REQUESTS_TOTAL = Counter(
+    'headless_requests_total',
+    'Запросы страниц в браузере (загруженные и заблокированные)',
+    ['agent_id', 'outcome'],
+    registry=REGISTRY
+)
+
 # Гистограммы времени выполнения
 AGENT_DURATION_SECONDS = Histogram(
     'agent_duration_seconds',
@@ -73,6 +80,14 @@ AGENT_DURATION_SECONDS = Histogram(
     registry=REGISTRY
 )
 
+HEADLESS_PAGE_SECONDS = Histogram(
+    'headless_page_seconds',
+    'Время этапов загрузки страницы в браузере в секундах',
+    ['agent_id', 'phase'],
+    buckets=[0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0],
+    registry=REGISTRY
+)
+
 API_RESPONSE_TIME_SECONDS = Histogram(
     'api_response_time_seconds',
     'Время ответа API в секундах',
@@ -171,6 +186,16 @@ class MetricsCollector:
         """Записать время выполнения агента."""
         AGENT_DURATION_SECONDS.labels(agent_id=agent_id).observe(duration)
 
+    @staticmethod
+    def record_headless_page(agent_id: str, timing):
+        """Записать время этапов и число запросов страницы браузера (PageTiming)."""
+        for phase in ('dom', 'wait', 'scroll', 'content', 'total'):
+            value = getattr(timing, f"{phase}_ms")
+            if value:
+                HEADLESS_PAGE_SECONDS.labels(agent_id=agent_id, phase=phase).observe(value / 1000)
+        HEADLESS_REQUESTS_TOTAL.labels(agent_id=agent_id, outcome='loaded').inc(timing.requests)
+        HEADLESS_REQUESTS_TOTAL.labels(agent_id=agent_id, outcome='blocked').inc(timing.blocked)
+
     @staticmethod
     def record_api_response_time(method: str, endpoint: str, duration: float):
         """Записать время ответа API."""
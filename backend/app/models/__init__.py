@@ -3,10 +3,12 @@ from .game import Game
 from .store import Store
 from .agent import SourceAgent
 from .raw_item import RawItem
+from .crawl_state import CrawlState
 from .listing_event import ListingEvent, EventKind
 from .price_history import PriceHistory
 from .alert_rule import AlertRule
 from .notification import Notification
+from .digest_entry import DigestEntry
 from .webpush_subscription import WebPushSubscription
 
 __all__ = [
@@ -15,10 +17,12 @@ __all__ = [
     "Store",
     "SourceAgent",
     "RawItem",
+    "CrawlState",
     "ListingEvent",
     "EventKind",
     "PriceHistory",
     "AlertRule",
     "Notification",
+    "DigestEntry",
     "WebPushSubscription"
 ]
\ No newline at end of file
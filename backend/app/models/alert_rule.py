@@ -17,11 +17,13 @@ class AlertRule(BaseModel):
     channels = Column(JSON, nullable=False)  # ['webpush', 'telegram']
     cooldown_hours = Column(String(10), default="12")
     enabled = Column(Boolean, default=True)
+    digest = Column(String(10), nullable=False, default="immediate", server_default="immediate")  # 'immediate', 'hourly', 'daily'
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
     notifications = relationship("Notification", back_populates="rule")
+    digest_entries = relationship("DigestEntry", back_populates="rule", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<AlertRule(id='{self.id}', name='{self.name}', enabled={self.enabled})>"
\ No newline at end of file
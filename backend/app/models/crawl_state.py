@@ -0,0 +1,32 @@
+from sqlalchemy import Column, String, DateTime, Text, Integer, Float, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
+
+from .base import BaseModel
+
+
+class CrawlState(BaseModel):
+    """Состояние обхода URL агентом (для адаптивного расписания)"""
+    __tablename__ = "crawl_state"
+    __table_args__ = (
+        UniqueConstraint("source_id", "url", name="uq_crawl_state_source_url"),
+    )
+
+    source_id = Column(String, ForeignKey("source_agent.id"), nullable=False, index=True)
+    url = Column(Text, nullable=False)
+    content_hash = Column(String(64))  # SHA-256 последнего полученного тела
+    etag = Column(String(255))  # валидаторы для условных запросов
+    last_modified = Column(String(64))
+    last_fetched_at = Column(DateTime(timezone=True))
+    last_changed_at = Column(DateTime(timezone=True))
+    next_fetch_at = Column(DateTime(timezone=True), index=True)
+    change_ewma = Column(Float, default=0.5)  # сглаженная доля обходов с изменениями
+    interval_ewma = Column(Float, nullable=True)  # сглаженный интервал между обходами, секунд
+    change_rate = Column(Float, default=0.0)  # оценка интенсивности изменений (в час)
+    fetch_count = Column(Integer, default=0)
+    change_count = Column(Integer, default=0)
+
+    # Relationships
+    source_agent = relationship("SourceAgent", backref="crawl_states")
+
+    def __repr__(self):
+        return f"<CrawlState(source_id='{self.source_id}', url='{self.url}', rate={self.change_rate})>"
@@ -0,0 +1,31 @@
+from sqlalchemy import Column, DateTime, JSON, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+
+from .base import BaseModel
+
+
+class DigestEntry(BaseModel):
+    """
+    Модель буфера сводок.
+
+    Совпадение события с правилом в режиме сводки (AlertRule.digest 'hourly'
+    или 'daily') не создает уведомления: оно копится здесь и по окончании
+    периода превращается в одно уведомление на канал (см. digest_service).
+    """
+    __tablename__ = "digest_entry"
+    __table_args__ = (
+        Index("ix_digest_entry_rule_created", "rule_id", "created_at"),
+    )
+
+    rule_id = Column(UUID(as_uuid=True), ForeignKey("alert_rule.id"), nullable=False)
+    event_id = Column(UUID(as_uuid=True), ForeignKey("listing_event.id"), nullable=False)
+    payload = Column(JSON, nullable=False)  # данные события для сообщения
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    rule = relationship("AlertRule", back_populates="digest_entries")
+
+    def __repr__(self):
+        return f"<DigestEntry(id='{self.id}', rule_id='{self.rule_id}', event_id='{self.event_id}')>"
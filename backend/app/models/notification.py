@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime, JSON, Text, ForeignKey
+from sqlalchemy import Column, String, Integer, DateTime, JSON, Text, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -8,12 +8,26 @@ from .base import BaseModel
 
 
 class Notification(BaseModel):
-    """Модель уведомлений"""
+    """
+    Модель уведомлений.
+
+    Запись одновременно служит очередью доставки (outbox): создается со
+    статусом 'pending' в одной транзакции с событием и доставляется воркером
+    (см. notification_delivery). Одна запись - один канал правила.
+    """
     __tablename__ = "notification"
+    __table_args__ = (
+        Index("ix_notification_status_next_attempt", "status", "next_attempt_at"),
+    )
 
     rule_id = Column(UUID(as_uuid=True), ForeignKey("alert_rule.id"), nullable=False)
     event_id = Column(UUID(as_uuid=True), ForeignKey("listing_event.id"), nullable=False)
-    status = Column(String(20), nullable=False, default="pending")  # 'sent', 'error', 'deferred'
+    status = Column(String(20), nullable=False, default="pending")  # 'pending', 'sending', 'retry', 'sent', 'dead'
+    channel = Column(String(20))  # 'telegram', 'webpush'
+    payload = Column(JSON)  # данные для канала
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True))  # когда доставлять (для 'sending' - конец аренды)
+    last_error = Column(Text)
     sent_at = Column(DateTime(timezone=True))
     meta = Column(JSON, default={})  # Дополнительные метаданные
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -23,4 +37,4 @@ class Notification(BaseModel):
     event = relationship("ListingEvent", back_populates="notifications")
 
     def __repr__(self):
-        return f"<Notification(id='{self.id}', rule_id='{self.rule_id}', status='{self.status}')>"
\ No newline at end of file
+        return f"<Notification(id='{self.id}', rule_id='{self.rule_id}', status='{self.status}')>"
@@ -0,0 +1,177 @@
+"""
+Планировщик Celery Beat на основе расписаний агентов из базы данных.
+
+Запуск:
+    celery -A app.celery_app beat -S app.scheduler:AgentScheduler
+
+Каждый включенный SourceAgent получает собственную запись в расписании,
+построенную из поля `schedule`. Таблица source_agent периодически
+перечитывается, поэтому изменения агентов подхватываются без перезапуска beat.
+"""
+
+import hashlib
+import json
+import logging
+import random
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from celery.beat import Scheduler
+from celery.schedules import crontab, schedule as interval_schedule
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.agent import SourceAgent
+
+logger = logging.getLogger(__name__)
+
+AGENT_TASK = "app.tasks.agents.run_agent_task"
+AGENT_ENTRY_PREFIX = "agent:"
+
+
+def build_schedule(schedule: Dict[str, Any]):
+    """
+    Построить расписание Celery из поля SourceAgent.schedule.
+
+    Поддерживаемые форматы:
+        {"cron": "0 */2 * * *"}
+        {"type": "interval", "value": 3600}
+        {"type": "daily", "time": "09:00"}
+        {"type": "weekly", "time": "09:00", "day_of_week": 1}
+        {"type": "monthly", "time": "09:00", "day_of_month": 1}
+
+    Cron выражения интерпретируются в часовом поясе settings.TZ.
+
+    Returns:
+        Расписание Celery или None, если формат не распознан
+    """
+    if not schedule:
+        return None
+
+    cron = schedule.get('cron')
+    if cron:
+        parts = cron.split()
+        if len(parts) != 5:
+            raise ValueError(f"Invalid cron expression: {cron}")
+        minute, hour, day_of_month, month_of_year, day_of_week = parts
+        return crontab(
+            minute=minute,
+            hour=hour,
+            day_of_week=day_of_week,
+            day_of_month=day_of_month,
+            month_of_year=month_of_year
+        )
+
+    schedule_type = schedule.get('type')
+    if schedule_type == 'interval':
+        return interval_schedule(timedelta(seconds=float(schedule['value'])))
+
+    if schedule_type in ('daily', 'weekly', 'monthly'):
+        hour, minute = str(schedule.get('time', '00:00')).split(':')
+        kwargs = {'minute': int(minute), 'hour': int(hour)}
+        if schedule_type == 'weekly':
+            kwargs['day_of_week'] = schedule.get('day_of_week', 1)
+        elif schedule_type == 'monthly':
+            kwargs['day_of_month'] = schedule.get('day_of_month', 1)
+        return crontab(**kwargs)
+
+    return None
+
+
+class AgentScheduler(Scheduler):
+    """Beat планировщик, читающий расписания агентов из source_agent."""
+
+    def __init__(self, *args, **kwargs):
+        self._fingerprint: Optional[str] = None
+        self._last_sync = 0.0
+        self._jitter: Dict[str, float] = {}
+        super().__init__(*args, **kwargs)
+
+    def setup_schedule(self):
+        self.install_default_entries(self.data)
+        self._sync_agents(force=True)
+
+    def get_schedule(self):
+        if time.monotonic() - self._last_sync >= settings.AGENT_SCHEDULE_SYNC_SECONDS:
+            self._sync_agents()
+        return self.data
+
+    schedule = property(get_schedule, Scheduler.set_schedule)
+
+    def apply_async(self, entry, producer=None, advance=True, **kwargs):
+        # Разносим старт запусков, чтобы агенты с одинаковым cron
+        # не нагружали воркеры и магазины одновременно
+        jitter = self._jitter.get(entry.name)
+        if jitter:
+            entry.options['countdown'] = random.uniform(0, jitter)
+        return super().apply_async(entry, producer=producer, advance=advance, **kwargs)
+
+    def _load_agents(self):
+        db = SessionLocal()
+        try:
+            return db.query(
+                SourceAgent.id, SourceAgent.schedule
+            ).filter(SourceAgent.enabled == True).order_by(SourceAgent.id).all()
+        finally:
+            db.close()
+
+    def _sync_agents(self, force: bool = False):
+        """Перечитать агентов и обновить расписание, если оно изменилось."""
+        self._last_sync = time.monotonic()
+
+        try:
+            agents = self._load_agents()
+        except Exception as e:
+            logger.error(f"Failed to load agent schedules: {e}")
+            if not force:
+                return
+            agents = []
+
+        fingerprint = hashlib.sha256(
+            json.dumps([(str(a.id), a.schedule) for a in agents], sort_keys=True, default=str).encode()
+        ).hexdigest()
+        if not force and fingerprint == self._fingerprint:
+            return
+
+        entries = dict(self.app.conf.beat_schedule)
+        jitter = {}
+        for agent in agents:
+            try:
+                agent_schedule = build_schedule(agent.schedule or {})
+            except (KeyError, ValueError, TypeError) as e:
+                logger.warning(f"Invalid schedule for agent {agent.id}: {e}")
+                continue
+
+            if agent_schedule is None:
+                logger.warning(f"Agent {agent.id} has no usable schedule, skipping")
+                continue
+
+            name = f"{AGENT_ENTRY_PREFIX}{agent.id}"
+            entries[name] = {
+                'task': AGENT_TASK,
+                'schedule': agent_schedule,
+                'args': (str(agent.id),),
+                'options': {},
+            }
+            jitter[name] = float(
+                (agent.schedule or {}).get('jitter', settings.AGENT_SCHEDULE_JITTER_SECONDS)
+            )
+
+        self._merge_entries(entries)
+        self._jitter = jitter
+        self._fingerprint = fingerprint
+        logger.info(f"Loaded schedules for {len(jitter)} agents")
+
+    def _merge_entries(self, entries: Dict[str, Dict[str, Any]]):
+        """Заменить записи расписания, сохранив время последних запусков."""
+        for name in set(self.data) - set(entries):
+            if name != 'celery.backend_cleanup':
+                self.data.pop(name, None)
+
+        for name, options in entries.items():
+            entry = self.Entry(**dict(options, name=name, app=self.app))
+            if name in self.data:
+                self.data[name].update(entry)
+            else:
+                self.data[name] = entry
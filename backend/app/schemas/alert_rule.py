@@ -10,6 +10,12 @@ class LogicOperator(str, Enum):
     OR = "OR"
 
 
+class DigestMode(str, Enum):
+    IMMEDIATE = "immediate"
+    HOURLY = "hourly"
+    DAILY = "daily"
+
+
 class ComparisonOperator(str, Enum):
     IN = "in"
     CONTAINS = "contains"
@@ -33,6 +39,7 @@ class AlertRuleBase(BaseModel):
     conditions: List[AlertCondition] = Field(..., min_items=1)
     channels: List[str] = Field(..., min_items=1)
     cooldown_hours: int = Field(default=12, ge=1, le=168)  # от 1 часа до недели
+    digest: DigestMode = Field(default=DigestMode.IMMEDIATE, description="Сразу или сводкой за час/день")
     enabled: bool = Field(default=True)
 
 
@@ -48,6 +55,7 @@ class AlertRuleUpdate(BaseModel):
     conditions: Optional[List[AlertCondition]] = Field(None, min_items=1)
     channels: Optional[List[str]] = Field(None, min_items=1)
     cooldown_hours: Optional[int] = Field(None, ge=1, le=168)
+    digest: Optional[DigestMode] = None
     enabled: Optional[bool] = None
 
 
@@ -1,5 +1,8 @@
 from pydantic import BaseModel, validator
 from typing import Optional, Dict, Any, List
+from uuid import UUID
+
+from app.schemas.listing_event import EventKind
 
 
 class WebPushKeys(BaseModel):
@@ -8,11 +11,35 @@ class WebPushKeys(BaseModel):
     auth: str
 
 
+class WebPushPreferences(BaseModel):
+    """Предпочтения подписки: пустой список - без ограничения по полю."""
+    stores: List[str] = []
+    kinds: List[EventKind] = []
+    games: List[UUID] = []
+    max_price: Optional[float] = None
+
+    @validator('max_price')
+    def validate_max_price(cls, v):
+        if v is not None and v < 0:
+            raise ValueError('max_price must be non-negative')
+        return v
+
+    def to_data(self) -> Dict[str, Any]:
+        """Предпочтения для WebPushSubscription.data (JSON)."""
+        return {
+            'stores': sorted(set(self.stores)),
+            'kinds': sorted({kind.value for kind in self.kinds}),
+            'games': sorted({str(game_id) for game_id in self.games}),
+            'max_price': self.max_price
+        }
+
+
 class WebPushSubscriptionCreate(BaseModel):
     """Данные для создания Web Push подписки."""
     endpoint: str
     keys: WebPushKeys
     user_agent: str
+    preferences: Optional[WebPushPreferences] = None
 
     @validator('endpoint')
     def validate_endpoint(cls, v):
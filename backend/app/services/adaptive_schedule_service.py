@@ -0,0 +1,228 @@
+"""
+Адаптивное расписание обхода страниц агентов.
+
+Для каждой пары (агент, URL) хранится оценка интенсивности изменений λ
+(модель Пуассона): сглаженная доля обходов, на которых страница изменилась
+(новые события или другой хэш тела), пересчитывается в λ с учетом сглаженного
+интервала между обходами. Следующий обход назначается так, чтобы вероятность
+изменения к его моменту была около target_change_probability, в пределах
+[min_interval, max_interval].
+
+Включается в расписании агента:
+    {"cron": "*/15 * * * *", "adaptive": {"min_interval": 900, "max_interval": 86400}}
+
+Cron при этом задает частоту проверки, а не частоту обхода каждого URL.
+"""
+
+import logging
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.redis import get_redis
+from app.models.agent import SourceAgent
+from app.models.crawl_state import CrawlState
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AdaptivePolicy:
+    """Параметры адаптивного расписания агента."""
+    min_interval: float = 15 * 60
+    max_interval: float = 24 * 60 * 60
+    target_change_probability: float = 0.5
+    alpha: float = 0.3
+
+    def next_interval(self, change_rate: float) -> float:
+        """Интервал до следующего обхода (сек) для интенсивности change_rate (в час)."""
+        if change_rate <= 0:
+            return self.max_interval
+
+        interval = -math.log(1 - self.target_change_probability) / change_rate * 3600
+        return min(max(interval, self.min_interval), self.max_interval)
+
+
+class AdaptiveScheduleService:
+    """Сервис адаптивного выбора страниц для обхода."""
+
+    def is_enabled(self, agent: SourceAgent) -> bool:
+        """Включено ли адаптивное расписание для агента."""
+        return bool((agent.schedule or {}).get('adaptive'))
+
+    def get_policy(self, agent: SourceAgent) -> AdaptivePolicy:
+        """Получить параметры адаптивного расписания агента."""
+        options = (agent.schedule or {}).get('adaptive')
+        if not isinstance(options, dict):
+            return AdaptivePolicy()
+
+        fields = AdaptivePolicy.__dataclass_fields__
+        return AdaptivePolicy(**{k: float(v) for k, v in options.items() if k in fields})
+
+    def select_due_urls(
+        self,
+        db: Session,
+        agent: SourceAgent,
+        urls: List[str],
+        now: Optional[datetime] = None
+    ) -> List[str]:
+        """
+        Выбрать URL, которые пора обойти.
+
+        Если due-страниц больше, чем осталось в дневном лимите
+        rate_limit.daily_pages_cap, выбираются страницы с наибольшей
+        вероятностью изменения.
+        """
+        now = now or datetime.now(timezone.utc)
+        states = self._get_states(db, agent.id, urls)
+
+        due = [
+            url for url in urls
+            if url not in states
+            or states[url].next_fetch_at is None
+            or states[url].next_fetch_at <= now
+        ]
+
+        budget = self._remaining_budget(agent)
+        if budget is not None and len(due) > budget:
+            ranked = sorted(
+                due,
+                key=lambda url: self.change_probability(states.get(url), now),
+                reverse=True
+            )
+            selected = set(ranked[:budget])
+            due = [url for url in due if url in selected]
+
+        return due
+
+    def record_fetch(
+        self,
+        db: Session,
+        agent: SourceAgent,
+        url: str,
+        content_hash: Optional[str],
+        new_events: int,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        now: Optional[datetime] = None,
+        save_validators: bool = True
+    ) -> CrawlState:
+        """
+        Учесть результат обхода страницы и назначить следующий обход.
+
+        Вместе с оценкой частоты сохраняются валидаторы (ETag, Last-Modified,
+        хэш тела) для условных запросов при следующем обходе. С
+        save_validators=False (разбор или сохранение событий не удались)
+        остаются прежние валидаторы, и следующий обход разберет страницу снова.
+        """
+        now = now or datetime.now(timezone.utc)
+        policy = self.get_policy(agent)
+
+        state = db.query(CrawlState).filter(
+            CrawlState.source_id == agent.id,
+            CrawlState.url == url
+        ).first()
+        if not state:
+            state = CrawlState(source_id=agent.id, url=url, change_ewma=0.5, change_rate=0.0,
+                               fetch_count=0, change_count=0)
+            db.add(state)
+
+        content_hash = content_hash or state.content_hash
+        changed = new_events > 0 or (
+            state.content_hash is not None and state.content_hash != content_hash
+        )
+
+        if state.last_fetched_at is not None:
+            elapsed = max((now - state.last_fetched_at).total_seconds(), 1.0)
+            a = policy.alpha
+            state.change_ewma = a * float(changed) + (1 - a) * state.change_ewma
+            state.interval_ewma = elapsed if state.interval_ewma is None else \
+                a * elapsed + (1 - a) * state.interval_ewma
+
+            p = min(state.change_ewma, 0.99)
+            state.change_rate = -math.log(1 - p) / (state.interval_ewma / 3600)
+            interval = policy.next_interval(state.change_rate)
+        else:
+            # Первое наблюдение — данных для оценки еще нет
+            interval = policy.min_interval
+
+        if changed:
+            state.change_count += 1
+            state.last_changed_at = now
+
+        state.fetch_count += 1
+        if save_validators:
+            state.content_hash = content_hash
+            state.etag = etag
+            state.last_modified = last_modified
+        state.last_fetched_at = now
+        state.next_fetch_at = now + timedelta(seconds=interval)
+        db.commit()
+
+        self._count_page(agent.id, now)
+        return state
+
+    def get_validators(self, db: Session, agent_id: str) -> Dict[str, Dict[str, Optional[str]]]:
+        """Валидаторы прошлых обходов всех страниц агента для RuntimeContext."""
+        rows = db.query(
+            CrawlState.url, CrawlState.etag, CrawlState.last_modified, CrawlState.content_hash
+        ).filter(CrawlState.source_id == agent_id).all()
+
+        return {
+            row.url: {
+                'etag': row.etag,
+                'last_modified': row.last_modified,
+                'hash': row.content_hash
+            }
+            for row in rows
+        }
+
+    def change_probability(self, state: Optional[CrawlState], now: datetime) -> float:
+        """Вероятность того, что страница изменилась с последнего обхода."""
+        if state is None or state.last_fetched_at is None:
+            return 1.0
+
+        elapsed_hours = max((now - state.last_fetched_at).total_seconds(), 0) / 3600
+        return 1 - math.exp(-(state.change_rate or 0.0) * elapsed_hours)
+
+    def _get_states(self, db: Session, agent_id: str, urls: List[str]) -> Dict[str, CrawlState]:
+        if not urls:
+            return {}
+
+        states = db.query(CrawlState).filter(
+            CrawlState.source_id == agent_id,
+            CrawlState.url.in_(urls)
+        ).all()
+        return {state.url: state for state in states}
+
+    def _remaining_budget(self, agent: SourceAgent) -> Optional[int]:
+        """Сколько страниц агент еще может загрузить сегодня."""
+        cap = (agent.rate_limit or {}).get('daily_pages_cap')
+        if cap is None:
+            return None
+
+        try:
+            fetched = int(get_redis().get(self._pages_key(agent.id, datetime.now(timezone.utc))) or 0)
+        except Exception as e:
+            logger.warning(f"Failed to read daily page counter for {agent.id}: {e}")
+            fetched = 0
+
+        return max(int(cap) - fetched, 0)
+
+    def _count_page(self, agent_id: str, now: datetime):
+        try:
+            client = get_redis()
+            key = self._pages_key(agent_id, now)
+            client.incr(key)
+            client.expire(key, 2 * 24 * 60 * 60)
+        except Exception as e:
+            logger.warning(f"Failed to update daily page counter for {agent_id}: {e}")
+
+    def _pages_key(self, agent_id: str, now: datetime) -> str:
+        return f"bgw:agent-pages:{agent_id}:{now.date().isoformat()}"
+
+
+adaptive_schedule_service = AdaptiveScheduleService()
@@ -0,0 +1,179 @@
+"""
+Перезарядка (cooldown) правил уведомлений.
+
+Состояние перезарядки хранится в Redis: ключ bgw:cooldown:<rule_id> содержит
+время последней отправки по правилу и живет cooldown_hours правила. Проверка
+всех сработавших правил пачки событий - один MGET вместо запроса к таблице
+notification на каждое правило и событие.
+
+Перед постановкой уведомления в очередь правило атомарно «занимается» скриптом Lua: ключ записывается,
+только если перезарядка не идет. Поэтому два воркера, одновременно нашедшие
+событие для одного правила, не отправят два уведомления. Если транзакция с
+уведомлением не зафиксирована, ключ снимается.
+
+Пока кэш не заполнен (первый запуск, очистка Redis), последние отправки
+загружаются из таблицы notification одним запросом. Без Redis перезарядка
+проверяется по таблице notification, как раньше.
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Set
+
+from redis.exceptions import RedisError
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.redis import get_redis
+from app.models.alert_rule import AlertRule
+from app.models.notification import Notification
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "bgw:cooldown:"
+# Признак того, что ключи перезарядки загружены из базы
+WARM_KEY = "bgw:cooldown:warm"
+
+# Занять правило: записать время отправки, если перезарядка не идет.
+# Время в ключе сравнивается с текущей перезарядкой правила: после ее
+# уменьшения старый ключ не блокирует отправку до своего истечения.
+CLAIM_SCRIPT = """
+local sent = redis.call('GET', KEYS[1])
+if sent and tonumber(sent) + tonumber(ARGV[2]) > tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+
+def cooldown_seconds(cooldown_hours: Any) -> int:
+    """Длительность перезарядки в секундах (cooldown_hours хранится строкой)."""
+    try:
+        return max(int(float(cooldown_hours or 0) * 3600), 0)
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid cooldown_hours: {cooldown_hours!r}")
+        return 0
+
+
+def _elapsed(sent_at: datetime) -> timedelta:
+    """Время с отправки (время без часового пояса считается UTC)."""
+    if sent_at.tzinfo is None:
+        sent_at = sent_at.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - sent_at
+
+
+def _key(rule_id) -> str:
+    return f"{KEY_PREFIX}{rule_id}"
+
+
+class CooldownService:
+    """Проверка и установка перезарядки правил через Redis."""
+
+    def __init__(self):
+        self._claim_script = None
+
+    def active(self, db: Session, rules: Iterable) -> Set:
+        """id правил (с атрибутами id и cooldown_hours), у которых идет перезарядка."""
+        rules = {rule.id: rule for rule in rules if cooldown_seconds(rule.cooldown_hours) > 0}
+        if not rules:
+            return set()
+
+        try:
+            client = get_redis()
+            self._ensure_warm(db, client)
+            values = client.mget([_key(rule_id) for rule_id in rules])
+        except RedisError as e:
+            logger.warning(f"Redis unavailable, checking cooldown in database: {e}")
+            return self._active_from_db(db, rules.values())
+
+        now = time.time()
+        return {
+            rule_id
+            for (rule_id, rule), sent in zip(rules.items(), values)
+            if sent is not None and float(sent) + cooldown_seconds(rule.cooldown_hours) > now
+        }
+
+    def claim(self, db: Session, rule) -> bool:
+        """
+        Занять правило перед отправкой.
+
+        True - перезарядки нет и она начата этой отправкой; False - по правилу
+        уже отправлено (в том числе другим воркером только что).
+        """
+        seconds = cooldown_seconds(rule.cooldown_hours)
+        if seconds <= 0:
+            return True
+
+        try:
+            client = get_redis()
+            if self._claim_script is None:
+                self._claim_script = client.register_script(CLAIM_SCRIPT)
+            return bool(self._claim_script(keys=[_key(rule.id)], args=[time.time(), seconds], client=client))
+        except RedisError as e:
+            logger.warning(f"Redis unavailable, checking cooldown in database: {e}")
+            return not self._active_from_db(db, [rule])
+
+    def release(self, rule):
+        """Снять перезарядку, занятую уведомлением, которое не попало в очередь."""
+        if cooldown_seconds(rule.cooldown_hours) <= 0:
+            return
+        try:
+            get_redis().delete(_key(rule.id))
+        except RedisError as e:
+            logger.warning(f"Failed to release cooldown of rule {rule.id}: {e}")
+
+    def _last_sent(self, db: Session, rule_ids, since: datetime) -> Dict[Any, datetime]:
+        # Уведомления в очереди outbox тоже занимают правило: время - постановка в очередь
+        sent_at = func.coalesce(Notification.sent_at, Notification.created_at)
+        rows = db.query(Notification.rule_id, func.max(sent_at))\
+            .filter(
+                Notification.rule_id.in_(list(rule_ids)),
+                Notification.status.in_(('sent', 'pending', 'sending', 'retry')),
+                sent_at >= since
+            )\
+            .group_by(Notification.rule_id)\
+            .all()
+        return {rule_id: sent_at for rule_id, sent_at in rows if sent_at is not None}
+
+    def _active_from_db(self, db: Session, rules: Iterable) -> Set:
+        """Правила в перезарядке по таблице notification (один запрос на все правила)."""
+        rules = list(rules)
+        longest = max(cooldown_seconds(rule.cooldown_hours) for rule in rules)
+        last_sent = self._last_sent(db, [rule.id for rule in rules], datetime.now(timezone.utc) - timedelta(seconds=longest))
+
+        active = set()
+        for rule in rules:
+            sent_at = last_sent.get(rule.id)
+            if sent_at is not None and _elapsed(sent_at) < timedelta(seconds=cooldown_seconds(rule.cooldown_hours)):
+                active.add(rule.id)
+        return active
+
+    def _ensure_warm(self, db: Session, client):
+        """Загрузить последние отправки из базы, если ключей перезарядки в Redis еще нет."""
+        if client.exists(WARM_KEY):
+            return
+
+        rules = {
+            rule_id: cooldown_seconds(cooldown_hours)
+            for rule_id, cooldown_hours in db.query(AlertRule.id, AlertRule.cooldown_hours)
+            .filter(AlertRule.enabled == True)
+        }
+        rules = {rule_id: seconds for rule_id, seconds in rules.items() if seconds > 0}
+        if rules:
+            last_sent = self._last_sent(db, rules, datetime.now(timezone.utc) - timedelta(seconds=max(rules.values())))
+            pipe = client.pipeline()
+            for rule_id, sent_at in last_sent.items():
+                elapsed = _elapsed(sent_at).total_seconds()
+                remaining = int(rules[rule_id] - elapsed)
+                if remaining > 0:
+                    pipe.set(_key(rule_id), time.time() - elapsed, ex=remaining, nx=True)
+            pipe.set(WARM_KEY, datetime.now(timezone.utc).isoformat())
+            pipe.execute()
+        else:
+            client.set(WARM_KEY, datetime.now(timezone.utc).isoformat())
+        logger.info(f"Loaded cooldown state of {len(rules)} rules from database")
+
+
+cooldown_service = CooldownService()
@@ -7,8 +7,8 @@
 
 import hashlib
 import re
-from datetime import datetime, timezone
-from typing import Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, Set
 
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
@@ -53,12 +53,15 @@ def normalize_text(text: str) -> str:
     return text
 
 
-def calculate_signature_hash(event_data: Dict[str, Any]) -> str:
+def calculate_signature_hash(event_data: Dict[str, Any], observed_at: Optional[datetime] = None) -> str:
     """
     Вычисление signature_hash для дедупликации событий.
 
     Args:
         event_data: Данные события
+        observed_at: Время наблюдения (по умолчанию сейчас); задает бакет по
+            дате, поэтому события, восстановленные из архива, сравниваются с
+            событиями своего дня, а не сегодняшнего
 
     Returns:
         SHA256 хеш
@@ -73,18 +76,11 @@ def calculate_signature_hash(event_data: Dict[str, Any]) -> str:
     edition = normalize_text(event_data.get('edition', ''))
 
     # Округляем цену до целого или null
-    price = event_data.get('price')
-    if price is not None:
-        try:
-            round_price = str(int(round(float(price))))
-        except (ValueError, TypeError):
-            round_price = 'null'
-    else:
-        round_price = 'null'
-
-    # Создаем бакет по дате (24 часа)
-    now = datetime.now(timezone.utc)
-    date_bucket = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    round_price = _round_price(event_data.get('price'))
+
+    # Создаем бакет по дате (24 часа, UTC; время без пояса считается местным)
+    observed = observed_at.astimezone(timezone.utc) if observed_at else datetime.now(timezone.utc)
+    date_bucket = observed.replace(hour=0, minute=0, second=0, microsecond=0)
 
     # Формируем базовую строку для хеширования
     base = f"{title}|{store_id}|{edition}|{round_price}|{date_bucket.isoformat()}"
@@ -95,10 +91,84 @@ def calculate_signature_hash(event_data: Dict[str, Any]) -> str:
     return signature_hash
 
 
+def calculate_listing_state_hash(event_data: Dict[str, Any]) -> str:
+    """
+    Хэш состояния листинга без привязки ко времени.
+
+    В отличие от signature_hash не содержит бакета по дате, поэтому
+    совпадает для одного и того же товара с той же ценой и наличием
+    между запусками агента.
+
+    Args:
+        event_data: Данные события (title, store_id, edition, price, in_stock)
+
+    Returns:
+        SHA256 хеш
+    """
+    title = normalize_text(event_data.get('title', ''))
+    store_id = event_data.get('store_id') or ''
+    edition = normalize_text(event_data.get('edition') or '')
+    round_price = _round_price(event_data.get('price'))
+    in_stock = event_data.get('in_stock')
+
+    base = f"{title}|{store_id}|{edition}|{round_price}|{in_stock}"
+    return hashlib.sha256(base.encode('utf-8')).hexdigest()
+
+
+def get_known_listing_states(db: Session, source_id: str, days: int = 30) -> Set[str]:
+    """
+    Получить хэши состояний листингов, уже встречавшихся у источника.
+
+    Args:
+        db: Сессия базы данных
+        source_id: ID агента
+        days: Глубина истории в днях
+
+    Returns:
+        Множество хэшей calculate_listing_state_hash
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+
+    rows = db.query(
+        ListingEvent.title,
+        ListingEvent.store_id,
+        ListingEvent.edition,
+        ListingEvent.price,
+        ListingEvent.in_stock
+    ).filter(
+        and_(
+            ListingEvent.source_id == source_id,
+            ListingEvent.created_at >= since
+        )
+    ).all()
+
+    return {
+        calculate_listing_state_hash({
+            'title': row.title,
+            'store_id': row.store_id,
+            'edition': row.edition,
+            'price': row.price,
+            'in_stock': row.in_stock
+        })
+        for row in rows
+    }
+
+
+def _round_price(price: Any) -> str:
+    """Округлить цену до целого или вернуть 'null'."""
+    if price is None:
+        return 'null'
+    try:
+        return str(int(round(float(price))))
+    except (ValueError, TypeError):
+        return 'null'
+
+
 def is_duplicate_event(
     db: Session,
     signature_hash: str,
-    hours_back: int = 72
+    hours_back: int = 72,
+    observed_at: Optional[datetime] = None
 ) -> Optional[ListingEvent]:
     """
     Проверка на дубликат события.
@@ -107,12 +177,14 @@ def is_duplicate_event(
         db: Сессия базы данных
         signature_hash: Хеш для проверки
         hours_back: Период проверки в часах
+        observed_at: Время наблюдения, от которого отсчитывается период
+            (по умолчанию сейчас)
 
     Returns:
         Найденный дубликат или None
     """
-    since = datetime.now(timezone.utc).replace(tzinfo=None) - \
-             datetime.timedelta(hours=hours_back)
+    observed = observed_at.astimezone(timezone.utc) if observed_at else datetime.now(timezone.utc)
+    since = observed.replace(tzinfo=None) - timedelta(hours=hours_back)
 
     duplicate = db.query(ListingEvent).filter(
         and_(
@@ -169,7 +241,7 @@ def cleanup_old_duplicates(db: Session, days_old: int = 7) -> int:
         Количество удаленных записей
     """
     cutoff_date = datetime.now(timezone.utc).replace(tzinfo=None) - \
-                  datetime.timedelta(days=days_old)
+                  timedelta(days=days_old)
 
     # Ищем дубликаты старше указанной даты
     duplicates = db.query(ListingEvent).filter(
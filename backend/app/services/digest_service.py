@@ -0,0 +1,154 @@
+"""
+Сводки уведомлений по правилам.
+
+Правило в режиме сводки (AlertRule.digest 'hourly' или 'daily') не создает
+уведомление на каждое совпадение: EventService записывает совпадения в буфер
+digest_entry (событие и данные для сообщения) в той же транзакции, что и
+события. Задача flush_digests по расписанию собирает буфер закрывшихся
+периодов: все совпадения правила за период превращаются в одну запись outbox
+на канал с payload {'digest', 'rule_id', 'rule_name', 'items': [...]}, а
+строки буфера удаляются в той же транзакции. Дальше сводка доставляется
+notification_delivery как обычное уведомление; каналы отрисовывают ее одним
+сообщением (is_digest).
+
+Периоды выровнены по часовому поясу TZ: часовая сводка закрывается в начале
+каждого часа, дневная - в DIGEST_DAILY_HOUR. Совпадения правил, переведенных
+обратно в 'immediate', отправляются при ближайшем запуске, выключенных -
+удаляются без отправки.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.alert_rule import AlertRule
+from app.models.digest_entry import DigestEntry
+from app.models.notification import Notification
+
+logger = logging.getLogger(__name__)
+
+DIGEST_MODES = ('hourly', 'daily')
+
+
+def is_digest(payload: Dict[str, Any]) -> bool:
+    """Payload уведомления - сводка правила за период."""
+    return isinstance(payload.get('items'), list)
+
+
+class DigestService:
+    """Сборка сводок из буфера в outbox."""
+
+    def __init__(self, tz: str = "UTC", daily_hour: int = 9, batch_size: int = 5000):
+        self.tz = ZoneInfo(tz)
+        self.daily_hour = daily_hour
+        self.batch_size = batch_size
+
+    def cutoffs(self, now: Optional[datetime] = None) -> Dict[str, datetime]:
+        """Начало текущего периода каждого режима: раньше записанное пора отправить."""
+        local = (now or datetime.now(timezone.utc)).astimezone(self.tz)
+        hour = local.replace(minute=0, second=0, microsecond=0)
+        day = hour.replace(hour=self.daily_hour)
+        if day > local:
+            day -= timedelta(days=1)
+        return {
+            'hourly': hour.astimezone(timezone.utc),
+            'daily': day.astimezone(timezone.utc)
+        }
+
+    def flush(self, db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Превратить буфер закрывшихся периодов (на момент now) в уведомления outbox."""
+        cutoffs = self.cutoffs(now)
+        due = or_(
+            AlertRule.digest.notin_(DIGEST_MODES),
+            AlertRule.enabled != True,
+            *(and_(AlertRule.digest == mode, DigestEntry.created_at < cutoff) for mode, cutoff in cutoffs.items())
+        )
+
+        totals = {'digests': 0, 'entries': 0, 'notifications': 0, 'dropped': 0}
+        # Сначала правила, у которых есть что собрать: записи правила за
+        # период берутся одним запросом и дают одну сводку, пачка транзакции
+        # (batch_size записей) не разрезает правило
+        rule_ids = [
+            rule_id for rule_id, in db.query(DigestEntry.rule_id)
+            .join(AlertRule, DigestEntry.rule_id == AlertRule.id)
+            .filter(due)
+            .distinct()
+        ]
+
+        pending = 0
+        for rule_id in rule_ids:
+            # Несколько запусков не соберут одну запись дважды
+            rows = db.query(DigestEntry, AlertRule)\
+                .join(AlertRule, DigestEntry.rule_id == AlertRule.id)\
+                .filter(DigestEntry.rule_id == rule_id, due)\
+                .order_by(DigestEntry.created_at)\
+                .with_for_update(skip_locked=True, of=DigestEntry)\
+                .all()
+            if not rows:
+                continue
+
+            rule = rows[0][1]
+            entries = [entry for entry, _ in rows]
+            if rule.enabled:
+                totals['notifications'] += self._enqueue_digest(db, rule, entries)
+                totals['digests'] += 1
+                totals['entries'] += len(entries)
+            else:
+                totals['dropped'] += len(entries)
+
+            for start in range(0, len(entries), 1000):
+                db.query(DigestEntry)\
+                    .filter(DigestEntry.id.in_([entry.id for entry in entries[start:start + 1000]]))\
+                    .delete(synchronize_session=False)
+            pending += len(entries)
+            if pending >= self.batch_size:
+                db.commit()
+                pending = 0
+        db.commit()
+
+        if totals['entries'] or totals['dropped']:
+            logger.info(
+                f"Flushed {totals['digests']} digests ({totals['entries']} matches) into "
+                f"{totals['notifications']} notifications, dropped {totals['dropped']} of disabled rules"
+            )
+        return totals
+
+    def _enqueue_digest(self, db: Session, rule: AlertRule, entries: List[DigestEntry]) -> int:
+        """Записать сводку правила в outbox, по записи на канал."""
+        # Одно событие на запись: последнее повторное совпадение заменяет прежние
+        items = {}
+        for entry in entries:
+            items[entry.event_id] = entry.payload
+        payload = {
+            'digest': rule.digest if rule.digest in DIGEST_MODES else 'immediate',
+            'rule_id': str(rule.id),
+            'rule_name': rule.name,
+            'items': list(items.values())
+        }
+        event_ids = [str(event_id) for event_id in items]
+
+        now = datetime.now(timezone.utc)
+        for channel in rule.channels or []:
+            db.add(Notification(
+                rule_id=rule.id,
+                event_id=entries[-1].event_id,
+                status='pending',
+                channel=channel,
+                payload=payload,
+                attempts=0,
+                next_attempt_at=now,
+                meta={'channel': channel, 'digest': payload['digest'], 'event_ids': event_ids}
+            ))
+        return len(rule.channels or [])
+
+
+digest_service = DigestService(
+    tz=settings.TZ,
+    daily_hour=settings.DIGEST_DAILY_HOUR,
+    batch_size=settings.DIGEST_FLUSH_BATCH_SIZE
+)
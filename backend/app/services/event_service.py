@@ -1,16 +1,16 @@
 """Сервис для обработки событий."""
-from datetime import datetime, timedelta
-from typing import Optional, List
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, List
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from app.models.game import Game
 from app.models.store import Store
 from app.models.listing_event import ListingEvent, EventKind
 from app.models.price_history import PriceHistory
-from app.models.alert_rule import AlertRule
+from app.models.notification import Notification
+from app.models.digest_entry import DigestEntry
 from app.agents.base import ListingEventDraft
-from app.services.notification_service import get_notification_service
 from app.services.game_matching_service import game_matching_service
+from app.services.rule_engine import CompiledRule, event_records, rule_engine
+from app.services.cooldown_service import cooldown_service
 from app.services.deduplication_service import calculate_signature_hash, is_duplicate_event
 import logging
 
@@ -20,8 +20,29 @@ logger = logging.getLogger(__name__)
 class EventService:
     """Сервис для обработки событий."""
 
-    async def process_event(self, db: Session, draft: ListingEventDraft, source_id: str) -> Optional[ListingEvent]:
-        """Обработать черновик события и создать событие."""
+    async def process_event(
+        self,
+        db: Session,
+        draft: ListingEventDraft,
+        source_id: str,
+        observed_at: Optional[datetime] = None,
+        backfill: bool = False,
+        commit: bool = True
+    ) -> Optional[ListingEvent]:
+        """
+        Обработать черновик события и создать событие.
+
+        observed_at - время загрузки страницы (по умолчанию сейчас). backfill
+        помечает события, восстановленные из архива сырых страниц: они
+        создаются с исходным временем и не проходят проверку правил уведомлений.
+
+        commit=False - событие только записывается в текущую транзакцию (в
+        точке сохранения, ошибка откатывает одно событие); фиксирует ее
+        вызывающий, например check_notification_rules_batch вместе с outbox.
+        """
+        observed_at = observed_at or datetime.now()
+        savepoint = None if commit else db.begin_nested()
+        save = db.commit if commit else db.flush
         try:
             # Нормализация названия игры
             matched_game = await game_matching_service.match_game(db, draft.title)
@@ -34,7 +55,7 @@ class EventService:
                     # Создаем магазин если его нет
                     store = Store(id=store_id, name=store_id.title())
                     db.add(store)
-                    db.commit()
+                    save()
                     db.refresh(store)
 
             # Подготавливаем данные для вычисления хеша
@@ -46,12 +67,14 @@ class EventService:
             }
 
             # Вычисляем signature_hash для дедупликации
-            signature_hash = calculate_signature_hash(event_data)
+            signature_hash = calculate_signature_hash(event_data, observed_at)
 
             # Проверяем на дубликаты (расширенный период 72 часа)
-            existing = is_duplicate_event(db, signature_hash, hours_back=72)
+            existing = is_duplicate_event(db, signature_hash, hours_back=72, observed_at=observed_at)
             if existing:
                 logger.debug(f"Duplicate event found: {draft.title}")
+                if savepoint is not None:
+                    savepoint.commit()
                 return None
 
             # Создаем событие
@@ -67,122 +90,105 @@ class EventService:
                 in_stock=draft.in_stock,
                 url=draft.url,
                 source_id=source_id,
-                signature_hash=signature_hash
+                signature_hash=signature_hash,
+                meta={'backfill': True} if backfill else {}
             )
+            if backfill:
+                event.created_at = observed_at
 
             db.add(event)
-            db.commit()
+            save()
             db.refresh(event)
 
-            # Добавляем в историю цен если есть цена
+            # Добавляем в историю цен если есть цена. Точка одна на (игра,
+            # магазин, время наблюдения): повторный разбор той же страницы не
+            # создает дубль (merge не подходит - id входит в первичный ключ)
             if draft.price and matched_game and store_id:
-                price_record = PriceHistory(
-                    game_id=matched_game.id,
-                    store_id=store_id,
-                    observed_at=datetime.now(),
-                    price=draft.price,
-                    currency='RUB'
-                )
-                db.add(price_record)
-                db.commit()
-
+                recorded = db.query(PriceHistory.id).filter(
+                    PriceHistory.game_id == matched_game.id,
+                    PriceHistory.store_id == store_id,
+                    PriceHistory.observed_at == observed_at
+                ).first()
+                if recorded is None:
+                    db.add(PriceHistory(
+                        game_id=matched_game.id,
+                        store_id=store_id,
+                        observed_at=observed_at,
+                        price=draft.price,
+                        currency='RUB'
+                    ))
+                    save()
+
+            if savepoint is not None:
+                savepoint.commit()
             logger.info(f"Created event: {event.title}")
             return event
 
         except Exception as e:
             logger.error(f"Error processing event {draft.title}: {e}")
-            db.rollback()
+            if savepoint is not None:
+                savepoint.rollback()
+            else:
+                db.rollback()
             return None
 
     async def check_notification_rules(self, db: Session, event: ListingEvent):
         """Проверить правила уведомлений для события."""
-        rules = db.query(AlertRule).filter(AlertRule.enabled == True).all()
-
-        for rule in rules:
-            try:
-                if await self._evaluate_rule(db, rule, event):
-                    # Отправляем уведомление
-                    await self._send_notification(db, rule, event)
-            except Exception as e:
-                logger.error(f"Error evaluating rule {rule.id}: {e}")
-
-  
-    async def _evaluate_rule(self, db: Session, rule: AlertRule, event: ListingEvent) -> bool:
-        """Оценить правило для события."""
-        conditions = rule.conditions
-        results = []
-
-        for condition in conditions:
-            field = condition['field']
-            operator = condition['op']
-            value = condition['value']
-
-            # Получаем значение поля из события
-            event_value = self._get_event_field(db, event, field)
-
-            # Оцениваем условие
-            result = self._evaluate_condition(event_value, operator, value)
-            results.append(result)
-
-        # Применяем логику
-        if rule.logic == 'AND':
-            return all(results)
-        else:  # OR
-            return any(results)
-
-    def _get_event_field(self, db: Session, event: ListingEvent, field: str):
-        """Получить значение поля из события."""
-        if field == 'game':
-            if event.game_id:
-                game = db.query(Game).filter(Game.id == event.game_id).first()
-                return game.title if game else None
-            return None
-        elif field == 'title':
-            return event.title
-        elif field == 'kind':
-            return event.kind.value if event.kind else None
-        elif field == 'price':
-            return float(event.price) if event.price else None
-        elif field == 'discount_pct':
-            return float(event.discount_pct) if event.discount_pct else None
-        elif field == 'store_id':
-            return event.store_id
-        elif field == 'in_stock':
-            return event.in_stock
-        else:
-            return None
+        await self.check_notification_rules_batch(db, [event])
+
+    async def check_notification_rules_batch(self, db: Session, events: List[ListingEvent]) -> int:
+        """
+        Проверить правила уведомлений для пачки событий (см. rule_engine).
+
+        Уведомления не отправляются здесь, а записываются в outbox и
+        фиксируются одним commit вместе с еще не зафиксированными событиями
+        пачки; доставляет их notification_delivery. Совпадения правил в режиме
+        сводки записываются в буфер сводок (см. digest_service). Возвращает
+        число записей outbox.
+        """
+        claimed = []
+        queued = 0
+        try:
+            if events:
+                records = event_records(db, events)
+                matches = rule_engine.match(db, records)
+
+                # Перезарядка всех сработавших правил пачки проверяется одним запросом к Redis
+                matched_rules = {rule.id: rule for rules in matches for rule in rules if rule.digest == 'immediate'}
+                cooling = cooldown_service.active(db, matched_rules.values()) if matched_rules else set()
+
+                for event, record, rules in zip(events, records, matches):
+                    for rule in rules:
+                        # Правило в режиме сводки копит совпадения в буфере:
+                        # частоту сообщений ограничивает период сводки, а не перезарядка
+                        if rule.digest != 'immediate':
+                            self._buffer_digest_entry(db, rule, event, record)
+                            continue
+                        if rule.id in cooling:
+                            continue
+                        # Занимаем правило: другой воркер не поставит то же уведомление
+                        if not cooldown_service.claim(db, rule):
+                            continue
+                        claimed.append(rule)
+                        queued += self._enqueue_notification(db, rule, event, record)
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            for rule in claimed:
+                cooldown_service.release(rule)
+            raise
+
+        return queued
 
-    def _evaluate_condition(self, event_value, operator: str, value) -> bool:
-        """Оценить условие."""
-        if event_value is None:
-            return False
-
-        if operator == 'in':
-            return event_value in value
-        elif operator == 'contains':
-            return isinstance(event_value, str) and value in event_value
-        elif operator == 'contains_any':
-            return isinstance(event_value, str) and any(x in event_value for x in value)
-        elif operator == '>=':
-            return event_value >= value
-        elif operator == '<=':
-            return event_value <= value
-        elif operator == '=':
-            return event_value == value
-        else:
-            return False
-
-    async def _send_notification(self, db: Session, rule: AlertRule, event: ListingEvent):
-        """Отправить уведомление."""
-        # Проверяем cooldown
-        if self._is_in_cooldown(db, rule, event):
-            return
-
-        # Формируем данные уведомления
-        notification_data = {
+    def _notification_data(self, event: ListingEvent, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Данные уведомления о событии."""
+        return {
             'title': event.title,
-            'game_name': self._get_event_field(db, event, 'game'),
-            'store_name': event.store_id,
+            'game_name': record['game'],
+            'store_name': record['store'] or event.store_id,
+            'store_id': event.store_id,
+            'game_id': str(event.game_id) if event.game_id else None,
             'kind': event.kind.value if event.kind else 'announce',
             'price': float(event.price) if event.price else None,
             'discount_pct': float(event.discount_pct) if event.discount_pct else None,
@@ -190,44 +196,34 @@ class EventService:
             'url': event.url
         }
 
-        # Отправляем через все каналы правила
-        notification_service = get_notification_service(db)
-        results = await notification_service.send_to_multiple_channels(
-            rule.channels,
-            notification_data
-        )
-
-        # Сохраняем запись об уведомлении
-        from app.models.notification import Notification
-        from app.models.notification import NotificationStatus
-
-        for channel, success in results.items():
-            notification = Notification(
+    def _buffer_digest_entry(self, db: Session, rule: CompiledRule, event: ListingEvent, record: Dict[str, Any]):
+        """Записать совпадение правила в буфер сводок."""
+        db.add(DigestEntry(
+            rule_id=rule.id,
+            event_id=event.id,
+            payload=self._notification_data(event, record),
+            created_at=datetime.now(timezone.utc)
+        ))
+
+    def _enqueue_notification(self, db: Session, rule: CompiledRule, event: ListingEvent, record: Dict[str, Any]) -> int:
+        """Записать уведомление в outbox, по записи на канал правила."""
+        notification_data = self._notification_data(event, record)
+
+        now = datetime.now(timezone.utc)
+        for channel in rule.channels:
+            db.add(Notification(
                 rule_id=rule.id,
                 event_id=event.id,
-                status='sent' if success else 'error',
-                sent_at=datetime.now() if success else None,
+                status='pending',
+                channel=channel,
+                payload=notification_data,
+                attempts=0,
+                next_attempt_at=now,
                 meta={'channel': channel}
-            )
-            db.add(notification)
-
-        db.commit()
-
-    def _is_in_cooldown(self, db: Session, rule: AlertRule, event: ListingEvent) -> bool:
-        """Проверить находится ли правило в периоде перезарядки."""
-        from app.models.notification import Notification
-
-        since = datetime.now() - timedelta(hours=rule.cooldown_hours)
-
-        recent_notification = db.query(Notification).filter(
-            and_(
-                Notification.rule_id == rule.id,
-                Notification.status == 'sent',
-                Notification.sent_at >= since
-            )
-        ).first()
-
-        return recent_notification is not None
+            ))
+        # Записи видны проверке перезарядки по базе, если Redis недоступен
+        db.flush()
+        return len(rule.channels)
 
 
-event_service = EventService()
\ No newline at end of file
+event_service = EventService()
@@ -289,6 +289,7 @@ class ExportService:
                 "conditions": rule.conditions,
                 "channels": rule.channels,
                 "cooldown_hours": rule.cooldown_hours,
+                "digest": rule.digest,
                 "enabled": rule.enabled,
                 "created_at": rule.created_at.isoformat() if rule.created_at else None
             }
@@ -0,0 +1,137 @@
+"""
+Поиск ключевых слов правил в тексте автоматом Ахо-Корасик.
+
+Ключевые слова условий contains/contains_any всех правил собираются в один
+автомат, и текст (название товара, игры) просматривается один раз вместо
+отдельной проверки подстроки для каждого слова каждого правила. Результат
+поиска - множество владельцев (условий правил), чьи слова найдены в тексте.
+
+Слова добавляются и удаляются по одному: бор достраивается на месте, а ссылки
+неудач пересчитываются при следующем поиске, только если набор слов изменился.
+Текст и слова сравниваются без учета регистра, ё считается равной е.
+"""
+
+from collections import deque
+from typing import Dict, Hashable, List, Optional, Set
+
+
+def normalize_text(text: str) -> str:
+    """Текст для сравнения ключевых слов: без регистра, ё -> е."""
+    return text.casefold().replace('ё', 'е')
+
+
+class KeywordMatcher:
+    """Автомат Ахо-Корасик над ключевыми словами с владельцами."""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Слово, заканчивающееся в узле, и все слова узла с учетом ссылок неудач
+        self._word: List[Optional[str]] = [None]
+        self._output: List[tuple] = [()]
+        self._owners: Dict[str, Set[Hashable]] = {}
+        # Владельцы пустого слова: пустая строка содержится в любом тексте
+        self._always: Set[Hashable] = set()
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._owners) + (1 if self._always else 0)
+
+    def add(self, keyword: str, owner: Hashable):
+        """Добавить слово владельца."""
+        keyword = normalize_text(keyword)
+        if not keyword:
+            self._always.add(owner)
+            return
+
+        owners = self._owners.get(keyword)
+        if owners is not None:
+            owners.add(owner)
+            return
+        self._owners[keyword] = {owner}
+
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._word.append(None)
+                self._output.append(())
+                self._goto[node][char] = next_node
+            node = next_node
+        self._word[node] = keyword
+        self._dirty = True
+
+    def remove(self, keyword: str, owner: Hashable):
+        """Удалить слово владельца; узлы бора остаются для повторного использования."""
+        keyword = normalize_text(keyword)
+        if not keyword:
+            self._always.discard(owner)
+            return
+
+        owners = self._owners.get(keyword)
+        if owners is None:
+            return
+        owners.discard(owner)
+        if owners:
+            return
+
+        del self._owners[keyword]
+        node = 0
+        for char in keyword:
+            node = self._goto[node][char]
+        self._word[node] = None
+        self._dirty = True
+
+    def _link(self):
+        """Пересчитать ссылки неудач и выходы узлов обходом бора в ширину."""
+        queue = deque()
+        for node in self._goto[0].values():
+            self._fail[node] = 0
+            queue.append(node)
+        self._output[0] = ()
+
+        while queue:
+            node = queue.popleft()
+            word = self._word[node]
+            inherited = self._output[self._fail[node]]
+            self._output[node] = (word,) + inherited if word else inherited
+
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                queue.append(child)
+
+        self._dirty = False
+
+    def keywords(self, text: Optional[str]) -> Set[str]:
+        """Ключевые слова, найденные в тексте."""
+        if not text or not self._owners:
+            return set()
+        if self._dirty:
+            self._link()
+
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        node = 0
+        for char in normalize_text(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+    def search(self, text: Optional[str]) -> Set[Hashable]:
+        """Владельцы слов, найденных в тексте."""
+        if text is None:
+            return set()
+
+        owners = set(self._always)
+        for keyword in self.keywords(text):
+            owners.update(self._owners[keyword])
+        return owners
@@ -0,0 +1,204 @@
+"""
+Доставка уведомлений из outbox.
+
+Уведомления не отправляются при обработке событий: EventService записывает
+их в таблицу notification (status='pending', по записи на канал) в той же
+транзакции, что и события страницы. Поэтому обход агента не ждет Telegram и
+Web Push, а уведомление не теряется, если воркер упал после сохранения
+события.
+
+Воркер доставки забирает пачку готовых записей запросом SELECT ... FOR UPDATE
+SKIP LOCKED: несколько воркеров разбирают очередь параллельно, не мешая друг
+другу. Забранные записи получают статус 'sending' и аренду (next_attempt_at):
+если воркер не успел доставить запись, после окончания аренды она будет
+забрана снова. Транзакция закрывается до отправки, сеть не держит блокировки.
+
+Записи пачки отправляются одновременно, с отдельным ограничением числа
+одновременных отправок на канал. Канал с методом send_batch получает все свои
+записи пачки одним вызовом (Telegram объединяет их в сводки). Неудачная отправка повторяется с
+экспоненциальной паузой; после NOTIFICATION_MAX_ATTEMPTS попыток запись
+переходит в 'dead' и остается в таблице для разбора. Уведомление из нескольких
+сообщений (сводка правила в Telegram) хранит номера отправленных сообщений в
+meta['sent_parts'], и повтор досылает только неотправленные.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.notification import Notification
+from app.services.notification_service import get_notification_service
+
+logger = logging.getLogger(__name__)
+
+# Статусы, которые ждут доставки (для 'sending' - после окончания аренды)
+DUE_STATUSES = ('pending', 'retry', 'sending')
+
+
+class NotificationDelivery:
+    """Воркер доставки уведомлений из outbox."""
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        lease_seconds: int = 300,
+        max_attempts: int = 5,
+        retry_base_seconds: float = 30.0,
+        retry_max_seconds: float = 3600.0,
+        concurrency: Optional[Dict[str, int]] = None
+    ):
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.concurrency = concurrency or {}
+
+    def claim(self, db: Session, ids: Optional[Iterable] = None) -> List[Notification]:
+        """
+        Забрать пачку записей, которые пора доставить.
+
+        Записи, исчерпавшие попытки (воркер упал во время последней),
+        переводятся в 'dead' и не возвращаются.
+        """
+        now = datetime.now(timezone.utc)
+        query = db.query(Notification).filter(
+            Notification.status.in_(DUE_STATUSES),
+            Notification.next_attempt_at <= now
+        )
+        if ids is not None:
+            query = query.filter(Notification.id.in_(list(ids)))
+
+        notifications = query\
+            .order_by(Notification.next_attempt_at)\
+            .limit(self.batch_size)\
+            .with_for_update(skip_locked=True)\
+            .all()
+
+        claimed = []
+        for notification in notifications:
+            if (notification.attempts or 0) >= self.max_attempts:
+                notification.status = 'dead'
+                notification.last_error = notification.last_error or 'Delivery lease expired'
+                continue
+            notification.status = 'sending'
+            notification.attempts = (notification.attempts or 0) + 1
+            notification.next_attempt_at = now + timedelta(seconds=self.lease_seconds)
+            claimed.append(notification)
+
+        db.commit()
+        return claimed
+
+    async def deliver(self, db: Session, notifications: List[Notification]) -> Dict[str, int]:
+        """Отправить забранные записи и сохранить результат."""
+        channels = get_notification_service(db).channels
+        semaphores = {
+            channel: asyncio.Semaphore(max(self.concurrency.get(channel, 1), 1))
+            for channel in {notification.channel for notification in notifications}
+        }
+
+        async def send(batch: List[Notification]):
+            """Отправить записи одного канала: (успех, ошибка) на запись."""
+            channel = channels.get(batch[0].channel)
+            if channel is None:
+                return [(False, f"Unknown channel: {batch[0].channel}")] * len(batch)
+            payloads = [notification.payload or {} for notification in batch]
+            sent_parts = [set((notification.meta or {}).get('sent_parts') or ()) for notification in batch]
+            async with semaphores[batch[0].channel]:
+                try:
+                    # Канал с send_batch получает записи пачки разом (Telegram
+                    # объединяет их в сводки), остальные - по одной записи
+                    if hasattr(channel, 'send_batch'):
+                        errors = await channel.send_batch(payloads, sent_parts)
+                    else:
+                        errors = [None if await channel.send(payloads[0]) else 'Channel reported failure']
+                except Exception as e:
+                    errors = [str(e) or type(e).__name__] * len(batch)
+
+            # Отправленные сообщения сохраняются и при ошибке остальных
+            for notification, parts in zip(batch, sent_parts):
+                if parts != set((notification.meta or {}).get('sent_parts') or ()):
+                    notification.meta = {**(notification.meta or {}), 'sent_parts': sorted(parts)}
+            return [(error is None, error) for error in errors]
+
+        groups: List[List[Notification]] = []
+        by_channel: Dict[str, List[Notification]] = {}
+        for notification in notifications:
+            channel = channels.get(notification.channel)
+            if channel is not None and hasattr(channel, 'send_batch'):
+                by_channel.setdefault(notification.channel, []).append(notification)
+            else:
+                groups.append([notification])
+        groups.extend(by_channel.values())
+
+        gathered = await asyncio.gather(*(send(batch) for batch in groups))
+        notifications = [notification for batch in groups for notification in batch]
+        results = [result for batch_results in gathered for result in batch_results]
+
+        stats = {'sent': 0, 'retry': 0, 'dead': 0}
+        now = datetime.now(timezone.utc)
+        for notification, (success, error) in zip(notifications, results):
+            if success:
+                notification.status = 'sent'
+                notification.sent_at = now
+                notification.last_error = None
+            elif notification.channel in channels and notification.attempts < self.max_attempts:
+                notification.status = 'retry'
+                notification.next_attempt_at = now + timedelta(seconds=self._backoff(notification.attempts))
+                notification.last_error = error
+            else:
+                notification.status = 'dead'
+                notification.last_error = error
+                logger.warning(
+                    f"Notification {notification.id} via {notification.channel} "
+                    f"moved to dead letter after {notification.attempts} attempts: {error}"
+                )
+            stats[notification.status] += 1
+
+        db.commit()
+        return stats
+
+    async def run(self, db: Session, max_seconds: float = 60.0, ids: Optional[Iterable] = None) -> Dict[str, int]:
+        """Доставлять пачки, пока очередь не опустеет или не выйдет время."""
+        totals = {'sent': 0, 'retry': 0, 'dead': 0}
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline:
+            notifications = self.claim(db, ids)
+            if not notifications:
+                break
+            stats = await self.deliver(db, notifications)
+            for status, count in stats.items():
+                totals[status] += count
+            if ids is not None:
+                break
+
+        if any(totals.values()):
+            logger.info(
+                f"Delivered notifications: {totals['sent']} sent, "
+                f"{totals['retry']} to retry, {totals['dead']} dead"
+            )
+        return totals
+
+    def _backoff(self, attempts: int) -> float:
+        """Пауза перед следующей попыткой: удвоение с разбросом."""
+        delay = min(self.retry_base_seconds * 2 ** max(attempts - 1, 0), self.retry_max_seconds)
+        return delay * random.uniform(0.8, 1.2)
+
+
+notification_delivery = NotificationDelivery(
+    batch_size=settings.NOTIFICATION_BATCH_SIZE,
+    lease_seconds=settings.NOTIFICATION_LEASE_SECONDS,
+    max_attempts=settings.NOTIFICATION_MAX_ATTEMPTS,
+    retry_base_seconds=settings.NOTIFICATION_RETRY_BASE_SECONDS,
+    retry_max_seconds=settings.NOTIFICATION_RETRY_MAX_SECONDS,
+    concurrency={
+        'telegram': settings.NOTIFICATION_TELEGRAM_CONCURRENCY,
+        'webpush': settings.NOTIFICATION_WEBPUSH_CONCURRENCY
+    }
+)
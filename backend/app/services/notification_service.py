@@ -1,16 +1,20 @@
 """Сервис уведомлений."""
 import json
 import asyncio
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Set
 from datetime import datetime, timedelta
 from uuid import UUID
-import httpx
 import logging
 from sqlalchemy.orm import Session
 from app.core.config import settings
 from app.models.notification import Notification
 from app.models.alert_rule import AlertRule
 from app.models.listing_event import ListingEvent
+from app.services.digest_service import is_digest
+from app.services.rule_engine import compile_rule, event_records
+from app.services.subscription_index import subscription_index
+from app.services.telegram_service import build_digests, format_digest, format_message, telegram_sender
+from app.services.webpush_service import webpush_service
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +25,7 @@ class NotificationService:
     def __init__(self, db: Session):
         self.db = db
         self.channels = {
-            'webpush': WebPushChannel(),
+            'webpush': WebPushChannel(db),
             'telegram': TelegramChannel()
         }
 
@@ -60,135 +64,13 @@ class NotificationService:
         return results
 
     async def process_event(self, event: ListingEvent) -> List[Notification]:
-        """Обработать событие и создать уведомления по правилам."""
-        notifications = []
-        rules = self.db.query(AlertRule).filter(AlertRule.enabled == True).all()
-
-        for rule in rules:
-            if await self._evaluate_rule(event, rule):
-                # Проверяем cooldown
-                if not self._is_in_cooldown(rule):
-                    notification = await self._create_notification(rule, event)
-                    notifications.append(notification)
-
-                    # Отправляем уведомление
-                    await self._send_notification(notification)
-
-        return notifications
-
-    async def _evaluate_rule(self, event: ListingEvent, rule: AlertRule) -> bool:
-        """Оценить правило для события."""
-        conditions = rule.conditions
-
-        results = []
-        for condition in conditions:
-            field = condition.get('field')
-            op = condition.get('op')
-            value = condition.get('value')
-
-            result = self._evaluate_condition(event, field, op, value)
-            results.append(result)
-
-        # Применяем логику
-        if rule.logic == 'AND':
-            return all(results)
-        else:  # OR
-            return any(results)
-
-    def _evaluate_condition(self, event: ListingEvent, field: str, op: str, value: Any) -> bool:
-        """Оценить отдельное условие."""
-        # Получаем значение из события
-        event_value = getattr(event, field, None)
-
-        if event_value is None:
-            return False
-
-        # Операторы сравнения
-        if op == 'in':
-            return event_value in value
-        elif op == 'contains':
-            return isinstance(event_value, str) and value.lower() in event_value.lower()
-        elif op == 'contains_any':
-            if not isinstance(event_value, str):
-                return False
-            return any(item.lower() in event_value.lower() for item in value)
-        elif op == '>=':
-            return event_value >= value
-        elif op == '<=':
-            return event_value <= value
-        elif op == '=':
-            return event_value == value
-        else:
-            logger.warning(f"Unknown operator: {op}")
-            return False
-
-    def _is_in_cooldown(self, rule: AlertRule) -> bool:
-        """Проверить, находится ли правило в периоде cooldown."""
-        # Ищем последнее уведомление по этому правилу
-        last_notification = self.db.query(Notification)\
-            .filter(Notification.rule_id == rule.id)\
-            .order_by(Notification.created_at.desc())\
-            .first()
-
-        if not last_notification:
-            return False
-
-        cooldown_end = last_notification.created_at + timedelta(hours=rule.cooldown_hours)
-        return datetime.utcnow() < cooldown_end
-
-    async def _create_notification(self, rule: AlertRule, event: ListingEvent) -> Notification:
-        """Создать уведомление."""
-        notification = Notification(
-            rule_id=rule.id,
-            event_id=event.id,
-            status='pending',
-            meta={
-                'rule_name': rule.name,
-                'event_title': event.title,
-                'event_kind': event.kind.value if event.kind else None
-            }
-        )
+        """Поставить в очередь уведомления по правилам, сработавшим на событие."""
+        from app.services.event_service import event_service
 
-        self.db.add(notification)
-        self.db.commit()
-        return notification
-
-    async def _send_notification(self, notification: Notification):
-        """Отправить уведомление."""
-        try:
-            # Формируем данные для уведомления
-            event = notification.event
-            event_data = {
-                'title': event.title or 'Событие',
-                'store_name': event.store.name if event.store else 'Магазин',
-                'price': float(event.price) if event.price else None,
-                'discount_pct': float(event.discount_pct) if event.discount_pct else None,
-                'in_stock': event.in_stock,
-                'url': event.url,
-                'kind': event.kind.value if event.kind else 'announce'
-            }
-
-            # Отправляем через все каналы правила
-            results = await self.send_to_multiple_channels(
-                notification.rule.channels,
-                event_data
-            )
-
-            # Обновляем статус уведомления
-            if any(results.values()):
-                notification.status = 'sent'
-                notification.sent_at = datetime.utcnow()
-            else:
-                notification.status = 'error'
-                notification.meta['error'] = 'All channels failed'
-
-            self.db.commit()
-
-        except Exception as e:
-            logger.error(f"Failed to send notification {notification.id}: {e}")
-            notification.status = 'error'
-            notification.meta['error'] = str(e)
-            self.db.commit()
+        await event_service.check_notification_rules_batch(self.db, [event])
+        return self.db.query(Notification)\
+            .filter(Notification.event_id == event.id, Notification.status == 'pending')\
+            .all()
 
     async def get_all_notifications(self) -> List[Notification]:
         """Получить все уведомления."""
@@ -265,9 +147,10 @@ class NotificationService:
             .limit(50)\
             .all()
 
+        compiled = compile_rule(rule)
         matched_events = []
-        for event in recent_events:
-            if await self._evaluate_rule(event, rule):
+        for event, record in zip(recent_events, event_records(self.db, recent_events)):
+            if compiled.matches(record):
                 matched_events.append({
                     'id': str(event.id),
                     'title': event.title,
@@ -285,102 +168,181 @@ class NotificationService:
 
 
 class WebPushChannel:
-    """Канал Web Push уведомлений."""
+    """Канал Web Push уведомлений: рассылка подпискам, чьим предпочтениям соответствует событие (см. subscription_index)."""
 
-    def __init__(self):
-        self.vapid_public_key = settings.VAPID_PUBLIC_KEY
-        self.vapid_private_key = settings.VAPID_PRIVATE_KEY
-        self.vapid_email = settings.VAPID_EMAIL
+    def __init__(self, db: Session):
+        self.db = db
 
     async def send(self, event_data: Dict[str, Any]) -> bool:
         """Отправить Web Push уведомление."""
-        # TODO: Implement WebPush sending logic
-        # Это требует интеграции с сервис-воркером на фронтенде
-        logger.info(f"WebPush notification: {event_data.get('title', 'No title')}")
-        return True
+        error = (await self.send_batch([event_data]))[0]
+        if error:
+            logger.error(f"Failed to send WebPush notification: {error}")
+        return error is None
+
+    async def send_batch(
+        self,
+        payloads: List[Dict[str, Any]],
+        sent_parts: Optional[List[Set[int]]] = None
+    ) -> List[Optional[str]]:
+        """
+        Разослать пачку уведомлений; для каждого - None или текст ошибки.
+
+        Уведомление - одно push сообщение, sent_parts не используется.
+
+        Уведомление не доставлено, если ни одна подписка его не получила по
+        другой причине, чем истекшая подписка. Подписки, отвеченные 404/410,
+        отключаются одним запросом после рассылки всей пачки.
+        """
+        subscription_index.refresh(self.db)
+
+        errors: List[Optional[str]] = []
+        expired = set()
+        for event_data in payloads:
+            # Истекшие подписки больше не получают уведомления этой пачки
+            subscriptions = [
+                subscription for subscription in self._subscriptions(event_data)
+                if subscription['endpoint'] not in expired
+            ]
+            if not subscriptions:
+                errors.append(None)
+                continue
+
+            results = await webpush_service.send_bulk_notifications(subscriptions, self._payload(event_data))
+            expired.update(subscription['endpoint'] for subscription in results['expired_subscriptions'])
+            if results['success'] or not results['errors']:
+                errors.append(None)
+            else:
+                errors.append(f"{len(results['errors'])} pushes failed: {results['errors'][0]['error']}")
+
+        if expired:
+            webpush_service.deactivate_subscriptions(self.db, expired)
+        return errors
+
+    def _subscriptions(self, event_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Подписки уведомления; сводку получают подписки хотя бы одного ее события."""
+        if not is_digest(event_data):
+            return subscription_index.match(event_data)
+
+        subscriptions = {}
+        for item in event_data['items']:
+            for subscription in subscription_index.match(item):
+                subscriptions.setdefault(subscription['endpoint'], subscription)
+        return list(subscriptions.values())
+
+    def _payload(self, event_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Содержимое push уведомления о событии или сводки."""
+        if is_digest(event_data):
+            items = event_data['items']
+            titles = [item.get('title') or 'Событие' for item in items[:3]]
+            if len(items) > len(titles):
+                titles.append(f"и еще {len(items) - len(titles)}")
+            return webpush_service.create_payload(
+                title=f"{event_data.get('rule_name') or 'Сводка'} ({len(items)})",
+                body=' • '.join(titles),
+                tag=f"digest-{event_data.get('rule_id')}",
+                data={'kind': 'digest', 'rule_id': event_data.get('rule_id')}
+            )
+
+        details = [str(event_data.get('store_name') or 'Магазин')]
+        if event_data.get('price'):
+            details.append(f"{event_data['price']} ₽")
+        if event_data.get('discount_pct'):
+            details.append(f"−{event_data['discount_pct']}%")
+        return webpush_service.create_payload(
+            title=event_data.get('title') or 'Событие',
+            body=' • '.join(details),
+            url=event_data.get('url'),
+            data={'kind': event_data.get('kind', 'announce'), 'url': event_data.get('url')}
+        )
 
 
 class TelegramChannel:
-    """Канал Telegram уведомлений."""
+    """Канал Telegram уведомлений (отправка - telegram_service)."""
 
     def __init__(self):
         self.bot_token = settings.TELEGRAM_BOT_TOKEN
         self.chat_id = settings.TELEGRAM_CHAT_ID
-        self.api_url = f"https://api.telegram.org/bot{self.bot_token}"
+        self.api_url = f"{settings.TELEGRAM_API_URL}/bot{self.bot_token}"
 
-    async def send(self, event_data: Dict[str, Any]) -> bool:
-        """Отправить Telegram уведомление."""
+    async def send(self, event_data: Dict[str, Any], sent_parts: Optional[Set[int]] = None) -> bool:
+        """
+        Отправить Telegram уведомление.
+
+        sent_parts - номера уже отправленных сообщений уведомления (сводка
+        правила занимает несколько): они пропускаются, а отправленные сейчас
+        добавляются в множество.
+        """
         if not self.bot_token or not self.chat_id:
             logger.warning("Telegram bot token or chat ID not configured")
             return False
 
-        message = self._format_message(event_data)
-
+        sent_parts = set() if sent_parts is None else sent_parts
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.api_url}/sendMessage",
-                    json={
-                        "chat_id": self.chat_id,
-                        "text": message,
-                        "parse_mode": "HTML",
-                        "disable_web_page_preview": False
-                    }
-                )
-
-                if response.status_code == 200:
-                    return True
-                else:
-                    logger.error(f"Telegram API error: {response.text}")
-                    return False
-
+            for part, text in enumerate(self._messages(event_data)):
+                if part in sent_parts:
+                    continue
+                await telegram_sender.send_message(self.api_url, self.chat_id, text)
+                sent_parts.add(part)
+            return True
         except Exception as e:
-            logger.error(f"Failed to send Telegram notification: {e}")
+            logger.error(f"Failed to send Telegram notification ({len(sent_parts)} messages sent): {e}")
             return False
 
-    def _format_message(self, event_data: Dict[str, Any]) -> str:
-        """Форматировать сообщение для Telegram."""
-        title = event_data.get('title', 'Событие')
-        store_name = event_data.get('store_name', 'Магазин')
-        price = event_data.get('price')
-        discount_pct = event_data.get('discount_pct')
-        in_stock = event_data.get('in_stock')
-        url = event_data.get('url')
-        kind = event_data.get('kind', 'announce')
-
-        # Эмодзи для типов событий
-        kind_emojis = {
-            'announce': '📢',
-            'preorder': '🎯',
-            'release': '🎉',
-            'discount': '💰',
-            'price': '💵'
-        }
-
-        emoji = kind_emojis.get(kind, '📢')
-
-        message_parts = [
-            f"{emoji} <b>{title}</b>",
-            f"🏪 Магазин: {store_name}"
+    async def send_batch(
+        self,
+        payloads: List[Dict[str, Any]],
+        sent_parts: Optional[List[Set[int]]] = None
+    ) -> List[Optional[str]]:
+        """
+        Отправить пачку уведомлений; для каждого - None или текст ошибки.
+
+        С TELEGRAM_DIGEST_THRESHOLD уведомлений пачка уходит сводками по
+        магазину и типу события, иначе - отдельными сообщениями. Сводка
+        правила за период (is_digest) отправляется своими сообщениями; их
+        номера, уже отправленные прошлыми попытками (sent_parts, по множеству
+        на уведомление), пропускаются, а отправленные сейчас добавляются.
+        Остальные уведомления занимают по одному сообщению (в сводке пачки
+        каждое входит ровно в одно), поэтому повторяются целиком.
+        """
+        if not self.bot_token or not self.chat_id:
+            return ['Telegram bot token or chat ID not configured'] * len(payloads)
+
+        if sent_parts is None:
+            sent_parts = [set() for _ in payloads]
+        # Сообщения сводки правила однозначно определяются payload, номер
+        # сообщения совпадает между попытками
+        messages = [
+            (text, [index], part)
+            for index, event_data in enumerate(payloads) if is_digest(event_data)
+            for part, text in enumerate(format_digest(event_data)) if part not in sent_parts[index]
         ]
+        single = [index for index, event_data in enumerate(payloads) if not is_digest(event_data)]
+        if len(single) >= settings.TELEGRAM_DIGEST_THRESHOLD:
+            messages.extend(
+                (text, [single[position] for position in positions], None)
+                for text, positions in build_digests([payloads[index] for index in single])
+            )
+        else:
+            messages.extend((format_message(payloads[index]), [index], None) for index in single)
 
-        if price:
-            message_parts.append(f"💳 Цена: {price} ₽")
-
-        if discount_pct:
-            message_parts.append(f"🏷️ Скидка: {discount_pct}%")
-
-        if in_stock is not None:
-            status = "✅ В наличии" if in_stock else "❌ Нет в наличии"
-            message_parts.append(status)
-
-        if url:
-            message_parts.append(f"🔗 {url}")
-
-        message_parts.append("")
-        message_parts.append("🔔 Настройки уведомлений — в приложении")
-
-        return "\n".join(message_parts)
+        errors: List[Optional[str]] = [None] * len(payloads)
+        for text, indexes, part in messages:
+            try:
+                await telegram_sender.send_message(self.api_url, self.chat_id, text)
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                logger.error(f"Failed to send Telegram message ({len(indexes)} notifications): {error}")
+                for index in indexes:
+                    errors[index] = error
+                continue
+            if part is not None:
+                sent_parts[indexes[0]].add(part)
+        return errors
+
+    def _messages(self, event_data: Dict[str, Any]) -> List[str]:
+        """Сообщения уведомления: сводка правила может занимать несколько."""
+        return format_digest(event_data) if is_digest(event_data) else [format_message(event_data)]
 
 
 # Функция-фабрика для создания экземпляра NotificationService
@@ -0,0 +1,358 @@
+"""
+Архив сырых страниц агентов.
+
+Тело каждой загруженной страницы сжимается zstd и сохраняется по ключу из
+SHA-256 хэша страницы (Fetched.hash): одинаковые страницы хранятся один раз.
+Для каждой сохраненной страницы создается строка raw_item, content_ref которой
+указывает на объект архива:
+
+    pages/ab/ab12...ef.zst
+
+Хранилище - бакет MinIO/S3 (S3_*) или локальный каталог (RAW_ARCHIVE_DIR).
+Для магазина можно обучить словарь zstd по его архивным страницам: страницы
+одного магазина похожи (шапка, меню, разметка карточек), и со словарем сжимаются
+заметно лучше. Номер словаря записан в заголовке кадра zstd, поэтому
+для чтения страницы достаточно ее content_ref.
+
+Запись не задерживает обход: страницы ставятся в очередь, а поток архива
+сжимает и сохраняет их пачками.
+"""
+
+import atexit
+import io
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ArchivedPage:
+    """Страница в очереди на запись в архив."""
+    agent_id: str
+    store_id: str
+    url: str
+    hash: str
+    body: str
+    fetched_at: datetime
+
+
+def page_key(page_hash: str) -> str:
+    """Ключ объекта страницы в архиве."""
+    return f"pages/{page_hash[:2]}/{page_hash}.zst"
+
+
+class LocalRawStorage:
+    """Архив в локальном каталоге."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись через временный файл: читатель не увидит недописанную страницу
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+class MinioRawStorage:
+    """Архив в бакете MinIO/S3."""
+
+    def __init__(self, endpoint: str, access_key: str, secret_key: str, bucket: str, secure: bool = False):
+        from minio import Minio
+
+        # S3_ENDPOINT задается как URL, клиенту нужен host:port
+        host = endpoint.split('://', 1)[-1].rstrip('/')
+        self.client = Minio(host, access_key=access_key, secret_key=secret_key, secure=secure)
+        self.bucket = bucket
+        self._bucket_checked = False
+
+    def _ensure_bucket(self):
+        if not self._bucket_checked:
+            if not self.client.bucket_exists(self.bucket):
+                self.client.make_bucket(self.bucket)
+            self._bucket_checked = True
+
+    def exists(self, key: str) -> bool:
+        from minio.error import S3Error
+
+        self._ensure_bucket()
+        try:
+            self.client.stat_object(self.bucket, key)
+            return True
+        except S3Error as e:
+            if e.code in ('NoSuchKey', 'NoSuchObject'):
+                return False
+            raise
+
+    def get(self, key: str) -> Optional[bytes]:
+        from minio.error import S3Error
+
+        try:
+            response = self.client.get_object(self.bucket, key)
+        except S3Error as e:
+            if e.code in ('NoSuchKey', 'NoSuchObject'):
+                return None
+            raise
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def put(self, key: str, data: bytes):
+        self._ensure_bucket()
+        self.client.put_object(
+            self.bucket, key, io.BytesIO(data), len(data), content_type='application/zstd'
+        )
+
+
+def create_storage(backend: str):
+    """Хранилище архива по имени бакенда ('minio' | 'local')."""
+    if backend == 'local':
+        return LocalRawStorage(settings.RAW_ARCHIVE_DIR)
+    if backend == 'minio':
+        return MinioRawStorage(
+            settings.S3_ENDPOINT,
+            settings.S3_ACCESS_KEY,
+            settings.S3_SECRET_KEY,
+            settings.S3_BUCKET,
+            settings.S3_SECURE
+        )
+    raise ValueError(f"Unknown raw archive backend: {backend}")
+
+
+class RawArchive:
+    """Сжатие, хранение и чтение сырых страниц."""
+
+    def __init__(
+        self,
+        storage,
+        level: int = 10,
+        batch_size: int = 50,
+        flush_seconds: float = 5.0,
+        queue_size: int = 1000
+    ):
+        self.storage = storage
+        self.level = level
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.pid = os.getpid()
+
+        self._queue: 'queue.Queue[ArchivedPage]' = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        # Словари: по магазину (для записи) и по номеру (для чтения); None - словаря нет
+        self._store_dicts: Dict[str, Optional['zstandard.ZstdCompressionDict']] = {}
+        self._id_dicts: Dict[int, 'zstandard.ZstdCompressionDict'] = {}
+        self.stats = {'queued': 0, 'dropped': 0, 'stored': 0, 'deduplicated': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    # Сжатие
+
+    def _store_dictionary(self, store_id: str):
+        if store_id not in self._store_dicts:
+            data = self.storage.get(f"dicts/stores/{store_id}.zdict")
+            self._store_dicts[store_id] = self._load_dictionary(data) if data else None
+        return self._store_dicts[store_id]
+
+    def _load_dictionary(self, data: bytes):
+        import zstandard
+
+        dictionary = zstandard.ZstdCompressionDict(data)
+        self._id_dicts[dictionary.dict_id()] = dictionary
+        return dictionary
+
+    def _id_dictionary(self, dict_id: int):
+        if dict_id not in self._id_dicts:
+            data = self.storage.get(f"dicts/{dict_id}.zdict")
+            if data is None:
+                raise LookupError(f"Raw archive dictionary {dict_id} not found")
+            self._load_dictionary(data)
+        return self._id_dicts[dict_id]
+
+    def compress(self, body: str, store_id: Optional[str] = None) -> bytes:
+        """Сжать тело страницы (словарем магазина, если он обучен)."""
+        import zstandard
+
+        dictionary = self._store_dictionary(store_id) if store_id else None
+        compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+        return compressor.compress(body.encode('utf-8'))
+
+    def decompress(self, data: bytes) -> str:
+        """Распаковать страницу; словарь определяется по заголовку кадра."""
+        import zstandard
+
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        dictionary = self._id_dictionary(dict_id) if dict_id else None
+        decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return decompressor.decompress(data).decode('utf-8')
+
+    def load(self, content_ref: str) -> Optional[str]:
+        """Тело страницы по content_ref строки raw_item."""
+        data = self.storage.get(content_ref)
+        return self.decompress(data) if data is not None else None
+
+    def train_dictionary(self, store_id: str, samples: List[str], size: int = 112640) -> int:
+        """
+        Обучить словарь магазина по образцам страниц и сделать его текущим.
+
+        Старые страницы остаются читаемыми: словари хранятся по номеру.
+        Возвращает номер нового словаря.
+        """
+        import zstandard
+
+        dictionary = zstandard.train_dictionary(size, [sample.encode('utf-8') for sample in samples])
+        data = dictionary.as_bytes()
+        self.storage.put(f"dicts/{dictionary.dict_id()}.zdict", data)
+        self.storage.put(f"dicts/stores/{store_id}.zdict", data)
+
+        self._store_dicts[store_id] = self._load_dictionary(data)
+        logger.info(f"Trained raw archive dictionary {dictionary.dict_id()} for {store_id} on {len(samples)} pages")
+        return dictionary.dict_id()
+
+    # Запись
+
+    def submit(self, page: ArchivedPage) -> bool:
+        """Поставить страницу в очередь на запись; False, если очередь переполнена."""
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(page)
+        except queue.Full:
+            self.stats['dropped'] += 1
+            logger.warning(f"Raw archive queue is full, page {page.url} is not archived")
+            return False
+        self.stats['queued'] += 1
+        return True
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Дождаться записи страниц из очереди; False, если не успели за timeout."""
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._thread is None or not self._thread.is_alive():
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._thread_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._writer, name='raw-archive', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush, 10.0)
+
+    def _writer(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                logger.error(f"Failed to archive {len(batch)} raw pages: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def write_batch(self, pages: List[ArchivedPage]):
+        """Сохранить пачку страниц и создать строки raw_item."""
+        rows = []
+        seen = set()
+        for page in pages:
+            if page.hash in seen:
+                continue
+            seen.add(page.hash)
+
+            key = page_key(page.hash)
+            if self.storage.exists(key):
+                self.stats['deduplicated'] += 1
+            else:
+                data = self.compress(page.body, page.store_id)
+                self.storage.put(key, data)
+                self.stats['stored'] += 1
+                self.stats['bytes_in'] += len(page.body.encode('utf-8'))
+                self.stats['bytes_out'] += len(data)
+
+            rows.append({
+                'source_id': page.agent_id,
+                'url': page.url,
+                'fetched_at': page.fetched_at,
+                'hash': page.hash,
+                'content_ref': key,
+            })
+
+        if rows:
+            self._insert_rows(rows)
+        logger.debug(f"Archived {len(rows)} raw pages")
+
+    def _insert_rows(self, rows: List[Dict]):
+        from sqlalchemy.dialects.postgresql import insert
+
+        from app.core.database import SessionLocal
+        from app.models.raw_item import RawItem
+
+        db = SessionLocal()
+        try:
+            db.execute(insert(RawItem).values(rows).on_conflict_do_nothing(index_elements=['hash']))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+_raw_archive: Optional[RawArchive] = None
+_raw_archive_lock = threading.Lock()
+
+
+def get_raw_archive() -> Optional[RawArchive]:
+    """Архив сырых страниц текущего процесса или None, если архив отключен."""
+    global _raw_archive
+    if settings.RAW_ARCHIVE_BACKEND == 'none':
+        return None
+    # Архив общий для потоков воркера обхода (-P threads)
+    with _raw_archive_lock:
+        if _raw_archive is None or _raw_archive.pid != os.getpid():
+            _raw_archive = RawArchive(
+                create_storage(settings.RAW_ARCHIVE_BACKEND),
+                level=settings.RAW_ARCHIVE_LEVEL,
+                batch_size=settings.RAW_ARCHIVE_BATCH_SIZE,
+                flush_seconds=settings.RAW_ARCHIVE_FLUSH_SECONDS,
+                queue_size=settings.RAW_ARCHIVE_QUEUE_SIZE
+            )
+        return _raw_archive
@@ -0,0 +1,379 @@
+"""
+Движок правил уведомлений.
+
+Условия AlertRule.conditions компилируются в функции один раз и кэшируются по
+(id, updated_at) правила: пока правило не изменено, повторной компиляции нет.
+Правила индексируются по различающим условиям равенства и вхождения в список
+(store_id, kind): событие проверяется только правилами своего магазина и типа
+и правилами без таких условий, а не всеми включенными правилами.
+
+Правила проверяются на записях событий - словарях значений полей условий.
+Записи пачки событий строятся заранее (event_records): названия игр и
+магазинов всей пачки загружаются двумя запросами IN, поэтому движок не
+обращается к базе при проверке.
+
+Ключевые слова условий contains/contains_any по названию товара и игры всех
+правил собраны в автоматы Ахо-Корасик (keyword_matcher.py), по одному на поле:
+название просматривается один раз, и условие проверяется по множеству
+найденных слов, а не поиском подстроки. Правила AND без условия по store_id и
+kind индексируются по своему условию с ключевыми словами: такое правило
+проверяется, только если автомат нашел в названии одно из его слов.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+from app.models.alert_rule import AlertRule
+from app.models.game import Game
+from app.models.listing_event import ListingEvent
+from app.models.store import Store
+from app.services.keyword_matcher import KeywordMatcher, normalize_text
+
+logger = logging.getLogger(__name__)
+
+Record = Dict[str, Any]
+Predicate = Callable[[Record], bool]
+
+# Поля условий правил (game и store - названия игры и магазина)
+RULE_FIELDS = ('game', 'title', 'kind', 'price', 'discount_pct', 'store_id', 'store', 'in_stock')
+NUMERIC_FIELDS = ('price', 'discount_pct')
+# Поля, по которым правила индексируются (в порядке предпочтения)
+INDEXED_FIELDS = ('store_id', 'kind')
+# Поля, ключевые слова условий по которым ищутся автоматом
+KEYWORD_FIELDS = ('title', 'game')
+# Ключ записи с найденными автоматом условиями: {поле: {владелец условия}}
+KEYWORD_HITS = '_keyword_hits'
+
+
+def event_record(event: ListingEvent, game: Optional[str] = None, store: Optional[str] = None) -> Record:
+    """Значения полей условий для события; game и store - названия игры и магазина."""
+    return {
+        'game': game,
+        'title': event.title,
+        'kind': event.kind.value if event.kind else None,
+        'price': float(event.price) if event.price else None,
+        'discount_pct': float(event.discount_pct) if event.discount_pct else None,
+        'store_id': event.store_id,
+        'store': store,
+        'in_stock': event.in_stock,
+    }
+
+
+def event_records(db: Session, events: Sequence[ListingEvent]) -> List[Record]:
+    """Записи пачки событий: игры и магазины загружаются одним запросом IN каждые."""
+    # События, истекшие после commit, перечитываются одним запросом, а не по одному
+    expired = [
+        state.identity[0] for state in map(inspect, events)
+        if state.identity is not None and state.expired_attributes
+    ]
+    if expired:
+        db.query(ListingEvent).filter(ListingEvent.id.in_(expired)).all()
+
+    game_ids = {event.game_id for event in events if event.game_id}
+    store_ids = {event.store_id for event in events if event.store_id}
+    games = dict(db.query(Game.id, Game.title).filter(Game.id.in_(game_ids)).all()) if game_ids else {}
+    stores = dict(db.query(Store.id, Store.name).filter(Store.id.in_(store_ids)).all()) if store_ids else {}
+    return [event_record(event, games.get(event.game_id), stores.get(event.store_id)) for event in events]
+
+
+def _never(record: Record) -> bool:
+    return False
+
+
+def condition_keywords(condition: Dict[str, Any]) -> List[str]:
+    """Ключевые слова условия contains/contains_any."""
+    value = condition.get('value')
+    if condition.get('op') == 'contains':
+        return [str(value)]
+    if condition.get('op') == 'contains_any':
+        return [str(item) for item in (value or [])]
+    return []
+
+
+def compile_condition(condition: Dict[str, Any], owner: Optional[Hashable] = None) -> Predicate:
+    """
+    Скомпилировать условие {'field', 'op', 'value'} в функцию от записи.
+
+    owner - идентификатор условия в автомате ключевых слов: если он задан,
+    условие contains/contains_any проверяется по найденным автоматом условиям
+    записи (KEYWORD_HITS), а без них - поиском подстроки.
+    """
+    name = condition.get('field')
+    op = condition.get('op')
+    value = condition.get('value')
+
+    if name not in RULE_FIELDS:
+        logger.warning(f"Unknown rule field: {name}")
+        return _never
+
+    if name in NUMERIC_FIELDS and op in ('>=', '<=', '='):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            logger.warning(f"Non-numeric value {value!r} for field {name}")
+            return _never
+
+    if op == 'in':
+        values = frozenset(value) if isinstance(value, (list, tuple, set)) else frozenset([value])
+
+        def predicate(record: Record) -> bool:
+            return record.get(name) in values
+    elif op in ('contains', 'contains_any'):
+        needles = tuple(normalize_text(keyword) for keyword in condition_keywords(condition))
+
+        def predicate(record: Record) -> bool:
+            hits = record.get(KEYWORD_HITS)
+            if owner is not None and hits is not None:
+                return owner in hits.get(name, ())
+            current = record.get(name)
+            if not isinstance(current, str):
+                return False
+            current = normalize_text(current)
+            return any(needle in current for needle in needles)
+    elif op == '>=':
+        def predicate(record: Record) -> bool:
+            current = record.get(name)
+            return current is not None and current >= value
+    elif op == '<=':
+        def predicate(record: Record) -> bool:
+            current = record.get(name)
+            return current is not None and current <= value
+    elif op == '=':
+        def predicate(record: Record) -> bool:
+            current = record.get(name)
+            return current is not None and current == value
+    else:
+        logger.warning(f"Unknown operator: {op}")
+        return _never
+
+    return predicate
+
+
+@dataclass
+class CompiledRule:
+    """Правило со скомпилированными условиями."""
+    id: Any
+    updated_at: Optional[datetime]
+    name: str
+    channels: List[str]
+    cooldown_hours: Any
+    predicate: Predicate
+    fields: frozenset
+    # Режим доставки: 'immediate' или период сводки ('hourly', 'daily')
+    digest: str = 'immediate'
+    # Значения поля индекса: (поле, значения) или None, если правило не индексируется
+    index_key: Optional[Tuple[str, frozenset]] = None
+    # Ключевые слова для автоматов: (поле, слово, владелец)
+    keywords: List[Tuple[str, str, Hashable]] = field(default_factory=list)
+    # Условие с ключевыми словами, по которому индексируется правило: (поле, владелец)
+    keyword_key: Optional[Tuple[str, Hashable]] = None
+    position: int = 0
+
+    def matches(self, record: Record) -> bool:
+        return self.predicate(record)
+
+
+def _index_key(rule: AlertRule) -> Optional[Tuple[str, frozenset]]:
+    """Различающее условие правила: только правила AND и условия =/in."""
+    if rule.logic == 'OR':
+        return None
+
+    for name in INDEXED_FIELDS:
+        for condition in rule.conditions or []:
+            if condition.get('field') != name:
+                continue
+            value = condition.get('value')
+            if condition.get('op') == '=' and isinstance(value, str):
+                return name, frozenset([value])
+            if condition.get('op') == 'in' and isinstance(value, (list, tuple)) \
+                    and all(isinstance(item, str) for item in value):
+                return name, frozenset(value)
+    return None
+
+
+def compile_rule(rule: AlertRule) -> CompiledRule:
+    """Скомпилировать правило AlertRule."""
+    conditions = rule.conditions or []
+    predicates = []
+    keywords = []
+    for position, condition in enumerate(conditions):
+        owner = None
+        if condition.get('field') in KEYWORD_FIELDS and condition.get('op') in ('contains', 'contains_any'):
+            owner = (rule.id, position)
+            keywords.extend(
+                (condition['field'], keyword, owner) for keyword in condition_keywords(condition)
+            )
+        predicates.append(compile_condition(condition, owner))
+    predicates = tuple(predicates)
+
+    index_key = _index_key(rule)
+    keyword_key = None
+    if index_key is None and rule.logic != 'OR' and keywords:
+        keyword_key = (keywords[0][0], keywords[0][2])
+
+    if rule.logic == 'OR':
+        def predicate(record: Record) -> bool:
+            return any(check(record) for check in predicates)
+    else:
+        def predicate(record: Record) -> bool:
+            return all(check(record) for check in predicates)
+
+    return CompiledRule(
+        id=rule.id,
+        updated_at=rule.updated_at,
+        name=rule.name,
+        channels=list(rule.channels or []),
+        cooldown_hours=rule.cooldown_hours,
+        predicate=predicate,
+        digest=rule.digest or 'immediate',
+        fields=frozenset(condition.get('field') for condition in conditions),
+        index_key=index_key,
+        keywords=keywords,
+        keyword_key=keyword_key
+    )
+
+
+@dataclass
+class RuleIndex:
+    """Включенные правила, разложенные по значениям индексируемых полей."""
+    rules: List[CompiledRule] = field(default_factory=list)
+    buckets: Dict[str, Dict[Any, List[CompiledRule]]] = field(default_factory=dict)
+    unindexed: List[CompiledRule] = field(default_factory=list)
+    # Правила, индексированные по условию с ключевыми словами: владелец -> правило
+    by_keyword: Dict[Hashable, CompiledRule] = field(default_factory=dict)
+    keyword_fields: frozenset = frozenset()
+    fields: frozenset = frozenset()
+
+    @classmethod
+    def build(cls, rules: Sequence[CompiledRule]) -> 'RuleIndex':
+        index = cls(rules=list(rules))
+        for position, rule in enumerate(index.rules):
+            rule.position = position
+            if rule.keyword_key is not None:
+                index.by_keyword[rule.keyword_key[1]] = rule
+                continue
+            if rule.index_key is None:
+                index.unindexed.append(rule)
+                continue
+            name, values = rule.index_key
+            bucket = index.buckets.setdefault(name, {})
+            for value in values:
+                bucket.setdefault(value, []).append(rule)
+        index.keyword_fields = frozenset(rule.keyword_key[0] for rule in index.by_keyword.values())
+        index.fields = frozenset().union(*(rule.fields for rule in index.rules))
+        return index
+
+    def candidates(self, record: Record, hits: Optional[Dict[str, set]] = None) -> List[CompiledRule]:
+        """Правила, которые могут сработать для записи; hits - найденные автоматами условия."""
+        found = list(self.unindexed)
+        for name, bucket in self.buckets.items():
+            found.extend(bucket.get(record.get(name), ()))
+        for owners in (hits or {}).values():
+            found.extend(self.by_keyword[owner] for owner in owners if owner in self.by_keyword)
+        if len(found) > 1:
+            found.sort(key=lambda rule: rule.position)
+        return found
+
+
+class RuleEngine:
+    """Компиляция, кэш и пакетная проверка правил уведомлений."""
+
+    def __init__(self):
+        self._compiled: Dict[Any, CompiledRule] = {}
+        self._index = RuleIndex()
+        self._version: Tuple = ()
+        self._keywords: Dict[str, KeywordMatcher] = {name: KeywordMatcher() for name in KEYWORD_FIELDS}
+
+    @property
+    def fields(self) -> frozenset:
+        """Поля событий, на которые ссылаются включенные правила."""
+        return self._index.fields
+
+    def _register(self, rule: CompiledRule):
+        for name, keyword, owner in rule.keywords:
+            self._keywords[name].add(keyword, owner)
+
+    def _unregister(self, rule: CompiledRule):
+        for name, keyword, owner in rule.keywords:
+            self._keywords[name].remove(keyword, owner)
+
+    def refresh(self, db: Session) -> RuleIndex:
+        """
+        Обновить включенные правила из базы.
+
+        Из базы читаются только id и updated_at; полные строки загружаются и
+        компилируются лишь для новых и измененных правил, и только их
+        ключевые слова добавляются в автоматы или удаляются из них.
+        """
+        rows = db.query(AlertRule.id, AlertRule.updated_at).filter(AlertRule.enabled == True)\
+            .order_by(AlertRule.created_at, AlertRule.id).all()
+        version = tuple((row.id, row.updated_at) for row in rows)
+        if version == self._version:
+            return self._index
+
+        enabled = {row.id for row in rows}
+        for rule_id in [rule_id for rule_id in self._compiled if rule_id not in enabled]:
+            self._unregister(self._compiled.pop(rule_id))
+
+        changed = [
+            row.id for row in rows
+            if row.id not in self._compiled or self._compiled[row.id].updated_at != row.updated_at
+        ]
+        if changed:
+            for rule in db.query(AlertRule).filter(AlertRule.id.in_(changed)):
+                previous = self._compiled.pop(rule.id, None)
+                if previous is not None:
+                    self._unregister(previous)
+                try:
+                    self._compiled[rule.id] = compile_rule(rule)
+                except Exception as e:
+                    logger.error(f"Failed to compile rule {rule.id}: {e}")
+                    continue
+                self._register(self._compiled[rule.id])
+            logger.debug(f"Compiled {len(changed)} alert rules")
+
+        self._index = RuleIndex.build([self._compiled[row.id] for row in rows if row.id in self._compiled])
+        self._version = version
+        return self._index
+
+    def match(self, db: Session, records: Iterable[Record]) -> List[List[CompiledRule]]:
+        """Сработавшие правила для каждой записи пачки (в порядке записей)."""
+        index = self.refresh(db)
+        return [self.match_record(index, record) for record in records]
+
+    def match_record(self, index: RuleIndex, record: Record) -> List[CompiledRule]:
+        # Ключевые слова ищутся один раз на поле: сначала для выбора правил,
+        # индексированных по ним, затем - если они нужны остальным кандидатам
+        hits = {name: self._keywords[name].search(record.get(name)) for name in index.keyword_fields}
+        candidates = index.candidates(record, hits)
+
+        for rule in candidates:
+            for name, _keyword, _owner in rule.keywords:
+                if name not in hits:
+                    hits[name] = self._keywords[name].search(record.get(name))
+        if hits:
+            record[KEYWORD_HITS] = hits
+
+        matched = []
+        for rule in candidates:
+            try:
+                if rule.matches(record):
+                    matched.append(rule)
+            except Exception as e:
+                logger.error(f"Error evaluating rule {rule.id}: {e}")
+        return matched
+
+    def clear(self):
+        """Сбросить кэш скомпилированных правил."""
+        self._compiled = {}
+        self._index = RuleIndex()
+        self._version = ()
+        self._keywords = {name: KeywordMatcher() for name in KEYWORD_FIELDS}
+
+
+rule_engine = RuleEngine()
@@ -0,0 +1,228 @@
+"""
+Индекс предпочтений Web Push подписок.
+
+Предпочтения подписки хранятся в WebPushSubscription.data['preferences']:
+stores (id магазинов), kinds (типы событий), games (id игр) - списки, пустой
+список означает «без ограничения»; max_price - потолок цены (события без цены
+проходят). Уведомление о событии получают только подписки, чьим предпочтениям
+оно соответствует, а не все активные.
+
+Индекс держит активные подписки в памяти битовыми масками (целые числа
+Python): каждой подписке присвоен номер бита, для каждого значения поля
+(магазина, типа, игры, потолка цены) - маска выбравших его подписок, для
+каждого поля - маска подписок без ограничения по нему. Подписки события -
+пересечение (AND) масок его магазина, типа, игры и цены: несколько операций
+над масками вместо проверки каждой подписки.
+
+Как и rule_engine, индекс обновляется из базы перед проверкой пачки: сначала
+сравнивается сводка активных подписок (число, последние created_at и
+updated_at), и только при ее изменении читаются id и updated_at, а полные
+строки - лишь для новых и измененных подписок.
+"""
+
+import logging
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.webpush_subscription import WebPushSubscription
+
+logger = logging.getLogger(__name__)
+
+# Поле предпочтений -> поле данных уведомления
+PREFERENCE_FIELDS = {
+    'stores': 'store_id',
+    'kinds': 'kind',
+    'games': 'game_id',
+}
+
+# Номера единичных битов каждого байта
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+class Preferences(NamedTuple):
+    """Нормализованные предпочтения подписки."""
+
+    stores: frozenset
+    kinds: frozenset
+    games: frozenset
+    max_price: Optional[float]
+
+
+def _normalize_kind(value: Any) -> str:
+    """Тип события для сравнения: без учета регистра."""
+    return str(value).lower()
+
+
+# Приведение значений поля (предпочтений и события) к виду ключей масок
+NORMALIZERS = {
+    'stores': str,
+    'kinds': _normalize_kind,
+    'games': str,
+}
+
+
+def normalize_preferences(data: Optional[Dict[str, Any]]) -> Preferences:
+    """Предпочтения из WebPushSubscription.data (отсутствующие - без ограничений)."""
+    preferences = (data or {}).get('preferences') or {}
+
+    def values(name: str) -> frozenset:
+        return frozenset(NORMALIZERS[name](value) for value in preferences.get(name) or () if value is not None)
+
+    max_price = preferences.get('max_price')
+    try:
+        max_price = float(max_price) if max_price is not None else None
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid max_price in subscription preferences: {max_price!r}")
+        max_price = None
+
+    return Preferences(values('stores'), values('kinds'), values('games'), max_price)
+
+
+def _positions(mask: int) -> List[int]:
+    """Номера единичных битов маски."""
+    positions = []
+    for offset, byte in enumerate(mask.to_bytes((mask.bit_length() + 7) // 8, 'little')):
+        if byte:
+            base = offset * 8
+            positions.extend(base + bit for bit in _BYTE_BITS[byte])
+    return positions
+
+
+class _Entry(NamedTuple):
+    position: int
+    updated_at: Any
+    preferences: Preferences
+
+
+class SubscriptionIndex:
+    """Битовый индекс активных подписок по предпочтениям."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Сбросить индекс."""
+        self._signature: Optional[Tuple] = None
+        self._entries: Dict[Any, _Entry] = {}
+        self._infos: List[Optional[Dict[str, Any]]] = []
+        self._free: List[int] = []
+        self._all = 0
+        self._by_value: Dict[str, Dict[str, int]] = {name: {} for name in PREFERENCE_FIELDS}
+        self._unrestricted: Dict[str, int] = {name: 0 for name in PREFERENCE_FIELDS}
+        self._ceilings: Dict[float, int] = {}
+        self._ceiling_values: List[float] = []
+        self._no_ceiling = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _add(self, subscription: WebPushSubscription):
+        preferences = normalize_preferences(subscription.data)
+        position = self._free.pop() if self._free else len(self._infos)
+        if position == len(self._infos):
+            self._infos.append(None)
+        self._infos[position] = subscription.subscription_info
+        self._entries[subscription.id] = _Entry(position, subscription.updated_at, preferences)
+
+        bit = 1 << position
+        self._all |= bit
+        for name in PREFERENCE_FIELDS:
+            values = getattr(preferences, name)
+            if not values:
+                self._unrestricted[name] |= bit
+            for value in values:
+                self._by_value[name][value] = self._by_value[name].get(value, 0) | bit
+
+        if preferences.max_price is None:
+            self._no_ceiling |= bit
+        else:
+            if preferences.max_price not in self._ceilings:
+                self._ceiling_values.insert(bisect_left(self._ceiling_values, preferences.max_price), preferences.max_price)
+            self._ceilings[preferences.max_price] = self._ceilings.get(preferences.max_price, 0) | bit
+
+    def _remove(self, subscription_id):
+        entry = self._entries.pop(subscription_id, None)
+        if entry is None:
+            return
+        preferences = entry.preferences
+        keep = ~(1 << entry.position)
+
+        self._all &= keep
+        for name in PREFERENCE_FIELDS:
+            values = getattr(preferences, name)
+            if not values:
+                self._unrestricted[name] &= keep
+            bucket = self._by_value[name]
+            for value in values:
+                bucket[value] &= keep
+                if not bucket[value]:
+                    del bucket[value]
+
+        if preferences.max_price is None:
+            self._no_ceiling &= keep
+        else:
+            self._ceilings[preferences.max_price] &= keep
+            if not self._ceilings[preferences.max_price]:
+                del self._ceilings[preferences.max_price]
+                self._ceiling_values.remove(preferences.max_price)
+
+        self._infos[entry.position] = None
+        self._free.append(entry.position)
+
+    def refresh(self, db: Session):
+        """Обновить индекс из базы (см. описание модуля)."""
+        active = WebPushSubscription.is_active == True
+        signature = tuple(db.query(
+            func.count(WebPushSubscription.id),
+            func.max(WebPushSubscription.created_at),
+            func.max(WebPushSubscription.updated_at)
+        ).filter(active).one())
+
+        with self._lock:
+            if signature == self._signature:
+                return
+
+            rows = {row.id: row.updated_at for row in db.query(WebPushSubscription.id, WebPushSubscription.updated_at).filter(active)}
+            for subscription_id in [subscription_id for subscription_id in self._entries if subscription_id not in rows]:
+                self._remove(subscription_id)
+
+            changed = [
+                subscription_id for subscription_id, updated_at in rows.items()
+                if subscription_id not in self._entries or self._entries[subscription_id].updated_at != updated_at
+            ]
+            for start in range(0, len(changed), 500):
+                for subscription in db.query(WebPushSubscription)\
+                        .filter(WebPushSubscription.id.in_(changed[start:start + 500])):
+                    self._remove(subscription.id)
+                    self._add(subscription)
+            if changed:
+                logger.debug(f"Indexed {len(changed)} Web Push subscriptions")
+
+            self._signature = signature
+
+    def match(self, event_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Подписки (subscription_info), предпочтениям которых соответствует событие."""
+        with self._lock:
+            mask = self._all
+            for name, key in PREFERENCE_FIELDS.items():
+                value = event_data.get(key)
+                mask &= self._unrestricted[name] | self._by_value[name].get(NORMALIZERS[name](value) if value is not None else None, 0)
+                if not mask:
+                    return []
+
+            price = event_data.get('price')
+            if price is not None:
+                allowed = self._no_ceiling
+                for ceiling in self._ceiling_values[bisect_left(self._ceiling_values, float(price)):]:
+                    allowed |= self._ceilings[ceiling]
+                mask &= allowed
+
+            return [self._infos[position] for position in _positions(mask)]
+
+
+subscription_index = SubscriptionIndex()
@@ -0,0 +1,338 @@
+"""
+Отправка сообщений в Telegram Bot API.
+
+Telegram пропускает около одного сообщения в секунду в чат и на превышение
+отвечает 429 с retry_after. Поэтому:
+
+- httpx.AsyncClient создается один на цикл событий и переиспользует соединение
+  между сообщениями и запусками доставки;
+- перед отправкой сообщение занимает слот в очереди чата: ключ Redis
+  bgw:telegram:next:<chat_id> хранит время следующего свободного слота и
+  сдвигается на TELEGRAM_CHAT_INTERVAL скриптом Lua, так что все воркеры
+  доставки вместе не превышают ограничение. Ответ 429 сдвигает слот на
+  retry_after для всех воркеров. Без Redis очередь чата ведется в процессе;
+- если очередь чата длиннее TELEGRAM_MAX_WAIT_SECONDS, сообщение не ждет, а
+  возвращается в outbox на повтор;
+- пачка уведомлений объединяется в сводки (build_digests): события
+  группируются по магазину и типу в сообщения до 4096 символов, и сотня
+  событий распродажи уходит несколькими сообщениями вместо сотни;
+- сводка правила за час или день (AlertRule.digest) приходит одним
+  уведомлением и отправляется одним сообщением с разделами (format_digest).
+"""
+
+import asyncio
+import html
+import logging
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "bgw:telegram:next:"
+# Ограничение Telegram на длину текста сообщения
+MESSAGE_LIMIT = 4096
+
+# Занять слот отправки в чат: вернуть {1, ожидание} и сдвинуть очередь на
+# интервал или {0, ожидание}, если ждать дольше ARGV[3]
+RESERVE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local slot = math.max(tonumber(redis.call('GET', KEYS[1]) or '0'), now)
+if slot - now > tonumber(ARGV[3]) then
+    return {'0', tostring(slot - now)}
+end
+redis.call('SET', KEYS[1], tostring(slot + tonumber(ARGV[2])), 'EX', ARGV[4])
+return {'1', tostring(slot - now)}
+"""
+
+# Сдвинуть очередь чата на retry_after (только вперед)
+PENALIZE_SCRIPT = """
+local slot = tonumber(ARGV[1])
+if slot > tonumber(redis.call('GET', KEYS[1]) or '0') then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+end
+return 1
+"""
+
+KIND_EMOJIS = {
+    'announce': '📢',
+    'preorder': '🎯',
+    'release': '🎉',
+    'discount': '💰',
+    'price': '💵'
+}
+
+KIND_TITLES = {
+    'announce': 'Анонсы',
+    'preorder': 'Предзаказы',
+    'release': 'Релизы',
+    'discount': 'Скидки',
+    'price': 'Изменения цен'
+}
+
+# Подпись периода в заголовке сводки правила
+DIGEST_PERIODS = {
+    'hourly': 'сводка за час',
+    'daily': 'сводка за день'
+}
+
+FOOTER = "🔔 Настройки уведомлений — в приложении"
+
+
+class TelegramError(Exception):
+    """Сообщение не отправлено."""
+
+
+def format_message(event_data: Dict[str, Any]) -> str:
+    """Сообщение об одном событии."""
+    title = html.escape(event_data.get('title') or 'Событие')
+    store_name = html.escape(str(event_data.get('store_name') or 'Магазин'))
+    price = event_data.get('price')
+    discount_pct = event_data.get('discount_pct')
+    in_stock = event_data.get('in_stock')
+    url = event_data.get('url')
+    kind = event_data.get('kind', 'announce')
+
+    message_parts = [
+        f"{KIND_EMOJIS.get(kind, '📢')} <b>{title}</b>",
+        f"🏪 Магазин: {store_name}"
+    ]
+
+    if price:
+        message_parts.append(f"💳 Цена: {price} ₽")
+
+    if discount_pct:
+        message_parts.append(f"🏷️ Скидка: {discount_pct}%")
+
+    if in_stock is not None:
+        status = "✅ В наличии" if in_stock else "❌ Нет в наличии"
+        message_parts.append(status)
+
+    if url:
+        message_parts.append(f"🔗 {html.escape(url)}")
+
+    message_parts.append("")
+    message_parts.append(FOOTER)
+
+    return "\n".join(message_parts)
+
+
+def _digest_line(event_data: Dict[str, Any]) -> str:
+    """Строка события в сводке."""
+    title = html.escape(event_data.get('title') or 'Событие')
+    url = event_data.get('url')
+    line = f"• <a href=\"{html.escape(url)}\">{title}</a>" if url else f"• {title}"
+
+    details = []
+    if event_data.get('price'):
+        details.append(f"{event_data['price']} ₽")
+    if event_data.get('discount_pct'):
+        details.append(f"−{event_data['discount_pct']}%")
+    if event_data.get('in_stock') is False:
+        details.append("нет в наличии")
+    if details:
+        line += f" — {', '.join(details)}"
+    return line
+
+
+def _group(payloads: List[Dict[str, Any]]) -> Dict[Tuple[str, str], List[int]]:
+    """Номера уведомлений по магазину и типу события."""
+    groups: Dict[Tuple[str, str], List[int]] = {}
+    for index, event_data in enumerate(payloads):
+        key = (str(event_data.get('store_name') or 'Магазин'), event_data.get('kind') or 'announce')
+        groups.setdefault(key, []).append(index)
+    return groups
+
+
+def _group_header(store_name: str, kind: str, count: int) -> str:
+    return f"{KIND_EMOJIS.get(kind, '📢')} <b>{KIND_TITLES.get(kind, kind)}: {html.escape(store_name)}</b> ({count})"
+
+
+def _fit_line(event_data: Dict[str, Any], max_line: int) -> str:
+    """Строка события в сводке не длиннее max_line."""
+    line = _digest_line(event_data)
+    # Строка, которая не помещается даже в пустое сообщение, заменяется
+    # обрезанным названием (с запасом на экранирование HTML)
+    if len(line) > max_line:
+        line = f"• {html.escape((event_data.get('title') or 'Событие')[:max(max_line // 6 - 1, 1)])}"
+    return line
+
+
+def build_digests(payloads: List[Dict[str, Any]], limit: int = MESSAGE_LIMIT) -> List[Tuple[str, List[int]]]:
+    """
+    Объединить уведомления в сводки по магазину и типу события.
+
+    Возвращает сообщения и номера уведомлений (индексы payloads), вошедших в
+    каждое. Сообщение не длиннее limit символов: большая группа делится на
+    несколько сообщений.
+    """
+    footer = f"\n\n{FOOTER}"
+    digests = []
+    for (store_name, kind), indexes in _group(payloads).items():
+        header = _group_header(store_name, kind, len(indexes))
+        lines: List[str] = []
+        included: List[int] = []
+        size = len(header) + len(footer)
+        max_line = limit - size - 1
+        for index in indexes:
+            line = _fit_line(payloads[index], max_line)
+            if lines and size + len(line) + 1 > limit:
+                digests.append(("\n".join([header, *lines]) + footer, included))
+                lines, included = [], []
+                size = len(header) + len(footer)
+            lines.append(line)
+            included.append(index)
+            size += len(line) + 1
+        digests.append(("\n".join([header, *lines]) + footer, included))
+
+    return digests
+
+
+def format_digest(digest: Dict[str, Any], limit: int = MESSAGE_LIMIT) -> List[str]:
+    """
+    Сообщения сводки правила за период (см. digest_service).
+
+    События разбиты на разделы по магазину и типу; сводка длиннее limit
+    символов продолжается следующими сообщениями.
+    """
+    items = digest.get('items') or []
+    header = (
+        f"📬 <b>{html.escape(digest.get('rule_name') or 'Правило')}</b> — "
+        f"{DIGEST_PERIODS.get(digest.get('digest'), 'сводка')} ({len(items)})"
+    )
+    footer = f"\n\n{FOOTER}"
+    max_line = limit - len(header) - len(footer) - 2
+
+    lines: List[str] = []
+    for (store_name, kind), indexes in _group(items).items():
+        lines.append("")
+        lines.append(_group_header(store_name, kind, len(indexes)))
+        lines.extend(_fit_line(items[index], max_line) for index in indexes)
+
+    messages = []
+    chunk: List[str] = []
+    size = len(header) + len(footer)
+    for line in lines:
+        if chunk and size + len(line) + 1 > limit:
+            messages.append("\n".join([header, *chunk]) + footer)
+            chunk = []
+            size = len(header) + len(footer)
+        # Раздел не начинается пустой строкой в начале сообщения
+        if chunk or line:
+            chunk.append(line)
+            size += len(line) + 1
+    messages.append("\n".join([header, *chunk]) + footer)
+    return messages
+
+
+def _retry_after(response: httpx.Response) -> float:
+    """retry_after из ответа 429 (по умолчанию секунда)."""
+    try:
+        return float(response.json().get('parameters', {}).get('retry_after', 1))
+    except (ValueError, AttributeError):
+        return 1.0
+
+
+class TelegramSender:
+    """Отправка сообщений с общим клиентом и очередью чата."""
+
+    def __init__(self, interval: float = 1.0, max_wait: float = 60.0, timeout: float = 10.0, max_retries: int = 3):
+        self.interval = interval
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = \
+            weakref.WeakKeyDictionary()
+        self._reserve_script = None
+        self._penalize_script = None
+        # Очередь чатов без Redis: время следующего слота
+        self._local_slots: Dict[str, float] = {}
+        self._local_lock = threading.Lock()
+
+    def _client(self) -> httpx.AsyncClient:
+        """Клиент текущего цикла событий."""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(timeout=self.timeout)
+            self._clients[loop] = client
+        return client
+
+    def _reserve(self, chat_id: str) -> Optional[float]:
+        """Занять слот отправки в чат: сколько ждать или None, если ждать дольше max_wait."""
+        now = time.time()
+        try:
+            client = get_redis()
+            if self._reserve_script is None:
+                self._reserve_script = client.register_script(RESERVE_SCRIPT)
+            reserved, wait = self._reserve_script(
+                keys=[f"{KEY_PREFIX}{chat_id}"],
+                args=[now, self.interval, self.max_wait, int(self.max_wait + self.interval) + 1],
+                client=client
+            )
+            return float(wait) if str(reserved) == '1' else None
+        except RedisError as e:
+            logger.debug(f"Redis unavailable, using in-process queue of chat {chat_id}: {e}")
+
+        with self._local_lock:
+            slot = max(self._local_slots.get(chat_id, 0.0), now)
+            if slot - now > self.max_wait:
+                return None
+            self._local_slots[chat_id] = slot + self.interval
+            return slot - now
+
+    def _penalize(self, chat_id: str, retry_after: float):
+        """Не отправлять в чат ничего retry_after секунд."""
+        slot = time.time() + retry_after
+        try:
+            client = get_redis()
+            if self._penalize_script is None:
+                self._penalize_script = client.register_script(PENALIZE_SCRIPT)
+            self._penalize_script(keys=[f"{KEY_PREFIX}{chat_id}"], args=[slot, int(retry_after) + 1], client=client)
+        except RedisError as e:
+            logger.debug(f"Redis unavailable, using in-process queue of chat {chat_id}: {e}")
+        with self._local_lock:
+            self._local_slots[chat_id] = max(self._local_slots.get(chat_id, 0.0), slot)
+
+    async def send_message(self, api_url: str, chat_id: str, text: str):
+        """Отправить сообщение в очередь чата; TelegramError - не отправлено."""
+        for _ in range(self.max_retries + 1):
+            wait = self._reserve(chat_id)
+            if wait is None:
+                raise TelegramError(f"Send queue of chat {chat_id} is longer than {self.max_wait:g} s")
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            response = await self._client().post(
+                f"{api_url}/sendMessage",
+                json={
+                    "chat_id": chat_id,
+                    "text": text,
+                    "parse_mode": "HTML",
+                    "disable_web_page_preview": False
+                }
+            )
+            if response.status_code == 429:
+                retry_after = _retry_after(response)
+                logger.warning(f"Telegram rate limit for chat {chat_id}, retry after {retry_after:g} s")
+                self._penalize(chat_id, retry_after)
+                continue
+            if response.status_code != 200:
+                raise TelegramError(f"Telegram API error {response.status_code}: {response.text[:200]}")
+            return
+
+        raise TelegramError(f"Telegram rate limit for chat {chat_id} persists after {self.max_retries} retries")
+
+
+telegram_sender = TelegramSender(
+    interval=settings.TELEGRAM_CHAT_INTERVAL,
+    max_wait=settings.TELEGRAM_MAX_WAIT_SECONDS,
+    timeout=settings.TELEGRAM_TIMEOUT
+)
@@ -1,14 +1,77 @@
-"""Сервис для работы с Web Push уведомлениями."""
+"""
+Сервис для работы с Web Push уведомлениями.
+
+Рассылка одного уведомления тысячам подписок (send_bulk_notifications):
+
+- заголовок VAPID (JWT) подписывается один раз на origin push-сервиса и
+  переиспользуется до истечения срока (WEBPUSH_VAPID_TTL), а не для каждой
+  подписки;
+- шифрование содержимого (ECE aes128gcm, уникальное для каждой подписки)
+  выполняется пачками в пуле потоков или процессов (WEBPUSH_ENCRYPT_EXECUTOR),
+  не блокируя цикл событий;
+- запросы уходят через общую сессию aiohttp цикла событий с пулом keep-alive
+  соединений, одновременно не больше WEBPUSH_CONCURRENCY. aiohttp, а не httpx:
+  пул соединений httpx тратит на запрос около 2 мс CPU, что ограничивает
+  рассылку сотнями уведомлений в секунду;
+- подписки, на которые push-сервис ответил 404/410, возвращаются списком и
+  отключаются одним UPDATE (deactivate_subscriptions).
+"""
+import asyncio
+import base64
 import json
 import logging
-from typing import Optional, Dict, Any, List
-from py_vapid import Vapid
-from pywebpush import WebPusher, WebPushException
+import multiprocessing
+import os
+import time
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+import http_ece
+from cryptography.hazmat.primitives.asymmetric import ec
+from py_vapid import Vapid, Vapid02
+from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.models.webpush_subscription import WebPushSubscription
 
 logger = logging.getLogger(__name__)
 
+# Подписок в одной задаче шифрования: меньше накладных расходов пула
+ENCRYPT_CHUNK = 64
+# Заголовок VAPID обновляется заранее, до истечения JWT
+VAPID_REFRESH_MARGIN = 10 * 60
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+
+def encrypt(subscription_info: Dict[str, Any], data: bytes) -> bytes:
+    """Зашифровать данные для подписки (RFC 8291, aes128gcm) новым эфемерным ключом."""
+    keys = subscription_info['keys']
+    return http_ece.encrypt(
+        data,
+        salt=os.urandom(16),
+        private_key=ec.generate_private_key(ec.SECP256R1()),
+        dh=_b64decode(keys['p256dh']),
+        auth_secret=_b64decode(keys['auth']),
+        version='aes128gcm'
+    )
+
+
+def encrypt_batch(subscriptions: List[Dict[str, Any]], data: bytes) -> List[Tuple[Optional[bytes], Optional[str]]]:
+    """Зашифровать данные для каждой подписки: (тело запроса, ошибка)."""
+    results = []
+    for subscription_info in subscriptions:
+        try:
+            results.append((encrypt(subscription_info, data), None))
+        except Exception as e:
+            results.append((None, f"Encryption failed: {e}"))
+    return results
+
 
 class WebPushService:
     """Сервис для отправки Web Push уведомлений."""
@@ -18,6 +81,13 @@ class WebPushService:
         self.vapid_claims = {
             "sub": f"mailto:{settings.VAPID_ADMIN_EMAIL}" if settings.VAPID_ADMIN_EMAIL else None
         }
+        self._vapid_key: Optional[Vapid02] = None
+        # origin push-сервиса -> (заголовки VAPID, срок действия JWT)
+        self._vapid_cache: Dict[str, Tuple[Dict[str, str], int]] = {}
+        self._sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = \
+            weakref.WeakKeyDictionary()
+        self._executor: Optional[Executor] = None
+        self._executor_pid: Optional[int] = None
 
     def _load_or_generate_vapid_keys(self) -> Dict[str, str]:
         """Загрузить или сгенерировать VAPID ключи."""
@@ -52,64 +122,135 @@ class WebPushService:
         """Получить публичный VAPID ключ для подписки."""
         return self.vapid_keys['public_key']
 
-    async def send_notification(
-        self,
-        subscription_info: Dict[str, Any],
-        payload: Dict[str, Any],
-        ttl: int = 86400  # 24 часа
-    ) -> Dict[str, Any]:
-        """Отправить Web Push уведомление."""
-        try:
-            # Подготавливаем payload
-            message = json.dumps(payload, ensure_ascii=False)
-
-            # Создаем WebPusher
-            webpusher = WebPusher(
-                subscription_info=subscription_info,
-                vapid_private_key=self.vapid_keys['private_key'],
-                vapid_claims=self.vapid_claims
+    def _vapid(self) -> Optional[Vapid02]:
+        """Ключ VAPID для подписи заголовков или None, если он не настроен."""
+        if self._vapid_key is None and self.vapid_keys.get('private_key'):
+            try:
+                self._vapid_key = Vapid02.from_string(self.vapid_keys['private_key'])
+            except Exception as e:
+                logger.error(f"Invalid VAPID private key, sending without VAPID: {e}")
+                self.vapid_keys['private_key'] = None
+        return self._vapid_key
+
+    def _vapid_headers(self, endpoint: str) -> Dict[str, str]:
+        """Заголовки VAPID для origin push-сервиса (из кэша, пока JWT не истек)."""
+        vapid = self._vapid()
+        if vapid is None:
+            return {}
+
+        url = urlparse(endpoint)
+        origin = f"{url.scheme}://{url.netloc}"
+        now = time.time()
+        cached = self._vapid_cache.get(origin)
+        if cached is not None and cached[1] - VAPID_REFRESH_MARGIN > now:
+            return cached[0]
+
+        expires = int(now) + settings.WEBPUSH_VAPID_TTL
+        claims = {'aud': origin, 'exp': expires}
+        if self.vapid_claims.get('sub'):
+            claims['sub'] = self.vapid_claims['sub']
+        headers = vapid.sign(claims)
+        self._vapid_cache[origin] = (headers, expires)
+        return headers
+
+    def _session(self) -> aiohttp.ClientSession:
+        """Общая HTTP сессия текущего цикла событий."""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=max(settings.WEBPUSH_CONCURRENCY, 1), ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=settings.WEBPUSH_TIMEOUT)
             )
+            self._sessions[loop] = session
+        return session
 
-            # Отправляем уведомление
-            response = await webpusher.send(message, ttl=ttl)
+    def _encrypt_executor(self) -> Optional[Executor]:
+        """Пул для шифрования (один на процесс) или None - шифровать в цикле событий."""
+        if self._executor is not None and self._executor_pid == os.getpid():
+            return self._executor
 
-            return {
-                'success': True,
-                'status_code': response.status_code,
-                'headers': dict(response.headers)
-            }
+        self._executor = None
+        self._executor_pid = os.getpid()
+        mode = settings.WEBPUSH_ENCRYPT_EXECUTOR
+        workers = settings.WEBPUSH_ENCRYPT_WORKERS or os.cpu_count() or 1
+        if mode == 'thread':
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='webpush-encrypt')
+        elif mode == 'process' and not multiprocessing.current_process().daemon:
+            # prefork воркер Celery - демонический процесс, дочерние процессы ему запрещены
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+        elif mode == 'process':
+            logger.warning("Web Push encryption process pool is unavailable in a daemon process, using threads")
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='webpush-encrypt')
+        return self._executor
 
-        except WebPushException as e:
-            logger.error(f"WebPush error: {e}")
-            # Некоторые ошибки означают, что подписка больше не действительна
-            if e.response and e.response.status_code in [404, 410]:
-                return {
-                    'success': False,
-                    'error': 'Subscription expired',
-                    'status_code': e.response.status_code,
-                    'should_delete_subscription': True
-                }
+    async def _encrypt(self, subscriptions: List[Dict[str, Any]], data: bytes) -> List[Tuple[Optional[bytes], Optional[str]]]:
+        executor = self._encrypt_executor()
+        if executor is None:
+            return encrypt_batch(subscriptions, data)
+        return await asyncio.get_running_loop().run_in_executor(executor, encrypt_batch, subscriptions, data)
 
+    async def _post(self, subscription_info: Dict[str, Any], body: bytes, ttl: int) -> Dict[str, Any]:
+        """Отправить зашифрованное уведомление push-сервису подписки."""
+        endpoint = subscription_info['endpoint']
+        headers = {
+            'TTL': str(ttl),
+            'Content-Encoding': 'aes128gcm',
+            'Content-Type': 'application/octet-stream',
+            **self._vapid_headers(endpoint)
+        }
+        try:
+            async with self._session().post(endpoint, data=body, headers=headers) as response:
+                status = response.status
+                text = await response.text(errors='replace') if status > 202 else ''
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return {'success': False, 'error': f"{type(e).__name__}: {e}", 'status_code': 500}
+
+        if status <= 202:
+            return {'success': True, 'status_code': status}
+
+        # Эти ответы означают, что подписка больше не действительна
+        if status in (404, 410):
             return {
                 'success': False,
-                'error': str(e),
-                'status_code': e.response.status_code if e.response else 500
-            }
-        except Exception as e:
-            logger.error(f"Unexpected error sending push notification: {e}")
-            return {
-                'success': False,
-                'error': str(e),
-                'status_code': 500
+                'error': 'Subscription expired',
+                'status_code': status,
+                'should_delete_subscription': True
             }
 
+        return {
+            'success': False,
+            'error': f"Push service error {status}: {text[:200]}",
+            'status_code': status
+        }
+
+    async def send_notification(
+        self,
+        subscription_info: Dict[str, Any],
+        payload: Dict[str, Any],
+        ttl: int = 86400  # 24 часа
+    ) -> Dict[str, Any]:
+        """Отправить Web Push уведомление."""
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        body, error = (await self._encrypt([subscription_info], data))[0]
+        if body is None:
+            return {'success': False, 'error': error, 'status_code': 400}
+        return await self._post(subscription_info, body, ttl)
+
     async def send_bulk_notifications(
         self,
         subscriptions: List[Dict[str, Any]],
         payload: Dict[str, Any],
         ttl: int = 86400
     ) -> Dict[str, Any]:
-        """Отправить уведомление множеству подписчиков."""
+        """
+        Отправить уведомление множеству подписчиков.
+
+        Подписки шифруются пачками по ENCRYPT_CHUNK в пуле, и отправка пачки
+        начинается, как только она зашифрована; одновременно выполняется не
+        больше WEBPUSH_CONCURRENCY запросов.
+        """
         results = {
             'total': len(subscriptions),
             'success': 0,
@@ -117,33 +258,58 @@ class WebPushService:
             'expired_subscriptions': [],
             'errors': []
         }
+        if not subscriptions:
+            return results
 
-        for subscription in subscriptions:
-            try:
-                result = await self.send_notification(subscription, payload, ttl)
-
-                if result['success']:
-                    results['success'] += 1
-                else:
-                    results['failed'] += 1
-                    results['errors'].append({
-                        'subscription': subscription.get('endpoint', 'unknown'),
-                        'error': result['error']
-                    })
-
-                    # Если подписка истекла, добавляем в список для удаления
-                    if result.get('should_delete_subscription'):
-                        results['expired_subscriptions'].append(subscription)
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        semaphore = asyncio.Semaphore(max(settings.WEBPUSH_CONCURRENCY, 1))
 
-            except Exception as e:
-                results['failed'] += 1
+        def record(subscription: Dict[str, Any], result: Dict[str, Any]):
+            if result['success']:
+                results['success'] += 1
+                return
+            results['failed'] += 1
+            # Если подписка истекла, добавляем в список для отключения
+            if result.get('should_delete_subscription'):
+                results['expired_subscriptions'].append(subscription)
+            else:
                 results['errors'].append({
                     'subscription': subscription.get('endpoint', 'unknown'),
-                    'error': str(e)
+                    'error': result['error']
                 })
 
+        async def post(subscription: Dict[str, Any], body: bytes):
+            async with semaphore:
+                record(subscription, await self._post(subscription, body, ttl))
+
+        async def send_chunk(chunk: List[Dict[str, Any]]):
+            sends = []
+            for subscription, (body, error) in zip(chunk, await self._encrypt(chunk, data)):
+                if body is None:
+                    record(subscription, {'success': False, 'error': error})
+                else:
+                    sends.append(post(subscription, body))
+            await asyncio.gather(*sends)
+
+        await asyncio.gather(*(
+            send_chunk(subscriptions[start:start + ENCRYPT_CHUNK])
+            for start in range(0, len(subscriptions), ENCRYPT_CHUNK)
+        ))
         return results
 
+    def deactivate_subscriptions(self, db: Session, endpoints: Iterable[str]) -> int:
+        """Отключить подписки (ответ 404/410) одним UPDATE на каждые 500 адресов."""
+        endpoints = list(dict.fromkeys(endpoints))
+        updated = 0
+        for start in range(0, len(endpoints), 500):
+            updated += db.query(WebPushSubscription)\
+                .filter(WebPushSubscription.endpoint.in_(endpoints[start:start + 500]))\
+                .update({WebPushSubscription.is_active: False}, synchronize_session=False)
+        if updated:
+            db.commit()
+            logger.info(f"Deactivated {updated} expired Web Push subscriptions")
+        return updated
+
     def validate_subscription(self, subscription_info: Dict[str, Any]) -> bool:
         """Валидировать информацию о подписке."""
         required_fields = ['endpoint', 'keys']
@@ -5,9 +5,13 @@ from app.core.database import SessionLocal
 from app.models.agent import SourceAgent
 from app.agents.registry import agent_registry
 from app.agents.base import RuntimeContext
-from app.services.notification_service import get_notification_service
 from app.services.event_service import event_service
+from app.services.adaptive_schedule_service import adaptive_schedule_service
+from app.services.deduplication_service import get_known_listing_states
+from app.core.config import settings
+from app.core.redis import get_redis
 import logging
+import random
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +19,6 @@ logger = logging.getLogger(__name__)
 @celery_app.task(bind=True)
 def run_agent_task(self, agent_id: str):
     """Запустить агента."""
-    import asyncio
     from app.services.event_service import event_service
 
     db = SessionLocal()
@@ -43,58 +46,197 @@ def run_agent_task(self, agent_id: str):
             logger.error(f"Unknown agent type: {e}")
             return {"status": "error", "reason": f"Unknown agent type: {agent.type}"}
 
-        # Создаем контекст выполнения
-        ctx = RuntimeContext(
-            agent_id=agent.id,
-            config=agent.config,
-            secrets={}  # Секреты получаем из безопасного хранилища
-        )
+        # Не запускаем агента, пока предыдущий запуск еще выполняется
+        run_lock = _agent_run_lock(agent_id)
+        if run_lock is not None and not run_lock.acquire(blocking=False):
+            logger.info(f"Agent {agent_id} is still running, skipping")
+            return {"status": "skipped", "reason": "already_running"}
 
-        # Запускаем агента
         try:
-            # Запускаем асинхронный код в event loop
+            return _run_agent(db, agent, agent_class)
+        finally:
+            if run_lock is not None:
+                _release_run_lock(run_lock)
+
+    finally:
+        db.close()
+
+
+def _run_agent(db, agent: SourceAgent, agent_class) -> dict:
+    """Выполнить агента и обработать найденные события."""
+    import asyncio
+
+    agent_id = agent.id
+    config = dict(agent.config)
+
+    # Адаптивное расписание: обходим только страницы, которые пора проверить
+    adaptive = adaptive_schedule_service.is_enabled(agent)
+    if adaptive:
+        due_urls = adaptive_schedule_service.select_due_urls(db, agent, config.get('start_urls', []))
+        if not due_urls:
+            logger.info(f"Agent {agent_id} has no due pages")
+            return {"status": "skipped", "reason": "no_due_pages", "agent_id": agent_id}
+        config['start_urls'] = due_urls
+
+    # Создаем контекст выполнения
+    ctx = RuntimeContext(
+        agent_id=agent.id,
+        config=config,
+        secrets={},  # Секреты получаем из безопасного хранилища
+        validators=adaptive_schedule_service.get_validators(db, agent.id),
+        known_listings=get_known_listing_states(db, agent.id) if config.get('pagination') else None
+    )
+
+    # Запускаем агента
+    try:
+        # Запускаем асинхронный код в event loop
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        agent_instance = agent_class(config, {}, ctx)
+        events = loop.run_until_complete(agent_instance.run())
+        loop.close()
+
+        logger.info(f"Agent {agent_id} found {len(events)} events")
+
+        # Сохраняем настройки, найденные агентом (например, шаблоны API)
+        if agent_instance.config_updates:
+            try:
+                agent.config = {**agent.config, **agent_instance.config_updates}
+                db.commit()
+                logger.info(f"Agent {agent_id} config updated: {', '.join(agent_instance.config_updates)}")
+            except Exception as e:
+                logger.error(f"Failed to save config of agent {agent_id}: {e}")
+                db.rollback()
+
+        # Обрабатываем найденные события постранично
+        processed_count = 0
+        queued_count = 0
+        for page in agent_instance.pages:
+            created = []
+            saved = not page.failed
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
-            events = loop.run_until_complete(agent_class(agent.config, {}, ctx).run())
-            loop.close()
-
-            logger.info(f"Agent {agent_id} found {len(events)} events")
+            try:
+                for event_draft in page.events:
+                    try:
+                        event = loop.run_until_complete(
+                            event_service.process_event(db, event_draft, agent.id, commit=False)
+                        )
+                        if event:
+                            created.append(event)
+                    except Exception as e:
+                        saved = False
+                        logger.error(f"Error processing event: {e}")
 
-            # Обрабатываем найденные события
-            processed_count = 0
-            for event_draft in events:
+                # События страницы и уведомления по ним фиксируются одной транзакцией
                 try:
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    event = loop.run_until_complete(event_service.process_event(db, event_draft, agent.id))
+                    queued_count += loop.run_until_complete(event_service.check_notification_rules_batch(db, created))
+                except Exception as e:
+                    logger.error(f"Failed to save events of page {page.url}: {e}")
+                    created = []
+                    saved = False
+            finally:
+                loop.close()
 
-                    if event:
-                        processed_count += 1
+            page_processed = len(created)
+            processed_count += page_processed
 
-                        # Проверяем правила уведомлений
-                        loop.run_until_complete(event_service.check_notification_rules(db, event))
+            # Сохраняем статистику изменений страницы. Валидаторы - только если
+            # страница разобрана и ее события сохранены: иначе следующий обход
+            # счел бы ее неизменной и потерянные события не появились бы
+            try:
+                adaptive_schedule_service.record_fetch(
+                    db, agent, page.url, page.hash, page_processed,
+                    etag=page.etag, last_modified=page.last_modified,
+                    save_validators=saved
+                )
+            except Exception as e:
+                logger.error(f"Failed to update crawl state for {page.url}: {e}")
+                db.rollback()
 
-                    loop.close()
+        if queued_count and settings.NOTIFICATION_DELIVERY_KICK:
+            _kick_delivery()
 
-                except Exception as e:
-                    logger.error(f"Error processing event: {e}")
+        return {
+            "status": "completed",
+            "agent_id": agent_id,
+            "pages_fetched": len(agent_instance.pages),
+            "pages_unchanged": sum(1 for page in agent_instance.pages if page.unchanged),
+            "events_found": len(events),
+            "events_processed": processed_count,
+            "notifications_queued": queued_count
+        }
+
+    except Exception as e:
+        logger.error(f"Agent {agent_id} execution failed: {e}")
+        return {
+            "status": "error",
+            "agent_id": agent_id,
+            "error": str(e)
+        }
+
+
+def _kick_delivery():
+    """Запустить доставку уведомлений, не дожидаясь beat."""
+    from app.tasks.notifications import process_pending_notifications
+
+    try:
+        process_pending_notifications.apply_async()
+    except Exception as e:
+        logger.warning(f"Failed to schedule notification delivery: {e}")
+
+
+def _agent_run_lock(agent_id: str):
+    """Получить блокировку запуска агента или None, если Redis недоступен."""
+    try:
+        client = get_redis()
+        client.ping()
+    except Exception as e:
+        logger.warning(f"Redis unavailable, running agent {agent_id} without lock: {e}")
+        return None
+
+    return client.lock(f"bgw:agent-run:{agent_id}", timeout=settings.AGENT_RUN_LOCK_TTL)
+
+
+def _release_run_lock(run_lock):
+    try:
+        run_lock.release()
+    except Exception as e:
+        logger.warning(f"Failed to release agent run lock: {e}")
+
+
+@celery_app.task
+def train_raw_archive_dictionary(agent_id: str, samples: int = 200):
+    """Обучить словарь zstd архива сырых страниц по последним страницам агента."""
+    from app.models.raw_item import RawItem
+    from app.services.raw_archive_service import get_raw_archive
+
+    archive = get_raw_archive()
+    if archive is None:
+        return {"status": "skipped", "reason": "raw_archive_disabled"}
+
+    db = SessionLocal()
+    try:
+        agent = db.query(SourceAgent).filter(SourceAgent.id == agent_id).first()
+        if not agent:
+            raise ValueError(f"Agent {agent_id} not found")
 
-            result = {
-                "status": "completed",
-                "agent_id": agent_id,
-                "events_found": len(events),
-                "events_processed": processed_count
-            }
+        agent_class = agent_registry.get(agent.type)
+        store_id = agent_class(agent.config, {}, RuntimeContext(agent.id, agent.config, {})).archive_store_id()
 
-        except Exception as e:
-            logger.error(f"Agent {agent_id} execution failed: {e}")
-            result = {
-                "status": "error",
-                "agent_id": agent_id,
-                "error": str(e)
-            }
+        refs = [
+            row.content_ref
+            for row in db.query(RawItem.content_ref)
+            .filter(RawItem.source_id == agent_id)
+            .order_by(RawItem.fetched_at.desc())
+            .limit(samples)
+        ]
+        pages = [body for body in map(archive.load, refs) if body]
+        if len(pages) < 10:
+            return {"status": "skipped", "reason": "not_enough_pages", "pages": len(pages)}
 
-        return result
+        dict_id = archive.train_dictionary(store_id, pages)
+        return {"status": "completed", "store_id": store_id, "dict_id": dict_id, "pages": len(pages)}
 
     finally:
         db.close()
@@ -109,7 +251,11 @@ def schedule_all_agents():
 
         for agent in agents:
             try:
-                run_agent_task.delay(agent.id)
+                # Разносим запуски во времени, чтобы не стартовать всех агентов разом
+                run_agent_task.apply_async(
+                    args=(agent.id,),
+                    countdown=random.uniform(0, settings.AGENT_SCHEDULE_JITTER_SECONDS)
+                )
                 logger.info(f"Scheduled agent {agent.id}")
             except Exception as e:
                 logger.error(f"Failed to schedule agent {agent.id}: {e}")
@@ -1,28 +1,76 @@
-from celery import Task
+"""Задачи доставки уведомлений из outbox (см. notification_delivery)."""
+import asyncio
+import os
+from datetime import datetime, timezone
 from app.celery_app import celery_app
-from app.services.notification_service import NotificationService
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.notification import Notification
+from app.services.digest_service import digest_service
+from app.services.notification_delivery import notification_delivery
+
+
+_loop = None
+_loop_pid = None
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    """Цикл событий процесса: клиенты каналов (httpx) переживают запуски доставки."""
+    global _loop, _loop_pid
+    if _loop is None or _loop_pid != os.getpid() or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        _loop_pid = os.getpid()
+    return _loop
+
+
+def _deliver(ids=None) -> dict:
+    db = SessionLocal()
+    try:
+        return _event_loop().run_until_complete(
+            notification_delivery.run(db, settings.NOTIFICATION_DELIVERY_MAX_SECONDS, ids=ids)
+        )
+    finally:
+        db.close()
 
 
 @celery_app.task(bind=True)
 def send_notification(self, notification_id: str):
-    """Отправить уведомление"""
+    """Доставить одно уведомление сейчас; неудачное и 'dead' ставится в очередь заново."""
+    db = SessionLocal()
     try:
-        db = next(get_db())
-        notification_service = NotificationService(db)
-        success = notification_service.send_notification(notification_id)
-        return {"status": "success", "notification_id": notification_id}
-    except Exception as exc:
-        self.retry(exc=exc, countdown=60, max_retries=3)
+        updated = db.query(Notification)\
+            .filter(Notification.id == notification_id, Notification.status.in_(('retry', 'dead')))\
+            .update({
+                Notification.status: 'pending',
+                Notification.attempts: 0,
+                Notification.next_attempt_at: datetime.now(timezone.utc)
+            }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+    stats = _deliver(ids=[notification_id])
+    return {"status": "success", "notification_id": notification_id, "requeued": bool(updated), **stats}
 
 
 @celery_app.task
 def process_pending_notifications():
-    """Обработать ожидающие уведомления"""
+    """Доставить уведомления, ожидающие в очереди."""
     try:
-        db = next(get_db())
-        notification_service = NotificationService(db)
-        processed = notification_service.process_pending_notifications()
-        return {"processed": processed}
+        return _deliver()
     except Exception as exc:
-        return {"error": str(exc)}
\ No newline at end of file
+        return {"error": str(exc)}
+
+
+@celery_app.task
+def flush_digests():
+    """Собрать сводки правил за закрывшиеся периоды и сразу доставить их."""
+    db = SessionLocal()
+    try:
+        stats = digest_service.flush(db)
+    finally:
+        db.close()
+
+    if stats['notifications']:
+        stats.update(_deliver())
+    return stats
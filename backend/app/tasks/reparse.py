@@ -0,0 +1,198 @@
+"""
+Повторный разбор архивных страниц агента.
+
+После исправления селектора или добавления поля извлечения события можно
+восстановить из архива сырых страниц, не обходя сайт заново. Страницы агента
+за период читаются пачками по (fetched_at, id), разбираются текущим parse()
+агента в пуле процессов разбора и проходят обычную обработку событий в режиме
+backfill: с исходным временем загрузки и без уведомлений.
+
+Позиция обработки сохраняется в Redis после каждой пачки; повторный запуск
+с теми же аргументами продолжает с места остановки.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.celery_app import celery_app
+from app.agents.base import Fetched, RuntimeContext
+from app.agents.executor import get_parse_executor
+from app.agents.registry import agent_registry
+from app.core.database import SessionLocal
+from app.core.redis import get_redis
+from app.models.agent import SourceAgent
+from app.models.raw_item import RawItem
+from app.services.event_service import event_service
+from app.services.raw_archive_service import get_raw_archive
+
+logger = logging.getLogger(__name__)
+
+CURSOR_TTL = 7 * 24 * 60 * 60
+
+
+def _parse_time(value: str) -> datetime:
+    """Время ISO 8601; без смещения считается UTC, а не часовым поясом сессии базы."""
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+def _cursor_key(agent_id: str, since: Optional[str], until: Optional[str]) -> str:
+    return f"bgw:reparse:{agent_id}:{since or '-'}:{until or '-'}"
+
+
+def _load_cursor(key: str) -> Optional[Dict[str, str]]:
+    try:
+        value = get_redis().get(key)
+    except Exception as e:
+        logger.warning(f"Redis unavailable, reparse starts from the beginning: {e}")
+        return None
+    return json.loads(value) if value else None
+
+
+def _save_cursor(key: str, cursor: Optional[Dict[str, str]]):
+    try:
+        if cursor is None:
+            get_redis().delete(key)
+        else:
+            get_redis().set(key, json.dumps(cursor), ex=CURSOR_TTL)
+    except Exception as e:
+        logger.warning(f"Failed to save reparse position: {e}")
+
+
+@celery_app.task(bind=True)
+def reparse_agent_task(
+    self,
+    agent_id: str,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    batch_size: int = 100,
+    restart: bool = False
+):
+    """
+    Разобрать архивные страницы агента за период [since, until) (ISO 8601,
+    время без смещения - UTC).
+
+    restart=True начинает обработку заново, игнорируя сохраненную позицию.
+    """
+    archive = get_raw_archive()
+    if archive is None:
+        return {"status": "skipped", "reason": "raw_archive_disabled"}
+
+    db = SessionLocal()
+    try:
+        agent = db.query(SourceAgent).filter(SourceAgent.id == agent_id).first()
+        if not agent:
+            raise ValueError(f"Agent {agent_id} not found")
+
+        agent_class = agent_registry.get(agent.type)
+        config = dict(agent.config)
+        agent_instance = agent_class(config, {}, RuntimeContext(agent.id, config, {}))
+
+        cursor_key = _cursor_key(agent_id, since, until)
+        cursor = None if restart else _load_cursor(cursor_key)
+        if cursor:
+            logger.info(f"Resuming reparse of {agent_id} after {cursor['fetched_at']}")
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            stats = loop.run_until_complete(_reparse(
+                db, agent_instance, archive, since, until, batch_size, cursor, cursor_key, self
+            ))
+        finally:
+            loop.close()
+
+        _save_cursor(cursor_key, None)
+        return {"status": "completed", "agent_id": agent_id, **stats}
+
+    finally:
+        db.close()
+
+
+async def _reparse(
+    db,
+    agent,
+    archive,
+    since: Optional[str],
+    until: Optional[str],
+    batch_size: int,
+    cursor: Optional[Dict[str, str]],
+    cursor_key: str,
+    task=None
+) -> Dict[str, Any]:
+    """Обработать страницы агента пачками и вернуть статистику."""
+    from sqlalchemy import and_, or_
+
+    agent_id = agent.ctx.agent_id
+    executor = get_parse_executor()
+    slots = asyncio.Semaphore(executor.max_pending)
+    loop = asyncio.get_running_loop()
+
+    query = db.query(RawItem).filter(RawItem.source_id == agent_id)
+    if since:
+        query = query.filter(RawItem.fetched_at >= _parse_time(since))
+    if until:
+        query = query.filter(RawItem.fetched_at < _parse_time(until))
+
+    stats = {'pages': 0, 'missing': 0, 'drafts': 0, 'events_created': 0}
+    started = time.perf_counter()
+
+    async def parse(raw: RawItem) -> List:
+        async with slots:
+            body = await loop.run_in_executor(None, archive.load, raw.content_ref)
+            if body is None:
+                stats['missing'] += 1
+                return []
+
+            fetched = Fetched(url=raw.url, status=200, body=body, headers={}, fetched_at=raw.fetched_at)
+            try:
+                return await executor.parse(agent, fetched)
+            except Exception as e:
+                logger.error(f"Error reparsing {raw.url}: {e}")
+                return []
+
+    while True:
+        batch_query = query
+        if cursor:
+            position = _parse_time(cursor['fetched_at'])
+            batch_query = batch_query.filter(or_(
+                RawItem.fetched_at > position,
+                and_(RawItem.fetched_at == position, RawItem.id > uuid.UUID(cursor['id']))
+            ))
+        batch = batch_query.order_by(RawItem.fetched_at, RawItem.id).limit(batch_size).all()
+        if not batch:
+            break
+
+        # Страницы пачки разбираются параллельно, события создаются по порядку загрузки
+        results = await asyncio.gather(*(parse(raw) for raw in batch))
+        for raw, drafts in zip(batch, results):
+            stats['pages'] += 1
+            stats['drafts'] += len(drafts)
+            for draft in drafts:
+                event = await event_service.process_event(
+                    db, draft, agent_id, observed_at=raw.fetched_at, backfill=True
+                )
+                if event:
+                    stats['events_created'] += 1
+
+        last = batch[-1]
+        cursor = {'fetched_at': last.fetched_at.isoformat(), 'id': str(last.id)}
+        _save_cursor(cursor_key, cursor)
+
+        elapsed = time.perf_counter() - started
+        stats['pages_per_sec'] = round(stats['pages'] / elapsed, 2) if elapsed else 0.0
+        stats['drafts_per_sec'] = round(stats['drafts'] / elapsed, 2) if elapsed else 0.0
+        logger.info(
+            f"Reparse {agent_id}: {stats['pages']} pages, {stats['drafts']} drafts, "
+            f"{stats['events_created']} events, {stats['pages_per_sec']} pages/s"
+        )
+        if task is not None:
+            task.update_state(state='PROGRESS', meta={'agent_id': agent_id, 'position': cursor, **stats})
+
+    stats['seconds'] = round(time.perf_counter() - started, 2)
+    return stats
@@ -0,0 +1,259 @@
+"""
+Страницы магазинов для бенчмарков и нагрузочных тестов.
+
+Для каждого встроенного агента берутся записанные страницы из
+benchmarks/pages/<КлассАгента>/*.html, а если их нет - детерминированно
+генерируются страницы в разметке агента: карточки строятся по селекторам его
+спецификации извлечения, тексты бейджей и наличия - из его таблиц ключевых
+слов, вокруг карточек - шапка, меню, подвал и скрипты, как на настоящей
+странице каталога.
+
+Записанные страницы можно получить из кассеты HTTP кэша (HTTP_CACHE_MODE=record):
+    python -m benchmarks.fixtures record HobbyGamesCatalogNewAgent data/http_cache/hobbygames.json
+"""
+
+import argparse
+import json
+import random
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Type
+
+from app.agents.base import BaseAgent, Fetched, RuntimeContext
+from app.agents.extraction import compile_simple_selector
+from app.agents.registry import agent_registry
+
+FIXTURES_DIR = Path(__file__).parent / 'pages'
+
+# Разметка агентов с собственным parse() (без спецификации извлечения)
+CUSTOM_MARKUP: Dict[str, Dict[str, Any]] = {
+    'LavkaIgrProjectsAgent': {
+        'item': '.project-card',
+        'base_url': 'https://www.lavkaigr.ru',
+        'fields': {
+            'title': '.project-title',
+            'price': '.project-price',
+            'url': 'a',
+            'badge': '.badge',
+            'availability': '.stock-status',
+            'status': '.project-status',
+        },
+        'kind_keywords': {'preorder': ['предзаказ'], 'release': ['новинка'], 'discount': ['скидка 15%']},
+        'status_words': ['сбор средств', 'в продаже', 'доставка'],
+    },
+    'NastolPublicationsAgent': {
+        'item': '.post-card',
+        'base_url': 'https://nastol.io',
+        'fields': {
+            'title': '.post-card__title',
+            'url': 'a',
+            'date': 'time',
+            'category': '.category',
+            'excerpt': '.post-card__excerpt',
+        },
+        'kind_keywords': {'preorder': ['предзаказ'], 'release': ['в продаже'], 'discount': ['скидка 20%']},
+    },
+    # Одна статья: товары упоминаются в тексте, а не в карточках
+    'NastolSpecificArticleAgent': {
+        'article': '.article-content',
+        'kind_keywords': {'preorder': ['открыт предзаказ'], 'release': ['уже в продаже'], 'discount': ['скидка']},
+    },
+}
+
+GAME_WORDS = [
+    'Каркассон', 'Колонизаторы', 'Громкое дело', 'Ужас Аркхэма', 'Манчкин', 'Эволюция',
+    'Кодовые имена', 'Диксит', 'Брасс', 'Крылья', 'Серп', 'Покорение Марса', 'Root', 'Каскадия',
+]
+_EDITIONS = ['', '', '', 'Делюкс издание', 'Коллекционное издание', 'Дополнение']
+
+
+def builtin_agents() -> Dict[str, Type[BaseAgent]]:
+    """Встроенные агенты магазинов: имя класса -> класс."""
+    return {
+        name: agent_class
+        for name, agent_class in sorted(agent_registry.list_agents().items())
+        if agent_class.__module__.startswith('app.agents.builtin.') and name == agent_class.__name__
+    }
+
+
+def markup_spec(agent_class: Type[BaseAgent]) -> Optional[Dict[str, Any]]:
+    """Селекторы и словари, по которым генерируется разметка агента."""
+    if agent_class.__name__ in CUSTOM_MARKUP:
+        return CUSTOM_MARKUP[agent_class.__name__]
+
+    agent = agent_class({}, {}, RuntimeContext('fixtures', {}, {}))
+    return agent.extraction_spec()
+
+
+def _element(selector: str, content: str, href: Optional[str] = None) -> str:
+    """HTML элемент, подходящий под первый вариант простого селектора."""
+    compiled = compile_simple_selector(selector.split(',')[0].strip())
+    if not compiled:
+        raise ValueError(f"Cannot generate markup for selector {selector!r}")
+
+    simple = compiled[0]
+    tag = simple.tag or ('a' if href is not None else 'div')
+    attrs = []
+    if simple.classes:
+        attrs.append(f'class="{" ".join(sorted(simple.classes))}"')
+    for name, value in simple.attrs:
+        attrs.append(f'{name}="{value or "2026-01-01"}"')
+    if href is not None:
+        attrs.append(f'href="{href}"')
+    return f"<{tag} {' '.join(attrs)}>{content}</{tag}>"
+
+
+def _card(spec: Dict[str, Any], rng: random.Random, index: int) -> str:
+    fields = spec['fields']
+    words = [word for table in (spec.get('kind_keywords') or {}).values() for word in table]
+    out_of_stock = spec.get('out_of_stock_keywords') or spec.get('card_out_of_stock_keywords') or ['нет в наличии']
+
+    title = f"{rng.choice(GAME_WORDS)} {index}"
+    edition = rng.choice(_EDITIONS)
+    price = rng.randrange(490, 12990, 10)
+    old_price = price + rng.choice([0, 0, 300, 1500])
+    badge = rng.choice(words + ['', '', 'хит']) if words else ''
+    if badge and rng.random() < 0.3:
+        badge = f"{badge} -{rng.choice([10, 15, 25])}%"
+    stock = rng.choice(['В наличии', 'В наличии', rng.choice(out_of_stock)])
+    href = f"/catalog/game-{index}"
+
+    # Ссылка оборачивает заголовок, как на большинстве витрин
+    parts = []
+    title_html = _element(fields['title'], f"{title} {edition}".strip())
+    if fields.get('url'):
+        parts.append(_element(fields['url'], title_html, href=href))
+    else:
+        parts.append(title_html)
+    if fields.get('price'):
+        price_text = f"{old_price:,} ₽ {price:,} ₽" if spec.get('price_pick') == 'last' and old_price != price \
+            else f"{price:,} ₽"
+        parts.append(_element(fields['price'], price_text.replace(',', ' ')))
+    if fields.get('old_price') and old_price != price:
+        parts.append(_element(fields['old_price'], f"{old_price:,} ₽".replace(',', ' ')))
+    if fields.get('badge') and badge:
+        parts.append(_element(fields['badge'], badge.capitalize()))
+    if fields.get('availability'):
+        parts.append(_element(fields['availability'], stock))
+    if fields.get('edition') and edition:
+        parts.append(_element(fields['edition'], edition))
+    if fields.get('status'):
+        parts.append(_element(fields['status'], rng.choice(spec['status_words']).capitalize()))
+    if fields.get('date'):
+        parts.append(_element(fields['date'], f"{rng.randint(1, 28)}.0{rng.randint(1, 9)}.2026"))
+    if fields.get('category'):
+        parts.append(_element(fields['category'], rng.choice(['Новости', 'Анонсы', 'Обзоры'])))
+    if fields.get('excerpt'):
+        parts.append(_element(fields['excerpt'], f"{badge} {title}: {price} ₽. " * 3))
+
+    # Типичный «шум» карточки: картинка, рейтинг, кнопка
+    parts.append(f'<img src="/images/{index}.webp" alt="{title}" loading="lazy">')
+    parts.append(f'<div class="rating" data-value="{rng.randint(1, 5)}"><span></span><span></span></div>')
+    parts.append('<button class="btn btn-cart" type="button">В корзину</button>')
+    return _element(spec['item'], ''.join(parts))
+
+
+def _paragraph(spec: Dict[str, Any], rng: random.Random, index: int) -> str:
+    word = rng.choice([word for table in spec['kind_keywords'].values() for word in table])
+    title = f"{rng.choice(GAME_WORDS)} {index}"
+    return f"<p>Для игры «{title}» {word} по цене {rng.randrange(490, 12990, 10)} рублей. Подробности ниже.</p>"
+
+
+def render_page(
+    agent_class: Type[BaseAgent],
+    page: int = 1,
+    items: int = 48,
+    seed: int = 0,
+    titles: Optional[List[int]] = None
+) -> str:
+    """
+    Сгенерировать страницу каталога в разметке агента.
+
+    titles задает номера товаров карточек (для имитации изменений каталога);
+    по умолчанию это items товаров страницы page.
+    """
+    spec = markup_spec(agent_class)
+    if spec is None:
+        raise ValueError(f"{agent_class.__name__} has no markup spec")
+
+    rng = random.Random(f"{agent_class.__name__}:{seed}:{page}")
+    numbers = titles if titles is not None else range((page - 1) * items, page * items)
+    if spec.get('article'):
+        cards = _element(spec['article'], ''.join(
+            _paragraph(spec, random.Random(f"{agent_class.__name__}:{seed}:{n}"), n) for n in numbers
+        ))
+    else:
+        cards = ''.join(_card(spec, random.Random(f"{agent_class.__name__}:{seed}:{n}"), n) for n in numbers)
+
+    nav = ''.join(f'<li><a href="/catalog/category-{i}">Категория {i}</a></li>' for i in range(60))
+    script = json.dumps({'analytics': {'page': page, 'ids': [rng.randint(0, 10 ** 6) for _ in range(200)]}})
+    return (
+        '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8">'
+        f'<title>Каталог — страница {page}</title>'
+        '<link rel="stylesheet" href="/css/app.css"><script src="/js/app.js" defer></script>'
+        '</head><body>'
+        f'<header class="header"><nav class="menu"><ul>{nav}</ul></nav></header>'
+        f'<main class="catalog"><h1>Настольные игры</h1><div class="catalog-grid">{cards}</div>'
+        f'<div class="pagination"><a href="?page={page + 1}">Дальше</a></div></main>'
+        '<footer class="footer"><p>© Магазин настольных игр</p></footer>'
+        f'<script>window.dataLayer = {script};</script>'
+        '</body></html>'
+    )
+
+
+def load_fixtures(agent_class: Type[BaseAgent], pages: int = 4, items: int = 48) -> List[Fetched]:
+    """Записанные страницы агента или, если их нет, сгенерированные."""
+    recorded = sorted((FIXTURES_DIR / agent_class.__name__).glob('*.html'))
+    bodies = [path.read_text(encoding='utf-8') for path in recorded[:pages]] if recorded else [
+        render_page(agent_class, page, items) for page in range(1, pages + 1)
+    ]
+    return [
+        Fetched(
+            url=f"https://fixtures.local/{agent_class.__name__}/{index}",
+            status=200,
+            body=body,
+            headers={},
+            fetched_at=datetime.now()
+        )
+        for index, body in enumerate(bodies, 1)
+    ]
+
+
+def record_from_cassette(agent_name: str, cassette: str) -> int:
+    """Сохранить HTML ответы кассеты HTTP кэша как записанные страницы агента."""
+    target = FIXTURES_DIR / agent_name
+    target.mkdir(parents=True, exist_ok=True)
+
+    count = 0
+    for interaction in json.loads(Path(cassette).read_text(encoding='utf-8'))['interactions']:
+        response = interaction['response']
+        body = response['body'].get('string') or ''
+        if response['status']['code'] != 200 or '<html' not in body[:1000].lower():
+            continue
+        count += 1
+        (target / f"{count:03d}.html").write_text(body, encoding='utf-8')
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fixture pages for benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help="Сохранить страницы из кассеты HTTP кэша")
+    record.add_argument('agent', help="Имя класса агента")
+    record.add_argument('cassette', help="Файл кассеты (HTTP_CACHE_DIR/<agent_id>.json)")
+
+    generate = commands.add_parser('generate', help="Сгенерировать страницу в разметке агента")
+    generate.add_argument('agent', help="Имя класса агента")
+    generate.add_argument('--page', type=int, default=1)
+    generate.add_argument('--items', type=int, default=48)
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        print(f"Saved {record_from_cassette(args.agent, args.cassette)} pages")
+    else:
+        print(render_page(agent_registry.get(args.agent), args.page, args.items))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,368 @@
+"""
+Сквозной нагрузочный тест обход -> события -> уведомления.
+
+Запускает синтетический магазин (benchmarks/store_server.py) в отдельном
+процессе, создает для встроенных агентов записи source_agent, указывающие на
+него, и правила уведомлений с каналом Telegram (Bot API - тот же сервер), после
+чего несколько раз выполняет run_agent_task каждого агента. Уведомления из
+outbox доставляют потоки, работающие как воркер очереди notifications. Отчет:
+
+- events/s - созданные события в секунду работы run_agent_task;
+- DB writes/s - INSERT/UPDATE/DELETE в секунду (по событиям движка SQLAlchemy);
+- задержка уведомления - от первой отдачи страницы с товаром до получения
+  сообщения о нем заглушкой Telegram (p50/p95/max);
+- пик RSS процесса.
+
+Нужны PostgreSQL (DATABASE_URL) и Redis, как у воркера. Тест пишет события,
+игры и историю цен синтетических товаров: запускайте его на отдельной базе.
+Созданные им агенты, правила, события и уведомления удаляются в конце (--keep
+оставляет их).
+
+Запуск из каталога backend:
+    python -m benchmarks.ingest
+    python -m benchmarks.ingest --agents GagaAgent ZvezdaAgent --catalog 2000 --churn 0.05 --runs 5
+    python -m benchmarks.ingest --latency 200 --jitter 100 --error-rate 0.02 --output /tmp/ingest.json
+    python -m benchmarks.ingest --digest hourly
+
+С --digest широкое правило работает в режиме сводки: после обходов буфер
+собирается так, будто период закрылся, и сводки доставляются вместе с
+остальными уведомлениями.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from sqlalchemy import event as sa_event, func
+
+from app.core.config import settings
+from app.core.database import SessionLocal, engine
+from app.models.agent import SourceAgent
+from app.models.alert_rule import AlertRule
+from app.models.crawl_state import CrawlState
+from app.models.digest_entry import DigestEntry
+from app.models.listing_event import ListingEvent
+from app.models.notification import Notification
+from app.models.raw_item import RawItem
+from app.services.digest_service import digest_service
+from app.services.notification_delivery import notification_delivery
+from app.tasks.agents import run_agent_task
+
+from .fixtures import GAME_WORDS, builtin_agents
+
+AGENT_PREFIX = 'bench-'
+RULE_PREFIX = 'bench: '
+
+_WRITE_VERBS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class WriteCounter:
+    """Счетчик выполненных движком SQL запросов и изменяющих строк запросов."""
+
+    def __init__(self):
+        self.statements = 0
+        self.writes = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+        if statement.lstrip()[:6].upper() in _WRITE_VERBS:
+            self.writes += len(parameters) if executemany else 1
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, port: int) -> subprocess.Popen:
+    """Запустить синтетический магазин и дождаться готовности."""
+    process = subprocess.Popen([
+        sys.executable, '-m', 'benchmarks.store_server',
+        '--port', str(port),
+        '--catalog', str(args.catalog),
+        '--items', str(args.items),
+        '--churn', str(args.churn),
+        '--latency', str(args.latency),
+        '--jitter', str(args.jitter),
+        '--error-rate', str(args.error_rate),
+        '--seed', str(args.seed),
+        '--telegram-rate', str(args.telegram_rate),
+    ])
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Store server exited with code {process.returncode}")
+        try:
+            server_stats(port)
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Store server did not start in 30 seconds")
+
+
+def server_stats(port: int) -> Dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stats", timeout=5) as response:
+        return json.loads(response.read())
+
+
+def create_fixtures(db, agents: List[str], port: int, args) -> List[str]:
+    """Агенты и правила уведомлений теста; возвращает id агентов."""
+    base = f"http://127.0.0.1:{port}"
+    pages = (args.catalog + args.items - 1) // args.items
+    agent_ids = []
+    for name in agents:
+        agent_id = f"{AGENT_PREFIX}{name.lower()}"
+        config = {
+            'start_urls': [f"{base}/{name}/catalog?page=1"],
+            'pagination': {
+                'template': f"{base}/{name}/catalog?page={{page}}",
+                'max_pages': pages,
+                'concurrency': args.concurrency,
+            },
+            'parser': args.parser,
+        }
+        db.merge(SourceAgent(
+            id=agent_id, name=f"Benchmark {name}", type=name,
+            schedule={}, rate_limit={}, config=config, enabled=True
+        ))
+        agent_ids.append(agent_id)
+
+    # Одно широкое правило без перезарядки и список наблюдения по названиям
+    rng = random.Random(args.seed)
+    rules = [AlertRule(
+        name=f"{RULE_PREFIX}discounts",
+        logic='AND',
+        conditions=[{'field': 'kind', 'op': 'in', 'value': ['discount']}],
+        channels=['telegram'],
+        cooldown_hours='0',
+        digest=args.digest
+    )]
+    for index in range(1, args.rules):
+        rules.append(AlertRule(
+            name=f"{RULE_PREFIX}watch {index}",
+            logic='AND',
+            conditions=[
+                {'field': 'title', 'op': 'contains_any', 'value': rng.sample(GAME_WORDS, 2)},
+                {'field': 'price', 'op': '<=', 'value': rng.randrange(1000, 8000, 500)},
+            ],
+            channels=['telegram'],
+            cooldown_hours='12'
+        ))
+    db.add_all(rules)
+    db.commit()
+    return agent_ids
+
+
+def cleanup(db, agent_ids: List[str]):
+    """Удалить данные, созданные тестом."""
+    rule_ids = [rule.id for rule in db.query(AlertRule.id).filter(AlertRule.name.like(f"{RULE_PREFIX}%"))]
+    event_ids = db.query(ListingEvent.id).filter(ListingEvent.source_id.in_(agent_ids))
+
+    db.query(Notification).filter(
+        Notification.rule_id.in_(rule_ids) | Notification.event_id.in_(event_ids)
+    ).delete(synchronize_session=False)
+    db.query(DigestEntry).filter(
+        DigestEntry.rule_id.in_(rule_ids) | DigestEntry.event_id.in_(event_ids)
+    ).delete(synchronize_session=False)
+    db.query(ListingEvent).filter(ListingEvent.source_id.in_(agent_ids)).delete(synchronize_session=False)
+    db.query(AlertRule).filter(AlertRule.id.in_(rule_ids)).delete(synchronize_session=False)
+    for model in (CrawlState, RawItem):
+        db.query(model).filter(model.source_id.in_(agent_ids)).delete(synchronize_session=False)
+    db.query(SourceAgent).filter(SourceAgent.id.in_(agent_ids)).delete(synchronize_session=False)
+    db.commit()
+
+
+class DeliveryWorker(threading.Thread):
+    """Поток, доставляющий уведомления из outbox, пока идет тест."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.stopping = threading.Event()
+
+    def run(self):
+        db = SessionLocal()
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                stats = loop.run_until_complete(notification_delivery.run(db, max_seconds=1.0))
+                if not any(stats.values()):
+                    if self.stopping.is_set():
+                        break
+                    time.sleep(0.1)
+        finally:
+            loop.close()
+            db.close()
+
+    def stop(self, timeout: float):
+        """Дождаться доставки оставшихся уведомлений."""
+        self.stopping.set()
+        self.join(timeout)
+
+
+def notification_statuses(db, agent_ids: List[str]) -> Dict[str, int]:
+    """Число уведомлений теста по статусам."""
+    event_ids = db.query(ListingEvent.id).filter(ListingEvent.source_id.in_(agent_ids))
+    return {
+        status: count
+        for status, count in db.query(Notification.status, func.count(Notification.id))
+        .filter(Notification.event_id.in_(event_ids))
+        .group_by(Notification.status)
+    }
+
+
+def run(agent_ids: List[str], runs: int, counter: WriteCounter) -> Dict:
+    """Выполнить run_agent_task агентов runs раз и собрать статистику."""
+    totals = {'runs': 0, 'failed': 0, 'pages': 0, 'events_found': 0, 'events': 0}
+    per_agent: Dict[str, Dict[str, float]] = {}
+    elapsed = 0.0
+
+    for _ in range(runs):
+        for agent_id in agent_ids:
+            started = time.perf_counter()
+            result = run_agent_task.apply(args=(agent_id,)).get()
+            seconds = time.perf_counter() - started
+            elapsed += seconds
+
+            totals['runs'] += 1
+            if result.get('status') != 'completed':
+                totals['failed'] += 1
+                print(f"{agent_id}: {result}", file=sys.stderr)
+                continue
+
+            totals['pages'] += result['pages_fetched']
+            totals['events_found'] += result['events_found']
+            totals['events'] += result['events_processed']
+            agent = per_agent.setdefault(agent_id, {'seconds': 0.0, 'events': 0})
+            agent['seconds'] += seconds
+            agent['events'] += result['events_processed']
+
+    return {
+        **totals,
+        'seconds': round(elapsed, 2),
+        'events_per_sec': round(totals['events'] / elapsed, 2) if elapsed else 0.0,
+        'pages_per_sec': round(totals['pages'] / elapsed, 2) if elapsed else 0.0,
+        'db_statements': counter.statements,
+        'db_writes': counter.writes,
+        'db_writes_per_sec': round(counter.writes / elapsed, 2) if elapsed else 0.0,
+        'agents': {
+            agent_id: round(agent['events'] / agent['seconds'], 2) if agent['seconds'] else 0.0
+            for agent_id, agent in per_agent.items()
+        },
+    }
+
+
+def print_report(results: Dict):
+    latency = results['server']['notification_latency_ms']
+    print(f"runs:            {results['runs']} ({results['failed']} failed) in {results['seconds']} s")
+    print(f"pages:           {results['pages']} ({results['pages_per_sec']} pages/s)")
+    print(f"events:          {results['events']} of {results['events_found']} found "
+          f"({results['events_per_sec']} events/s)")
+    print(f"DB writes:       {results['db_writes']} of {results['db_statements']} statements "
+          f"({results['db_writes_per_sec']} writes/s)")
+    print(f"notifications:   {latency['count']} (latency p50 {latency['p50']} ms, "
+          f"p95 {latency['p95']} ms, max {latency['max']} ms)")
+    print(f"outbox:          {', '.join(f'{status} {count}' for status, count in sorted(results['outbox'].items()))}")
+    if results['digests']['entries']:
+        print(f"digests:         {results['digests']['entries']} matches in {results['digests']['digests']} digests")
+    print(f"peak RSS:        {results['peak_rss_mb']} MB")
+    print(f"store requests:  {results['server']['requests']} ({results['server']['errors']} errors)")
+    print(f"telegram:        {results['server']['messages']} messages "
+          f"({results['server']['rate_limited']} rate limited)")
+    for agent_id, rate in results['agents'].items():
+        print(f"  {agent_id:<40} {rate:>10.1f} events/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end ingest load test")
+    parser.add_argument('--agents', nargs='+', help="Имена классов агентов (по умолчанию все встроенные HTML)")
+    parser.add_argument('--runs', type=int, default=3, help="Запусков каждого агента")
+    parser.add_argument('--catalog', type=int, default=480, help="Товаров в каталоге агента")
+    parser.add_argument('--items', type=int, default=48, help="Товаров на странице")
+    parser.add_argument('--churn', type=float, default=0.1, help="Доля товаров, заменяемых за обход")
+    parser.add_argument('--latency', type=float, default=0.0, help="Задержка ответа магазина, мс")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Разброс задержки, мс")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Доля ответов 503")
+    parser.add_argument('--concurrency', type=int, default=2, help="Страниц каталога загружается параллельно")
+    parser.add_argument('--parser', default=None, help="Бэкенд разбора HTML агентов")
+    parser.add_argument('--rules', type=int, default=20, help="Правил уведомлений")
+    parser.add_argument('--digest', choices=['immediate', 'hourly', 'daily'], default='immediate',
+                        help="Режим доставки широкого правила")
+    parser.add_argument('--seed', type=int, default=0, help="0 - новые товары при каждом запуске")
+    parser.add_argument('--telegram-rate', type=float, default=0.0,
+                        help="Ограничение заглушки Telegram, сообщений в секунду на чат (0 - без ограничения)")
+    parser.add_argument('--delivery-workers', type=int, default=1, help="Потоков доставки уведомлений")
+    parser.add_argument('--drain-timeout', type=float, default=60.0,
+                        help="Сколько ждать доставки оставшихся уведомлений после обхода, с")
+    parser.add_argument('--output', help="Сохранить результаты в JSON")
+    parser.add_argument('--keep', action='store_true', help="Не удалять созданные данные")
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    agents = builtin_agents()
+    names = args.agents or [name for name, agent_class in agents.items() if agent_class.TYPE == 'html']
+
+    port = _free_port()
+    server = start_server(args, port)
+
+    # Уведомления уходят в заглушку Telegram Bot API синтетического магазина
+    settings.TELEGRAM_API_URL = f"http://127.0.0.1:{port}"
+    settings.TELEGRAM_BOT_TOKEN = 'benchmark'
+    settings.TELEGRAM_CHAT_ID = '1'
+    # Доставку выполняют потоки теста, а не задачи Celery
+    settings.NOTIFICATION_DELIVERY_KICK = False
+
+    db = SessionLocal()
+    counter = WriteCounter()
+    agent_ids = []
+    try:
+        agent_ids = create_fixtures(db, names, port, args)
+        workers = [DeliveryWorker() for _ in range(args.delivery_workers)]
+        for worker in workers:
+            worker.start()
+        sa_event.listen(engine, 'before_cursor_execute', counter)
+        try:
+            results = run(agent_ids, args.runs, counter)
+        finally:
+            sa_event.remove(engine, 'before_cursor_execute', counter)
+            # Сводки собираются так, будто период уже закрылся
+            digests = digest_service.flush(db, now=datetime.now(timezone.utc) + timedelta(days=1))
+            for worker in workers:
+                worker.stop(args.drain_timeout)
+
+        results['digests'] = digests
+
+        results['outbox'] = notification_statuses(db, agent_ids)
+        results['server'] = server_stats(port)
+        results['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        results['params'] = {key: value for key, value in vars(args).items() if key not in ('output', 'keep')}
+        print_report(results)
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+    finally:
+        if agent_ids and not args.keep:
+            db.rollback()
+            cleanup(db, agent_ids)
+        db.close()
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Сравнение бэкендов разбора HTML на сохраненных страницах.
+
+Запуск из каталога backend:
+    python -m benchmarks.parse_backends HobbyGamesCatalogNewAgent pages/*.html
+    python -m benchmarks.parse_backends GagaAgent pages/gaga-*.html --backends html.parser lxml --repeat 50
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Type
+
+from app.agents.base import BaseAgent, Fetched, RuntimeContext
+from app.agents.parsing import PARSER_BACKENDS
+from app.agents.registry import agent_registry
+
+
+def load_pages(paths: List[str]) -> List[Fetched]:
+    """Загрузить сохраненные страницы как Fetched."""
+    return [
+        Fetched(
+            url=f"file://{Path(path).resolve()}",
+            status=200,
+            body=Path(path).read_text(encoding='utf-8'),
+            headers={},
+            fetched_at=datetime.now()
+        )
+        for path in paths
+    ]
+
+
+async def measure(agent_class: Type[BaseAgent], backend: str, pages: List[Fetched], repeat: int) -> Dict[str, float]:
+    """Прогнать parse() агента по страницам repeat раз с указанным бэкендом."""
+    config = {'parser': backend}
+    agent = agent_class(config, {}, RuntimeContext('benchmark', config, {}))
+    if agent.parser.name != backend:
+        raise RuntimeError(f"Backend {backend} is not available")
+
+    items = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for fetched in pages:
+            async for _draft in agent.parse(fetched):
+                items += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        'seconds': elapsed,
+        'pages_per_sec': len(pages) * repeat / elapsed,
+        'items_per_sec': items / elapsed,
+        'items_per_page': items / (len(pages) * repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parser backend benchmark")
+    parser.add_argument('agent', help="Имя класса агента из реестра")
+    parser.add_argument('pages', nargs='+', help="Сохраненные HTML страницы")
+    parser.add_argument('--backends', nargs='+', default=list(PARSER_BACKENDS))
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    agent_class = agent_registry.get(args.agent)
+    pages = load_pages(args.pages)
+
+    results = {}
+    for backend in args.backends:
+        try:
+            results[backend] = asyncio.run(measure(agent_class, backend, pages, args.repeat))
+        except (ImportError, RuntimeError) as e:
+            print(f"{backend:<12} skipped: {e}")
+
+    baseline = results.get('html.parser')
+    print(f"{'backend':<12} {'pages/s':>10} {'items/s':>10} {'items/page':>11} {'speedup':>8}")
+    for backend, result in results.items():
+        speedup = result['pages_per_sec'] / baseline['pages_per_sec'] if baseline else 1.0
+        print(
+            f"{backend:<12} {result['pages_per_sec']:>10.1f} {result['items_per_sec']:>10.1f} "
+            f"{result['items_per_page']:>11.1f} {speedup:>7.2f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
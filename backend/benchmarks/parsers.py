@@ -0,0 +1,158 @@
+"""
+Бенчмарк parse() встроенных агентов на страницах магазинов.
+
+Каждый агент разбирает свои страницы (см. benchmarks/fixtures.py) с каждым
+бэкендом разбора HTML. Для пары (агент, бэкенд) измеряются страницы и товары
+в секунду (лучший из rounds проходов) и пик памяти Python объектов на страницу
+(tracemalloc, отдельный проход; память внутри lxml и selectolax он не видит).
+
+Запуск из каталога backend:
+    python -m benchmarks.parsers
+    python -m benchmarks.parsers --agents GagaAgent ZvezdaAgent --backends lxml selectolax
+    python -m benchmarks.parsers --save-baseline benchmarks/baseline.json
+    python -m benchmarks.parsers --baseline benchmarks/baseline.json --threshold 0.2
+
+С --baseline бенчмарк завершается с кодом 1, если скорость разбора какой-либо
+пары упала больше чем на threshold относительно базовой. Базовые значения
+зависят от машины: сохраняйте их на той же машине, где проверяете.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional, Type
+
+from app.agents.base import BaseAgent, Fetched, RuntimeContext
+from app.agents.parsing import PARSER_BACKENDS
+
+from .fixtures import builtin_agents, load_fixtures
+
+
+async def _parse_all(agent: BaseAgent, pages: List[Fetched]) -> int:
+    items = 0
+    for fetched in pages:
+        async for _draft in agent.parse(fetched):
+            items += 1
+    return items
+
+
+def measure(agent_class: Type[BaseAgent], backend: str, pages: List[Fetched], rounds: int) -> Dict[str, float]:
+    """Скорость разбора и пик памяти parse() агента на страницах."""
+    config = {'parser': backend}
+    agent = agent_class(config, {}, RuntimeContext('benchmark', config, {}))
+    if agent.parser.name != backend:
+        raise RuntimeError(f"Backend {backend} is not available")
+
+    loop = asyncio.new_event_loop()
+    try:
+        # Прогрев: компиляция селекторов, кэши спецификаций
+        items = loop.run_until_complete(_parse_all(agent, pages))
+
+        best = float('inf')
+        for _ in range(rounds):
+            started = time.perf_counter()
+            loop.run_until_complete(_parse_all(agent, pages))
+            best = min(best, time.perf_counter() - started)
+
+        tracemalloc.start()
+        try:
+            loop.run_until_complete(_parse_all(agent, pages))
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        loop.close()
+
+    return {
+        'pages_per_sec': round(len(pages) / best, 2),
+        'items_per_sec': round(items / best, 2),
+        'items_per_page': round(items / len(pages), 2),
+        'peak_kb_per_page': round(peak / 1024 / len(pages), 1),
+    }
+
+
+def run(agents: Dict[str, Type[BaseAgent]], backends: List[str], pages: int, items: int, rounds: int) -> Dict:
+    """Результаты по агентам: {agent: {backend: метрики}}."""
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for name, agent_class in agents.items():
+        fixtures = load_fixtures(agent_class, pages, items)
+        for backend in backends:
+            try:
+                results.setdefault(name, {})[backend] = measure(agent_class, backend, fixtures, rounds)
+            except (ImportError, RuntimeError) as e:
+                print(f"{name} / {backend}: skipped ({e})", file=sys.stderr)
+    return results
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Пары (агент, бэкенд), скорость которых упала больше чем на threshold."""
+    regressions = []
+    for name, backends in results.items():
+        for backend, result in backends.items():
+            base = baseline.get(name, {}).get(backend)
+            if not base:
+                continue
+            ratio = result['pages_per_sec'] / base['pages_per_sec']
+            if ratio < 1 - threshold:
+                regressions.append(
+                    f"{name} / {backend}: {result['pages_per_sec']:.1f} pages/s vs "
+                    f"{base['pages_per_sec']:.1f} baseline ({(1 - ratio) * 100:.0f}% slower)"
+                )
+    return regressions
+
+
+def print_report(results: Dict, reference: Optional[str] = 'lxml'):
+    print(
+        f"{'agent':<28} {'backend':<12} {'pages/s':>9} {'items/s':>10} {'items/page':>11} "
+        f"{'py KB/page':>13} {'vs ' + reference:>10}"
+    )
+    for name, backends in results.items():
+        base = backends.get(reference)
+        for backend, result in backends.items():
+            speedup = f"{result['pages_per_sec'] / base['pages_per_sec']:.2f}x" if base else '-'
+            print(
+                f"{name:<28} {backend:<12} {result['pages_per_sec']:>9.1f} {result['items_per_sec']:>10.1f} "
+                f"{result['items_per_page']:>11.1f} {result['peak_kb_per_page']:>13.1f} {speedup:>10}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builtin agent parser benchmark")
+    parser.add_argument('--agents', nargs='+', help="Имена классов агентов (по умолчанию все встроенные)")
+    parser.add_argument('--backends', nargs='+', default=list(PARSER_BACKENDS))
+    parser.add_argument('--pages', type=int, default=4, help="Страниц на агента")
+    parser.add_argument('--items', type=int, default=48, help="Товаров на сгенерированной странице")
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--output', help="Сохранить результаты в JSON")
+    parser.add_argument('--save-baseline', help="Сохранить результаты как базовые")
+    parser.add_argument('--baseline', help="Сравнить с базовыми результатами")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Допустимое замедление (доля)")
+    args = parser.parse_args()
+
+    agents = builtin_agents()
+    if args.agents:
+        agents = {name: agents[name] for name in args.agents}
+
+    results = run(agents, args.backends, args.pages, args.items, args.rounds)
+    print_report(results)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(results, indent=2, sort_keys=True), encoding='utf-8')
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text(encoding='utf-8')), args.threshold)
+        if regressions:
+            print(f"\nThroughput regressions (threshold {args.threshold:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo throughput regressions (threshold {args.threshold:.0%})")
+
+
+if __name__ == '__main__':
+    main()
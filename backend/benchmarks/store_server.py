@@ -0,0 +1,209 @@
+"""
+Локальный синтетический магазин для нагрузочных тестов.
+
+aiohttp приложение отдает страницы каталога каждого встроенного агента в его
+разметке (см. benchmarks/fixtures.py):
+
+    GET /<КлассАгента>/catalog?page=N
+
+Каталог агента - catalog товаров по items на странице; страницы за концом
+каталога отвечают 404. Каждый новый обход (запрос первой страницы) сменяет
+поколение каталога: доля churn товаров заменяется новыми. Ответы задерживаются
+на latency мс (± jitter), доля error_rate запросов завершается ошибкой 503.
+
+Сервер также изображает Telegram Bot API (POST /bot<token>/sendMessage) и
+считает задержку уведомления: от первой отдачи страницы с товаром до получения
+сообщения о нем (сводка учитывается для каждого товара в ней). С telegram_rate
+сообщения в чат чаще этой частоты получают 429 с retry_after, как в Telegram.
+Статистика - GET /_stats.
+
+Запуск из каталога backend:
+    python -m benchmarks.store_server --port 8900 --catalog 960 --churn 0.1 --latency 50 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import random
+import re
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from .fixtures import builtin_agents, render_page
+
+# Номер товара в названии сгенерированной карточки («Каркассон 123»)
+_ITEM_NUMBER = re.compile(r'\s(\d+)')
+
+
+class SyntheticCatalog:
+    """Каталог одного агента: номера товаров текущего поколения."""
+
+    def __init__(self, agent_class, size: int, items: int, churn: float, seed: int, base: int):
+        self.agent_class = agent_class
+        self.items = items
+        self.churn = churn
+        self.seed = seed
+        self.numbers = list(range(base, base + size))
+        self.next_number = base + size
+        self.generation = 0
+        self.rng = random.Random(f"{agent_class.__name__}:{seed}")
+        self._pages: Dict[int, str] = {}
+
+    @property
+    def pages(self) -> int:
+        return (len(self.numbers) + self.items - 1) // self.items
+
+    def advance(self):
+        """Следующее поколение: доля churn товаров заменяется новыми."""
+        self.generation += 1
+        self._pages.clear()
+        for index in self.rng.sample(range(len(self.numbers)), int(len(self.numbers) * self.churn)):
+            self.numbers[index] = self.next_number
+            self.next_number += 1
+
+    def page(self, number: int) -> Optional[str]:
+        if not 1 <= number <= self.pages:
+            return None
+        if number not in self._pages:
+            titles = self.numbers[(number - 1) * self.items:number * self.items]
+            self._pages[number] = render_page(self.agent_class, number, self.items, self.seed, titles)
+        return self._pages[number]
+
+    def page_numbers(self, number: int) -> List[int]:
+        return self.numbers[(number - 1) * self.items:number * self.items]
+
+
+class StoreServer:
+    """Синтетические магазины встроенных агентов и заглушка Telegram Bot API."""
+
+    def __init__(
+        self,
+        catalog: int = 480,
+        items: int = 48,
+        churn: float = 0.1,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        telegram_rate: float = 0.0
+    ):
+        self.latency = latency / 1000
+        self.jitter = jitter / 1000
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        # Номера товаров разных запусков не пересекаются: иначе дедупликация
+        # событий отбросит их как уже виденные
+        base = (seed or int(time.time())) % 10 ** 6 * 10 ** 4
+        self.catalogs = {
+            name: SyntheticCatalog(agent_class, catalog, items, churn, seed, base)
+            for name, agent_class in builtin_agents().items()
+        }
+        self.first_served: Dict[int, float] = {}
+        self.latencies: List[float] = []
+        self.telegram_rate = telegram_rate
+        self.last_message: Dict[str, float] = {}
+        self.stats = {'requests': 0, 'errors': 0, 'not_found': 0, 'bytes': 0, 'messages': 0, 'rate_limited': 0}
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/_stats', self.handle_stats)
+        app.router.add_post('/bot{token}/sendMessage', self.handle_send_message)
+        app.router.add_get('/{agent}/catalog', self.handle_catalog)
+        return app
+
+    async def handle_catalog(self, request: web.Request) -> web.Response:
+        self.stats['requests'] += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(self.latency + self.rng.uniform(-self.jitter, self.jitter), 0))
+
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.stats['errors'] += 1
+            return web.Response(status=503, text='Service Unavailable')
+
+        catalog = self.catalogs.get(request.match_info['agent'])
+        if catalog is None:
+            raise web.HTTPNotFound()
+
+        number = int(request.query.get('page', 1))
+        if number == 1:
+            catalog.advance()
+        body = catalog.page(number)
+        if body is None:
+            self.stats['not_found'] += 1
+            raise web.HTTPNotFound()
+
+        now = time.time()
+        for item in catalog.page_numbers(number):
+            self.first_served.setdefault(item, now)
+        self.stats['bytes'] += len(body)
+        return web.Response(text=body, content_type='text/html')
+
+    async def handle_send_message(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        now = time.time()
+
+        if self.telegram_rate:
+            chat_id = str(payload.get('chat_id'))
+            interval = 1 / self.telegram_rate
+            elapsed = now - self.last_message.get(chat_id, 0.0)
+            if elapsed < interval:
+                self.stats['rate_limited'] += 1
+                retry_after = max(int(interval - elapsed + 0.999), 1)
+                return web.json_response({
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f"Too Many Requests: retry after {retry_after}",
+                    'parameters': {'retry_after': retry_after},
+                }, status=429)
+            self.last_message[chat_id] = now
+
+        self.stats['messages'] += 1
+        for number in _ITEM_NUMBER.findall(payload.get('text', '')):
+            served = self.first_served.get(int(number))
+            if served is not None:
+                self.latencies.append(now - served)
+        return web.json_response({'ok': True, 'result': {'message_id': self.stats['messages']}})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 1) if latencies else None
+
+        return web.json_response({
+            **self.stats,
+            'catalogs': {name: catalog.generation for name, catalog in self.catalogs.items() if catalog.generation},
+            'notification_latency_ms': {
+                'count': len(latencies),
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'max': round(latencies[-1] * 1000, 1) if latencies else None,
+            },
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic store server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--catalog', type=int, default=480, help="Товаров в каталоге агента")
+    parser.add_argument('--items', type=int, default=48, help="Товаров на странице")
+    parser.add_argument('--churn', type=float, default=0.1, help="Доля товаров, заменяемых за обход")
+    parser.add_argument('--latency', type=float, default=0.0, help="Задержка ответа, мс")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Разброс задержки, мс")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Доля ответов 503")
+    parser.add_argument('--seed', type=int, default=0, help="0 - новые товары при каждом запуске")
+    parser.add_argument('--telegram-rate', type=float, default=0.0,
+                        help="Сообщений в секунду на чат, чаще - 429 (0 - без ограничения)")
+    args = parser.parse_args()
+
+    server = StoreServer(
+        args.catalog, args.items, args.churn, args.latency, args.jitter, args.error_rate, args.seed,
+        args.telegram_rate
+    )
+    web.run_app(server.app(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Общие фикстуры тестов.
+
+Тесты не требуют PostgreSQL и Redis: сервисы, работающие с базой, проверяются
+на SQLite в памяти (тип UUID PostgreSQL хранится строкой), а Redis указывает на
+закрытый порт, и сервисы используют свои запасные пути без него.
+"""
+import os
+
+os.environ.setdefault('REDIS_URL', 'redis://127.0.0.1:1/0')
+os.environ.setdefault('CELERY_RESULT_BACKEND', 'cache+memory://')
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+
+@compiles(UUID, 'sqlite')
+def _compile_uuid(type_, compiler, **kw):
+    return 'CHAR(32)'
+
+
+@pytest.fixture
+def db():
+    """Сессия SQLite в памяти со всеми таблицами."""
+    from sqlalchemy import String
+    from app.models import Base, SourceAgent, Store
+
+    # id агентов и магазинов - строковые слаги ('hobbygames'), как и внешние ключи на них
+    SourceAgent.__table__.c.id.type = String()
+    Store.__table__.c.id.type = String()
+
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
@@ -0,0 +1,81 @@
+import math
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.agent import SourceAgent
+from app.models.crawl_state import CrawlState
+from app.services.adaptive_schedule_service import AdaptivePolicy, adaptive_schedule_service
+
+# SQLite возвращает время без часового пояса, поэтому и now - без него
+NOW = datetime(2024, 3, 1, 12, 0)
+
+
+def _agent(db, schedule=None, rate_limit=None):
+    agent = SourceAgent(
+        id='store', name='Store', type='html', config={},
+        schedule=schedule or {'cron': '*/15 * * * *', 'adaptive': {'min_interval': 600, 'max_interval': 86400}},
+        rate_limit=rate_limit or {}
+    )
+    db.add(agent)
+    db.commit()
+    return agent
+
+
+def _state(db, url, **fields):
+    db.add(CrawlState(source_id='store', url=url, **fields))
+    db.commit()
+
+
+def test_next_interval_bounds_and_target_probability():
+    policy = AdaptivePolicy(min_interval=600, max_interval=86400, target_change_probability=0.5)
+
+    assert policy.next_interval(0) == 86400
+    assert policy.next_interval(100) == 600
+    # Вероятность изменения к следующему обходу равна целевой: 1 - exp(-λt) = 0.5
+    assert policy.next_interval(0.5) == pytest.approx(math.log(2) / 0.5 * 3600)
+
+
+def test_policy_from_schedule(db):
+    policy = adaptive_schedule_service.get_policy(_agent(db, schedule={'adaptive': {'min_interval': 60, 'unknown': 1}}))
+    assert (policy.min_interval, policy.max_interval) == (60.0, AdaptivePolicy.max_interval)
+
+
+def test_select_due_urls(db):
+    agent = _agent(db)
+    _state(db, 'https://store.test/later', next_fetch_at=NOW + timedelta(hours=1))
+    _state(db, 'https://store.test/due', next_fetch_at=NOW - timedelta(minutes=1))
+    urls = ['https://store.test/new', 'https://store.test/later', 'https://store.test/due']
+
+    assert adaptive_schedule_service.select_due_urls(db, agent, urls, now=NOW) == [
+        'https://store.test/new', 'https://store.test/due'
+    ]
+
+
+def test_select_due_urls_ranks_by_change_probability_within_daily_cap(db):
+    agent = _agent(db, rate_limit={'daily_pages_cap': 2})
+    fetched = NOW - timedelta(hours=2)
+    _state(db, 'https://store.test/calm', next_fetch_at=NOW, last_fetched_at=fetched, change_rate=0.01)
+    _state(db, 'https://store.test/busy', next_fetch_at=NOW, last_fetched_at=fetched, change_rate=2.0)
+    urls = ['https://store.test/calm', 'https://store.test/busy', 'https://store.test/new']
+
+    # Счетчик страниц за день недоступен без Redis и считается нулевым
+    assert adaptive_schedule_service.select_due_urls(db, agent, urls, now=NOW) == [
+        'https://store.test/busy', 'https://store.test/new'
+    ]
+
+
+def test_record_fetch_estimates_change_rate(db):
+    agent = _agent(db)
+    url = 'https://store.test/catalog'
+
+    state = adaptive_schedule_service.record_fetch(db, agent, url, 'hash-1', new_events=3, now=NOW)
+    assert state.next_fetch_at == NOW + timedelta(seconds=600)
+
+    later = NOW + timedelta(hours=1)
+    state = adaptive_schedule_service.record_fetch(db, agent, url, 'hash-1', new_events=0, now=later)
+    assert state.change_ewma == pytest.approx(0.35)
+    assert state.change_rate == pytest.approx(-math.log(1 - 0.35))
+    interval = (state.next_fetch_at - later).total_seconds()
+    assert interval == pytest.approx(math.log(2) / state.change_rate * 3600)
+    assert (state.fetch_count, state.change_count) == (2, 1)
@@ -0,0 +1,111 @@
+from datetime import datetime
+
+import pytest
+
+from app.agents import base
+from app.agents.base import Fetched, HeadlessAgent, HTMLAgent, RuntimeContext
+from app.agents.executor import ParseExecutor
+
+
+def _headless(config):
+    return HeadlessAgent(config, {}, RuntimeContext('headless-test', config, {}, http_cache='off'))
+
+
+def test_render_options_without_extraction_spec():
+    options = _headless({'start_urls': ['https://example.com/']}).render_options()
+    assert options.wait_for is None
+
+
+def test_render_options_wait_for_item_selector():
+    agent = _headless({'start_urls': ['https://example.com/'], 'extract': {'item': '.card', 'fields': {'title': '.t'}}})
+    assert agent.render_options().wait_for == '.card'
+
+
+URL = 'https://store.test/catalog'
+CARDS = '<div class="card"><a class="title" href="/p/1">Каркассон</a><span class="price">1990 ₽</span></div>'
+
+
+class PagesAgent(HTMLAgent):
+    """Агент, «загружающий» заранее заданные ответы."""
+
+    EXTRACTION = {'store_id': 'store', 'item': '.card', 'fields': {'title': '.title', 'price': '.price'}}
+
+    responses = []
+
+    async def fetch(self):
+        for fetched in self.responses:
+            yield fetched
+
+
+class BrokenAgent(PagesAgent):
+    """Агент, разбор страниц которого падает."""
+
+    async def parse(self, fetched):
+        raise ValueError('broken card')
+        yield
+
+
+@pytest.fixture
+def pages_agent(monkeypatch):
+    monkeypatch.setattr(base, 'get_parse_executor', lambda: ParseExecutor(mode='inline'))
+    monkeypatch.setattr(base, 'get_raw_archive', lambda: None)
+
+    def create(responses, validators, agent_class=PagesAgent, **config):
+        config = {'start_urls': [URL], **config}
+        agent = agent_class(config, {}, RuntimeContext('store', config, {}, validators=validators, http_cache='off'))
+        agent.responses = responses
+        return agent
+
+    return create
+
+
+def _response(status, body='', headers=None):
+    return Fetched(url=URL, status=status, body=body, headers=headers or {}, fetched_at=datetime.now())
+
+
+def test_conditional_headers_from_previous_validators(pages_agent):
+    agent = pages_agent([], {URL: {'etag': '"v1"', 'last_modified': 'Mon', 'hash': 'h'}})
+
+    assert agent.conditional_headers(URL) == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon'}
+    assert agent.conditional_headers('https://store.test/other') == {}
+
+
+async def test_not_modified_page_is_not_parsed(pages_agent):
+    agent = pages_agent([_response(304)], {URL: {'etag': '"v1"', 'last_modified': 'Mon', 'hash': 'old-hash'}})
+
+    assert await agent.run() == []
+    [page] = agent.pages
+    assert page.unchanged
+    assert (page.hash, page.etag, page.last_modified) == ('old-hash', '"v1"', 'Mon')
+
+
+async def test_same_body_hash_is_not_parsed(pages_agent):
+    fetched = _response(200, CARDS, {'ETag': '"v2"'})
+    agent = pages_agent([fetched], {URL: {'etag': '"v1"', 'hash': fetched.hash}})
+
+    assert await agent.run() == []
+    assert agent.pages[0].unchanged
+    assert agent.pages[0].etag == '"v2"'
+
+
+async def test_changed_page_is_parsed(pages_agent):
+    agent = pages_agent([_response(200, CARDS)], {URL: {'hash': 'old-hash'}})
+
+    [draft] = await agent.run()
+    assert (draft.title, draft.price) == ('Каркассон', 1990.0)
+    assert not agent.pages[0].unchanged
+
+
+async def test_parse_error_marks_page_failed(pages_agent):
+    agent = pages_agent([_response(200, CARDS)], {}, agent_class=BrokenAgent)
+
+    await agent.run()
+    assert agent.pages[0].failed
+
+
+async def test_conditional_fetch_disabled_parses_same_body(pages_agent):
+    fetched = _response(200, CARDS)
+    agent = pages_agent([fetched], {URL: {'hash': fetched.hash}}, conditional_fetch=False)
+
+    assert len(await agent.run()) == 1
+    assert agent.conditional_headers(URL) == {}
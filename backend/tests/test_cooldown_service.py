@@ -0,0 +1,130 @@
+"""Перезарядка правил без Redis: проверка по таблице notification."""
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.alert_rule import AlertRule
+from app.models.notification import Notification
+from app.services.cooldown_service import CooldownService, cooldown_seconds
+
+
+def _rule(db, cooldown_hours='12'):
+    rule = AlertRule(name='rule', conditions=[], channels=['telegram'], cooldown_hours=cooldown_hours)
+    db.add(rule)
+    db.commit()
+    return rule
+
+
+def _notification(db, rule, status='sent', ago=timedelta(hours=1)):
+    db.add(Notification(
+        rule_id=rule.id, event_id=uuid.uuid4(), status=status, channel='telegram', payload={},
+        sent_at=datetime.now(timezone.utc) - ago if status == 'sent' else None,
+        created_at=datetime.now(timezone.utc) - ago
+    ))
+    db.commit()
+
+
+@pytest.fixture
+def moscow_time(monkeypatch):
+    """Часовой пояс процесса приложения отличается от UTC, как TZ=Europe/Moscow в .env."""
+    monkeypatch.setenv('TZ', 'Europe/Moscow')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+
+    def set(self, key, value, **kwargs):
+        self.client.values[key] = value
+
+    def execute(self):
+        pass
+
+
+class FakeRedis:
+    """Клиент Redis без перезарядок: только то, что нужно прогреву."""
+
+    def __init__(self):
+        self.values = {}
+
+    def exists(self, key):
+        return key in self.values
+
+    def set(self, key, value, **kwargs):
+        self.values[key] = value
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+def test_cooldown_seconds():
+    assert cooldown_seconds('12') == 12 * 3600
+    assert cooldown_seconds('0.5') == 1800
+    assert cooldown_seconds(None) == 0
+    assert cooldown_seconds('-1') == 0
+    assert cooldown_seconds('soon') == 0
+
+
+def test_claim_without_previous_notifications(db):
+    assert CooldownService().claim(db, _rule(db)) is True
+
+
+def test_claim_during_cooldown(db):
+    rule = _rule(db)
+    _notification(db, rule)
+
+    service = CooldownService()
+    assert service.claim(db, rule) is False
+    assert service.active(db, [rule]) == {rule.id}
+
+
+def test_queued_notification_holds_cooldown(db):
+    rule = _rule(db)
+    _notification(db, rule, status='pending', ago=timedelta(minutes=1))
+
+    assert CooldownService().claim(db, rule) is False
+
+
+def test_claim_after_cooldown_or_failed_delivery(db):
+    expired = _rule(db, cooldown_hours='2')
+    _notification(db, expired, ago=timedelta(hours=3))
+    dead = _rule(db)
+    _notification(db, dead, status='dead')
+
+    service = CooldownService()
+    assert service.claim(db, expired) is True
+    assert service.claim(db, dead) is True
+    assert service.active(db, [expired, dead]) == set()
+
+
+def test_rule_without_cooldown_is_always_claimed(db):
+    rule = _rule(db, cooldown_hours='0')
+    _notification(db, rule, ago=timedelta(seconds=1))
+
+    assert CooldownService().claim(db, rule) is True
+    assert CooldownService().active(db, [rule]) == set()
+
+
+def test_short_cooldown_with_local_time_zone(db, moscow_time):
+    rule = _rule(db, cooldown_hours='2')
+    _notification(db, rule, ago=timedelta(hours=1))
+
+    service = CooldownService()
+    assert service.claim(db, rule) is False
+    assert service.active(db, [rule]) == {rule.id}
+
+
+def test_warm_up_loads_short_cooldown_with_local_time_zone(db, moscow_time):
+    rule = _rule(db, cooldown_hours='2')
+    _notification(db, rule, ago=timedelta(hours=1))
+    client = FakeRedis()
+
+    CooldownService()._ensure_warm(db, client)
+
+    assert float(client.values[f'bgw:cooldown:{rule.id}']) == pytest.approx(time.time() - 3600, abs=5)
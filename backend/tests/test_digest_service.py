@@ -0,0 +1,75 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.models.alert_rule import AlertRule
+from app.models.digest_entry import DigestEntry
+from app.models.notification import Notification
+from app.services.digest_service import DigestService
+
+NOW = datetime(2024, 3, 1, 5, 30, tzinfo=timezone.utc)  # 08:30 по Москве
+
+
+def _rule(db, digest='hourly', enabled=True, channels=('telegram',)):
+    rule = AlertRule(name=f'Правило {digest}', conditions=[], channels=list(channels), digest=digest, enabled=enabled)
+    db.add(rule)
+    db.commit()
+    return rule
+
+
+def _entries(db, rule, count, created_at, event_id=None):
+    for i in range(count):
+        db.add(DigestEntry(
+            rule_id=rule.id,
+            event_id=event_id or uuid.uuid4(),
+            payload={'title': f'Игра {i}'},
+            created_at=created_at + timedelta(seconds=i)
+        ))
+    db.commit()
+
+
+def test_cutoffs_follow_timezone_and_daily_hour():
+    service = DigestService(tz='Europe/Moscow', daily_hour=9)
+
+    cutoffs = service.cutoffs(NOW)
+    assert cutoffs['hourly'] == datetime(2024, 3, 1, 5, 0, tzinfo=timezone.utc)
+    assert cutoffs['daily'] == datetime(2024, 2, 29, 6, 0, tzinfo=timezone.utc)
+
+    assert service.cutoffs(NOW + timedelta(hours=1))['daily'] == datetime(2024, 3, 1, 6, 0, tzinfo=timezone.utc)
+
+
+def test_flush_does_not_split_rule_across_batches(db):
+    hourly = _rule(db, channels=('telegram', 'webpush'))
+    daily = _rule(db, digest='daily')
+    _entries(db, hourly, 5, NOW - timedelta(hours=1))
+    _entries(db, hourly, 1, NOW - timedelta(minutes=10))  # текущий час
+    _entries(db, daily, 2, NOW - timedelta(days=1))
+
+    totals = DigestService(batch_size=3).flush(db, NOW)
+
+    assert totals == {'digests': 2, 'entries': 7, 'notifications': 3, 'dropped': 0}
+    by_rule = {}
+    for notification in db.query(Notification):
+        by_rule.setdefault(notification.rule_id, []).append(notification)
+    assert sorted(n.channel for n in by_rule[hourly.id]) == ['telegram', 'webpush']
+    assert {len(n.payload['items']) for n in by_rule[hourly.id]} == {5}
+    assert [len(n.payload['items']) for n in by_rule[daily.id]] == [2]
+    assert by_rule[daily.id][0].payload['digest'] == 'daily'
+    assert db.query(DigestEntry).count() == 1
+
+
+def test_flush_immediate_and_disabled_rules(db):
+    immediate = _rule(db, digest='immediate')
+    disabled = _rule(db, enabled=False)
+    event_id = uuid.uuid4()
+    # Повторные совпадения одного события дают одну строку сводки
+    _entries(db, immediate, 3, NOW - timedelta(minutes=5), event_id=event_id)
+    _entries(db, disabled, 2, NOW - timedelta(minutes=5))
+
+    totals = DigestService().flush(db, NOW)
+
+    assert totals == {'digests': 1, 'entries': 3, 'notifications': 1, 'dropped': 2}
+    [notification] = db.query(Notification).all()
+    assert notification.payload['digest'] == 'immediate'
+    assert len(notification.payload['items']) == 1
+    assert notification.meta['event_ids'] == [str(event_id)]
+    assert db.query(DigestEntry).count() == 0
@@ -0,0 +1,61 @@
+"""Тесты записи событий и истории цен."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.agents.base import ListingEventDraft
+from app.models.game import Game
+from app.models.listing_event import ListingEvent
+from app.models.price_history import PriceHistory
+from app.services.deduplication_service import calculate_signature_hash
+from app.services.event_service import event_service
+from app.services.game_matching_service import game_matching_service
+
+OBSERVED_AT = datetime(2024, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def game(db, monkeypatch):
+    game = Game(title='Каркассон')
+    db.add(game)
+    db.commit()
+
+    async def match_game(db, title, *args, **kwargs):
+        return game
+
+    monkeypatch.setattr(game_matching_service, 'match_game', match_game)
+    return game
+
+
+def _draft(**fields):
+    data = {'title': 'Каркассон', 'kind': 'discount', 'store_id': 'hobbygames', 'price': 1990.0}
+    data.update(fields)
+    return ListingEventDraft(**data)
+
+
+def test_signature_hash_day_bucket_follows_observed_at():
+    data = {'title': 'Каркассон', 'store_id': 'hobbygames', 'edition': None, 'price': 1990.0}
+
+    same_day = calculate_signature_hash(data, OBSERVED_AT + timedelta(hours=6))
+    assert calculate_signature_hash(data, OBSERVED_AT) == same_day
+    assert calculate_signature_hash(data, OBSERVED_AT - timedelta(days=1)) != same_day
+    assert calculate_signature_hash(data) != same_day
+
+
+async def test_reparse_does_not_duplicate_event_or_price_point(db, game):
+    first = await event_service.process_event(db, _draft(), 'hobbygames', observed_at=OBSERVED_AT, backfill=True)
+    again = await event_service.process_event(db, _draft(), 'hobbygames', observed_at=OBSERVED_AT, backfill=True)
+
+    assert first is not None
+    assert again is None
+    assert db.query(ListingEvent).count() == 1
+    assert db.query(PriceHistory).count() == 1
+
+
+async def test_one_price_point_per_game_store_and_time(db, game):
+    await event_service.process_event(db, _draft(), 'hobbygames', observed_at=OBSERVED_AT, backfill=True)
+    await event_service.process_event(db, _draft(edition='Big Box'), 'hobbygames', observed_at=OBSERVED_AT, backfill=True)
+    await event_service.process_event(db, _draft(), 'hobbygames', observed_at=OBSERVED_AT + timedelta(days=1), backfill=True)
+
+    assert db.query(ListingEvent).count() == 3
+    assert db.query(PriceHistory).count() == 2
@@ -0,0 +1,84 @@
+import pytest
+
+from app.agents.builtin.hobbygames import HobbyGamesCatalogNewAgent
+from app.agents.extraction import Extractor, KeywordTable, compile_simple_selector, merge_spec
+from app.agents.parsing import create_parser_backend
+
+CARDS = '''
+<div class="product-item">
+  <a class="product-item__link" href="/p/1"><span class="product-item__title">Каркассон</span></a>
+  <span class="product-item__price">1 490 ₽ -25%</span>
+  <span class="old-price">1 990 ₽</span>
+  <span class="product-item__label">Скидка</span>
+</div>
+<div class="product-item">
+  <a class="product-item__link" href="https://other.test/p/2"><span class="product-item__title">Манчкин</span></a>
+  <span class="product-item__price">990 ₽</span>
+  <span class="old-price">1 290 ₽</span>
+  <span class="product-item__label">Новинка</span>
+  <span class="stock">Нет в наличии</span>
+</div>
+<div class="product-item">
+  <span class="product-item__title">Эволюция</span>
+  <span class="product-item__label">Делюкс</span>
+</div>
+<div class="product-item"><span class="product-item__price">500 ₽</span></div>
+'''
+
+
+def _extract(spec, parser='lxml', html=CARDS):
+    backend = create_parser_backend(parser)
+    extractor = Extractor(merge_spec(spec), backend)
+    return extractor, list(extractor.extract(backend.parse(html)))
+
+
+def test_catalog_spec():
+    extractor, drafts = _extract(HobbyGamesCatalogNewAgent.EXTRACTION)
+
+    assert [draft.title for draft in drafts] == ['Каркассон', 'Манчкин', 'Эволюция']
+    first, second, third = drafts
+
+    assert (first.url, first.price, first.discount_pct, first.kind) == ('https://hobbygames.ru/p/1', 1490.0, 25.0, 'discount')
+    assert first.in_stock is True
+    # Скидка без процента в тексте считается по старой цене
+    assert (second.url, second.discount_pct, second.kind) == ('https://other.test/p/2', 23.26, 'release')
+    assert second.in_stock is False
+    assert (third.price, third.edition, third.kind) == (None, 'Делюкс', 'release')
+    assert extractor.stats['pages'] == 1
+    assert (extractor.stats['cards'], extractor.stats['items']) == (4, 3)
+
+
+@pytest.mark.parametrize('parser', ['bs4-lxml', 'html.parser'])
+def test_single_pass_matches_select_one(parser):
+    extractor, drafts = _extract(HobbyGamesCatalogNewAgent.EXTRACTION)
+    assert extractor.single_pass
+
+    other, expected = _extract(HobbyGamesCatalogNewAgent.EXTRACTION, parser)
+    assert not other.single_pass
+    assert drafts == expected
+
+
+def test_forced_in_stock_and_prefer_old_price():
+    spec = {**HobbyGamesCatalogNewAgent.EXTRACTION, 'in_stock': True, 'prefer_old_price': True}
+    _, drafts = _extract(spec)
+
+    assert {draft.in_stock for draft in drafts} == {True}
+    assert drafts[0].discount_pct == 25.13
+
+
+def test_keyword_table_priority():
+    table = KeywordTable({'preorder': ['предзаказ'], 'release': ['новинка', 'new'], 'empty': []})
+
+    assert table.first('новинка, предзаказ') == 'preorder'
+    assert table.first('new') == 'release'
+    assert table.first('скидка') is None
+    assert table.labels == ['preorder', 'release']
+
+
+def test_compile_simple_selector():
+    [selector] = compile_simple_selector('a.product-item__link[data-id=5]')
+    assert (selector.tag, selector.classes, selector.attrs) == ('a', frozenset({'product-item__link'}), (('data-id', '5'),))
+
+    assert len(compile_simple_selector('.price, .old-price')) == 2
+    assert compile_simple_selector('.card > .price') is None
+    assert compile_simple_selector('a:first-child') is None
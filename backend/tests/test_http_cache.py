@@ -0,0 +1,43 @@
+"""Кассета HTTP кэша контекста агента: запись и воспроизведение без сети."""
+from aiohttp import web
+
+from app.agents.base import RuntimeContext
+
+
+async def test_cache_only_replays_recorded_cassette(tmp_path):
+    hits = []
+
+    async def handler(request):
+        hits.append(request.path_qs)
+        return web.Response(text=f'<html><p>Игра {request.query["page"]}</p></html>', content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/catalog', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    urls = [f'http://127.0.0.1:{port}/catalog?page={page}' for page in (1, 2)]
+
+    async def fetch_all(mode):
+        async with RuntimeContext('agent', {}, {}, http_cache=mode, http_cache_dir=str(tmp_path)) as ctx:
+            bodies = []
+            for url in urls:
+                async with ctx.session.get(url) as response:
+                    bodies.append((response.status, await response.text()))
+            return bodies
+
+    try:
+        recorded = await fetch_all('record')
+    finally:
+        await runner.cleanup()
+
+    assert len(hits) == 2
+    assert (tmp_path / 'agent.json').exists()
+
+    replayed = await fetch_all('cache_only')
+
+    assert replayed == recorded
+    assert recorded[1] == (200, '<html><p>Игра 2</p></html>')
+    assert len(hits) == 2
@@ -0,0 +1,38 @@
+import random
+
+from app.services.keyword_matcher import KeywordMatcher
+
+
+def _normalize(text):
+    return text.casefold().replace('ё', 'е')
+
+
+def test_keyword_matcher_matches_naive_search():
+    rng = random.Random(7)
+    alphabet = 'абвгдеё'
+    matcher = KeywordMatcher()
+    owners = {}
+    for i in range(300):
+        keyword = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 5)))
+        matcher.add(keyword, i)
+        owners[i] = keyword
+
+    # Удаление части слов меняет автомат на месте
+    for i in rng.sample(sorted(owners), 100):
+        matcher.remove(owners.pop(i), i)
+
+    for _ in range(300):
+        text = ''.join(rng.choice(alphabet + 'ЕЁ ') for _ in range(rng.randint(0, 30)))
+        expected = {owner for owner, keyword in owners.items() if _normalize(keyword) in _normalize(text)}
+        assert matcher.search(text) == expected
+
+
+def test_keyword_matcher_empty_keyword_and_missing_text():
+    matcher = KeywordMatcher()
+    matcher.add('', 'always')
+    matcher.add('Ёж', 'hedgehog')
+
+    assert matcher.search('маленький ежик') == {'always', 'hedgehog'}
+    assert matcher.search('') == {'always'}
+    assert matcher.search(None) == set()
+    assert len(matcher) == 2
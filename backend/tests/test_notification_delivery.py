@@ -0,0 +1,138 @@
+"""Состояния записей outbox: забор, повтор, dead letter."""
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.notification import Notification
+from app.services import notification_delivery as delivery_module
+from app.services.notification_delivery import NotificationDelivery
+
+
+def _utc(value):
+    """SQLite возвращает время без часового пояса (записано в UTC)."""
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+class FakeChannel:
+    """Канал с поштучной отправкой: errors - ошибки по номерам payload."""
+
+    def __init__(self):
+        self.errors = {}
+        self.calls = []
+
+    async def send(self, payload):
+        self.calls.append(payload['n'])
+        if payload['n'] in self.errors:
+            raise RuntimeError(self.errors[payload['n']])
+        return True
+
+
+class BatchChannel(FakeChannel):
+    """Канал с send_batch: parts - номера сообщений, отправляемых до ошибки."""
+
+    def __init__(self):
+        super().__init__()
+        self.parts = {}
+
+    async def send_batch(self, payloads, sent_parts):
+        errors = []
+        for index, payload in enumerate(payloads):
+            self.calls.append(payload['n'])
+            sent_parts[index].update(self.parts.get(payload['n'], ()))
+            errors.append(self.errors.get(payload['n']))
+        return errors
+
+
+def _use_channel(monkeypatch, channel):
+    monkeypatch.setattr(delivery_module, 'get_notification_service', lambda db: SimpleNamespace(channels={'fake': channel}))
+    return channel
+
+
+@pytest.fixture
+def channel(monkeypatch):
+    return _use_channel(monkeypatch, FakeChannel())
+
+
+def _add(db, n, status='pending', attempts=0, due_in=timedelta(minutes=-1), meta=None, channel='fake'):
+    notification = Notification(
+        rule_id=uuid.uuid4(), event_id=uuid.uuid4(), status=status, channel=channel, payload={'n': n},
+        attempts=attempts, next_attempt_at=datetime.now(timezone.utc) + due_in, meta=meta or {}
+    )
+    db.add(notification)
+    db.commit()
+    return notification
+
+
+def test_claim_takes_due_rows_and_expired_leases(db):
+    due = [
+        _add(db, 1),
+        _add(db, 2, status='retry', attempts=1),
+        _add(db, 3, status='sending', attempts=1),  # аренда истекла
+    ]
+    _add(db, 4, status='retry', attempts=1, due_in=timedelta(minutes=5))
+    _add(db, 5, status='sending', attempts=1, due_in=timedelta(minutes=5))  # аренда идет
+    _add(db, 6, status='sent', attempts=1)
+    _add(db, 7, status='dead', attempts=5)
+    delivery = NotificationDelivery(lease_seconds=300)
+
+    started = datetime.now(timezone.utc)
+    claimed = delivery.claim(db)
+
+    assert sorted(notification.payload['n'] for notification in claimed) == [1, 2, 3]
+    for notification in due:
+        assert notification.status == 'sending'
+        assert _utc(notification.next_attempt_at) >= started + timedelta(seconds=300)
+    assert [notification.attempts for notification in due] == [1, 2, 2]
+    assert delivery.claim(db) == []
+
+
+def test_expired_lease_on_last_attempt_goes_dead(db):
+    notification = _add(db, 1, status='sending', attempts=3)
+
+    assert NotificationDelivery(max_attempts=3).claim(db) == []
+    assert notification.status == 'dead'
+    assert notification.last_error == 'Delivery lease expired'
+
+
+async def test_failed_delivery_is_retried_later_then_dead(db, channel):
+    delivery = NotificationDelivery(max_attempts=2, retry_base_seconds=60)
+    ok = _add(db, 1)
+    failing = _add(db, 2)
+    channel.errors = {2: 'Bad Gateway'}
+
+    started = datetime.now(timezone.utc)
+    assert await delivery.deliver(db, delivery.claim(db)) == {'sent': 1, 'retry': 1, 'dead': 0}
+    assert sorted(channel.calls) == [1, 2]
+    assert (ok.status, ok.last_error) == ('sent', None)
+    assert (failing.status, failing.last_error) == ('retry', 'Bad Gateway')
+    # Пауза 60 с с разбросом ±20%
+    assert _utc(failing.next_attempt_at) >= started + timedelta(seconds=48)
+    assert delivery.claim(db) == []
+
+    failing.next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.commit()
+    assert await delivery.deliver(db, delivery.claim(db)) == {'sent': 0, 'retry': 0, 'dead': 1}
+    assert (failing.status, failing.attempts) == ('dead', 2)
+
+
+async def test_unknown_channel_goes_dead(db, channel):
+    notification = _add(db, 1, channel='pigeon')
+    delivery = NotificationDelivery()
+
+    assert await delivery.deliver(db, delivery.claim(db)) == {'sent': 0, 'retry': 0, 'dead': 1}
+    assert notification.last_error == 'Unknown channel: pigeon'
+
+
+async def test_partial_failure_keeps_sent_parts(db, monkeypatch):
+    channel = _use_channel(monkeypatch, BatchChannel())
+    notification = _add(db, 1, meta={'digest': 'daily', 'sent_parts': [0]})
+    channel.parts = {1: [1, 2]}
+    channel.errors = {1: 'Bad Gateway'}
+    delivery = NotificationDelivery()
+
+    await delivery.deliver(db, delivery.claim(db))
+
+    assert notification.status == 'retry'
+    assert notification.meta == {'digest': 'daily', 'sent_parts': [0, 1, 2]}
@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import pytest
+
+from app.agents import base
+from app.agents.base import Fetched, HTMLAgent, RuntimeContext
+from app.agents.executor import ParseExecutor
+from app.services.deduplication_service import calculate_listing_state_hash
+
+START = 'https://store.test/catalog'
+
+
+def _page(*numbers):
+    return ''.join(
+        f'<div class="card"><a class="title" href="/p/{i}">Игра {i}</a><span class="price">{1000 + i} ₽</span></div>'
+        for i in numbers
+    )
+
+
+CATALOG = {
+    START: _page(1, 2),
+    f'{START}?page=2': _page(3, 4),
+    f'{START}?page=3': _page(5),
+}
+
+
+def _state(number, **fields):
+    return calculate_listing_state_hash({
+        'title': f'Игра {number}', 'store_id': 'store', 'price': 1000 + number, 'in_stock': True, **fields
+    })
+
+
+@pytest.fixture
+def crawl(monkeypatch):
+    monkeypatch.setattr(base, 'get_parse_executor', lambda: ParseExecutor(mode='inline'))
+    monkeypatch.setattr(base, 'get_raw_archive', lambda: None)
+
+    async def run(known, **pagination):
+        config = {
+            'start_urls': [START],
+            'extract': {'store_id': 'store', 'item': '.card', 'fields': {'title': '.title', 'price': '.price'}},
+            'pagination': {'template': '{url}?page={page}', 'max_pages': 5, 'concurrency': 1, **pagination},
+        }
+        agent = HTMLAgent(config, {}, RuntimeContext('store', config, {}, known_listings=known, http_cache='off'))
+        requested = []
+
+        async def fetch_page(url, **kwargs):
+            requested.append(url)
+            if url not in CATALOG:
+                return None
+            return Fetched(url=url, status=200, body=CATALOG[url], headers={}, fetched_at=datetime.now())
+
+        agent._fetch_page = fetch_page
+        drafts = await agent.run()
+        return requested, drafts
+
+    return run
+
+
+def test_listing_state_hash_ignores_time_and_noise():
+    assert _state(1) == calculate_listing_state_hash({
+        'title': 'Игра 1 — настольная игра', 'store_id': 'store', 'price': 1001.4, 'in_stock': True
+    })
+    assert _state(1) != _state(1, price=1101)
+    assert _state(1) != _state(1, in_stock=False)
+
+
+async def test_stops_on_page_with_only_known_listings(crawl):
+    requested, drafts = await crawl({_state(3), _state(4)})
+
+    assert requested == [START, f'{START}?page=2']
+    assert [draft.title for draft in drafts] == ['Игра 1', 'Игра 2', 'Игра 3', 'Игра 4']
+
+
+async def test_page_with_changed_listing_continues(crawl):
+    # Игра 4 известна с другой ценой - на странице есть изменение
+    requested, _ = await crawl({_state(3), _state(4, price=900)})
+
+    assert requested == [START, f'{START}?page=2', f'{START}?page=3', f'{START}?page=4']
+
+
+async def test_stop_on_seen_disabled(crawl):
+    requested, _ = await crawl({_state(3), _state(4)}, stop_on_seen=False)
+
+    assert requested[-1] == f'{START}?page=4'
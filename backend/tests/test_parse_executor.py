@@ -0,0 +1,92 @@
+import asyncio
+import multiprocessing
+import threading
+from datetime import datetime
+
+import pytest
+
+from app.agents.base import Fetched, HTMLAgent, RuntimeContext
+from app.agents import executor as executor_module
+from app.agents.executor import ParseExecutor, get_parse_executor, get_parse_spec, parse_in_worker
+
+CONFIG = {
+    'start_urls': ['https://store.test/catalog'],
+    'structured': False,
+    'extract': {
+        'store_id': 'store',
+        'item': '.card',
+        'fields': {'title': '.title', 'price': '.price'}
+    }
+}
+
+BODY = ''.join(
+    f'<div class="card"><a class="title" href="/p/{i}">Игра {i}</a><span class="price">{1000 + i} ₽</span></div>'
+    for i in range(5)
+)
+
+
+def _agent():
+    return HTMLAgent(CONFIG, {}, RuntimeContext('store', CONFIG, {}, http_cache='off'))
+
+
+def _fetched():
+    return Fetched(url='https://store.test/catalog', status=200, body=BODY, headers={}, fetched_at=datetime.now())
+
+
+def test_parse_in_worker_returns_stats_delta():
+    spec = get_parse_spec(_agent())
+
+    rows, stats = parse_in_worker(spec, 'https://store.test/catalog', 200, {}, BODY.encode())
+    assert len(rows) == 5
+    assert (stats['pages'], stats['cards'], stats['items']) == (1, 5, 5)
+
+    # Агент кэшируется в процессе пула: второй вызов возвращает только прирост
+    _, stats = parse_in_worker(spec, 'https://store.test/catalog', 200, {}, BODY.encode())
+    assert (stats['pages'], stats['items']) == (1, 5)
+
+
+async def test_process_pool_stats_reach_parent_extractor():
+    executor = ParseExecutor(mode='process', workers=1)
+    agent = _agent()
+    try:
+        drafts = await executor.parse(agent, _fetched())
+    finally:
+        executor.shutdown()
+
+    assert executor._disabled is False
+    assert [draft.title for draft in drafts] == [f'Игра {i}' for i in range(5)]
+    assert agent.extractor.stats['pages'] == 1
+    assert agent.extractor.stats['items'] == 5
+
+
+async def test_daemonic_process_parses_inline(monkeypatch):
+    monkeypatch.setattr(multiprocessing.current_process(), 'daemon', True, raising=False)
+    executor = ParseExecutor(mode='process', workers=1)
+
+    assert executor.pool is None
+    drafts = await executor.parse(_agent(), _fetched())
+    assert len(drafts) == 5
+
+
+def test_agents_in_threads_share_process_pool(monkeypatch):
+    """Воркер -P threads: агенты в потоках со своими циклами событий разбирают в общем пуле."""
+    monkeypatch.setattr(executor_module, '_parse_executor', ParseExecutor(mode='process', workers=1))
+    results = []
+
+    def run_agent():
+        agent = _agent()
+        drafts = asyncio.run(get_parse_executor().parse(agent, _fetched()))
+        results.append((len(drafts), agent.extractor.stats['items']))
+
+    threads = [threading.Thread(target=run_agent) for _ in range(3)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        executor = get_parse_executor()
+        assert executor._pool is not None and not executor._disabled
+    finally:
+        get_parse_executor().shutdown()
+
+    assert results == [(5, 5)] * 3
@@ -0,0 +1,14 @@
+from datetime import datetime, timedelta, timezone
+
+from app.tasks.reparse import _parse_time
+
+
+def test_time_without_offset_is_utc():
+    assert _parse_time('2024-03-01T12:00:00') == datetime(2024, 3, 1, 12, 0, tzinfo=timezone.utc)
+    assert _parse_time('2024-03-01') == datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def test_time_with_offset_is_kept():
+    parsed = _parse_time('2024-03-01T12:00:00+03:00')
+    assert parsed.utcoffset() == timedelta(hours=3)
+    assert parsed == datetime(2024, 3, 1, 9, 0, tzinfo=timezone.utc)
@@ -0,0 +1,132 @@
+import random
+import uuid
+from datetime import datetime
+
+from app.models.alert_rule import AlertRule
+from app.services.rule_engine import RuleEngine, RuleIndex, compile_rule
+
+STORES = ['hobbygames', 'lavkaigr', 'gaga', 'zvezda']
+KINDS = ['announce', 'preorder', 'release', 'discount', 'price']
+WORDS = ['каркассон', 'ёлка', 'елка', 'кот', 'котики', 'манчкин', 'deluxe', 'box', 'ка']
+
+
+def _normalize(text):
+    return text.casefold().replace('ё', 'е')
+
+
+def naive_condition(condition, record):
+    """Условие без компиляции, индексов и автоматов."""
+    name, op, value = condition['field'], condition['op'], condition['value']
+    current = record.get(name)
+    if op == 'in':
+        return current in value
+    if op in ('contains', 'contains_any'):
+        needles = [value] if op == 'contains' else value
+        return isinstance(current, str) and any(_normalize(needle) in _normalize(current) for needle in needles)
+    if current is None:
+        return False
+    if name in ('price', 'discount_pct'):
+        value = float(value)
+    return {'>=': current >= value, '<=': current <= value, '=': current == value}[op]
+
+
+def naive_matches(rule, record):
+    checks = [naive_condition(condition, record) for condition in rule.conditions]
+    return any(checks) if rule.logic == 'OR' else all(checks)
+
+
+def _random_condition(rng):
+    choice = rng.randrange(7)
+    if choice == 0:
+        return {'field': 'store_id', 'op': '=', 'value': rng.choice(STORES)}
+    if choice == 1:
+        return {'field': 'kind', 'op': 'in', 'value': rng.sample(KINDS, rng.randint(1, 3))}
+    if choice == 2:
+        return {'field': rng.choice(['title', 'game']), 'op': 'contains', 'value': rng.choice(WORDS).upper()}
+    if choice == 3:
+        return {'field': 'title', 'op': 'contains_any', 'value': rng.sample(WORDS, rng.randint(1, 3))}
+    if choice == 4:
+        return {'field': 'price', 'op': rng.choice(['<=', '>=']), 'value': str(rng.randrange(500, 5000, 250))}
+    if choice == 5:
+        return {'field': 'discount_pct', 'op': '>=', 'value': rng.randrange(5, 50, 5)}
+    return {'field': 'in_stock', 'op': '=', 'value': rng.random() < 0.5}
+
+
+def _random_title(rng):
+    return ' '.join(rng.choice(WORDS + ['игра', 'набор', 'Каркассон', 'КОТ']) for _ in range(rng.randint(1, 4)))
+
+
+def _random_record(rng):
+    return {
+        'game': _random_title(rng) if rng.random() < 0.7 else None,
+        'title': _random_title(rng),
+        'kind': rng.choice(KINDS),
+        'price': float(rng.randrange(100, 6000)) if rng.random() < 0.9 else None,
+        'discount_pct': float(rng.randrange(0, 60)) if rng.random() < 0.5 else None,
+        'store_id': rng.choice(STORES),
+        'store': None,
+        'in_stock': rng.choice([True, False, None]),
+    }
+
+
+def _rules(db, rng, count):
+    rules = []
+    for i in range(count):
+        rule = AlertRule(
+            id=uuid.uuid4(), name=f'rule-{i}', logic=rng.choice(['AND', 'AND', 'OR']),
+            conditions=[_random_condition(rng) for _ in range(rng.randint(1, 3))],
+            channels=['telegram'], enabled=True, created_at=datetime(2024, 1, 1, 0, 0, i % 60)
+        )
+        db.add(rule)
+        rules.append(rule)
+    db.commit()
+    return rules
+
+
+def test_engine_matches_naive_evaluation(db):
+    rng = random.Random(42)
+    rules = _rules(db, rng, 200)
+    engine = RuleEngine()
+
+    records = [_random_record(rng) for _ in range(300)]
+    matched = engine.match(db, [dict(record) for record in records])
+
+    for record, rules_matched in zip(records, matched):
+        expected = {rule.id for rule in rules if naive_matches(rule, record)}
+        assert {rule.id for rule in rules_matched} == expected
+    assert sum(map(len, matched)) > 0
+
+
+def test_index_narrows_candidates():
+    rules = [
+        AlertRule(id=1, name='hg', logic='AND', conditions=[{'field': 'store_id', 'op': '=', 'value': 'hobbygames'}]),
+        AlertRule(id=2, name='kinds', logic='AND', conditions=[{'field': 'kind', 'op': 'in', 'value': ['preorder', 'release']}]),
+        AlertRule(id=3, name='cat', logic='AND', conditions=[{'field': 'title', 'op': 'contains', 'value': 'кот'}]),
+        AlertRule(id=4, name='any', logic='OR', conditions=[{'field': 'store_id', 'op': '=', 'value': 'gaga'}]),
+    ]
+    compiled = [compile_rule(rule) for rule in rules]
+    index = RuleIndex.build(compiled)
+
+    assert compiled[0].index_key == ('store_id', frozenset({'hobbygames'}))
+    assert compiled[2].keyword_key == ('title', (3, 0))
+    assert [rule.id for rule in index.candidates({'store_id': 'lavkaigr', 'kind': 'price'})] == [4]
+    assert [rule.id for rule in index.candidates({'store_id': 'hobbygames', 'kind': 'release'}, {'title': {(3, 0)}})] == [1, 2, 3, 4]
+
+
+def test_refresh_recompiles_changed_rules(db):
+    rule = AlertRule(name='cat', conditions=[{'field': 'title', 'op': 'contains', 'value': 'кот'}], channels=['telegram'])
+    db.add(rule)
+    db.commit()
+    engine = RuleEngine()
+
+    assert [r.name for r in engine.match(db, [{'title': 'Взрывные котята'}])[0]] == ['cat']
+
+    rule.conditions = [{'field': 'title', 'op': 'contains', 'value': 'манчкин'}]
+    rule.updated_at = datetime(2024, 1, 2)
+    db.commit()
+    assert engine.match(db, [{'title': 'Взрывные котята'}]) == [[]]
+    assert len(engine.match(db, [{'title': 'Манчкин'}])[0]) == 1
+
+    rule.enabled = False
+    db.commit()
+    assert engine.match(db, [{'title': 'Манчкин'}]) == [[]]
@@ -0,0 +1,100 @@
+"""Расписания агентов в Celery Beat."""
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from celery.schedules import crontab, schedule as interval_schedule
+
+from app.celery_app import celery_app
+from app.scheduler import AgentScheduler, build_schedule
+
+
+def test_cron_schedule():
+    schedule = build_schedule({'cron': '15 */2 1 * 1-5'})
+
+    assert isinstance(schedule, crontab)
+    assert schedule.minute == {15}
+    assert schedule.hour == set(range(0, 24, 2))
+    assert schedule.day_of_month == {1}
+    assert schedule.day_of_week == {1, 2, 3, 4, 5}
+
+
+def test_interval_schedule():
+    schedule = build_schedule({'type': 'interval', 'value': 3600})
+
+    assert isinstance(schedule, interval_schedule)
+    assert schedule.run_every == timedelta(hours=1)
+
+
+@pytest.mark.parametrize('schedule, expected', [
+    ({'type': 'daily', 'time': '09:30'}, {}),
+    ({'type': 'weekly', 'time': '09:30', 'day_of_week': 3}, {'day_of_week': {3}}),
+    ({'type': 'monthly', 'time': '09:30', 'day_of_month': 15}, {'day_of_month': {15}}),
+])
+def test_calendar_schedules(schedule, expected):
+    result = build_schedule(schedule)
+
+    assert isinstance(result, crontab)
+    assert (result.hour, result.minute) == ({9}, {30})
+    for field, value in expected.items():
+        assert getattr(result, field) == value
+
+
+@pytest.mark.parametrize('schedule', [{}, {'type': 'hourly'}])
+def test_unknown_schedule_is_none(schedule):
+    assert build_schedule(schedule) is None
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    scheduler = AgentScheduler(app=celery_app, lazy=True)
+    scheduler.data = {}
+    scheduler.agents = []
+    monkeypatch.setattr(scheduler, '_load_agents', lambda: scheduler.agents)
+    return scheduler
+
+
+def _agent(agent_id, schedule):
+    return SimpleNamespace(id=agent_id, schedule=schedule)
+
+
+def test_invalid_schedules_are_skipped(scheduler):
+    scheduler.agents = [
+        _agent('bad-cron', {'cron': '0 */2 * *'}),
+        _agent('bad-time', {'type': 'daily', 'time': '9'}),
+        _agent('no-value', {'type': 'interval'}),
+        _agent('ok', {'type': 'interval', 'value': 60, 'jitter': 5}),
+    ]
+
+    scheduler._sync_agents(force=True)
+
+    agent_entries = [name for name in scheduler.data if name.startswith('agent:')]
+    assert agent_entries == ['agent:ok']
+    assert scheduler.data['agent:ok'].args == ('ok',)
+    assert scheduler._jitter == {'agent:ok': 5.0}
+
+
+def test_sync_drops_removed_agents_and_keeps_static_entries(scheduler):
+    scheduler.data['celery.backend_cleanup'] = scheduler.Entry(
+        name='celery.backend_cleanup', task='celery.backend_cleanup', schedule=crontab('0', '4', '*'), app=celery_app
+    )
+    scheduler.agents = [_agent('a', {'cron': '0 * * * *'}), _agent('b', {'type': 'daily', 'time': '09:00'})]
+    scheduler._sync_agents(force=True)
+    scheduler.data['agent:a'].total_run_count = 3
+
+    scheduler.agents = [_agent('a', {'cron': '0 * * * *'})]
+    scheduler._sync_agents()
+
+    assert set(scheduler.data) == {'celery.backend_cleanup', 'agent:a', *celery_app.conf.beat_schedule}
+    # Время и счетчик запусков оставшихся агентов сохраняются
+    assert scheduler.data['agent:a'].total_run_count == 3
+
+
+def test_unchanged_agents_are_not_reloaded(scheduler):
+    scheduler.agents = [_agent('a', {'cron': '0 * * * *'})]
+    scheduler._sync_agents(force=True)
+    entry = scheduler.data['agent:a']
+
+    scheduler._sync_agents()
+
+    assert scheduler.data['agent:a'] is entry
@@ -0,0 +1,88 @@
+import json
+from datetime import datetime
+
+from app.agents.base import Fetched, HTMLAgent, RuntimeContext
+from app.agents.builtin.hobbygames import HobbyGamesComingSoonAgent
+from app.agents.structured import StructuredExtractor
+
+PRODUCT = {
+    '@context': 'https://schema.org',
+    '@type': 'Product',
+    'name': 'Каркассон',
+    'url': '/p/carcassonne',
+    'offers': {'@type': 'Offer', 'price': '1990', 'availability': 'https://schema.org/OutOfStock'},
+}
+
+CARDS = ''.join(
+    f'<div class="product-item"><a class="product-item__link" href="/p/{i}">'
+    f'<span class="product-item__title">Игра {i}</span></a>'
+    f'<span class="product-item__price">{1000 + i} ₽</span>'
+    f'<span class="product-item__label">Предзаказ</span></div>'
+    for i in range(3)
+)
+
+
+def _json_ld(*blocks):
+    return ''.join(f'<script type="application/ld+json">{json.dumps(block)}</script>' for block in blocks)
+
+
+def _agent(cls, config):
+    return cls(config, {}, RuntimeContext('hobbygames', config, {}, http_cache='off'))
+
+
+def _fetched(body):
+    return Fetched(url='https://hobbygames.ru/coming-soon', status=200, body=body, headers={}, fetched_at=datetime.now())
+
+
+async def _extract(agent, body):
+    return [draft async for draft in agent.extract(_fetched(body))]
+
+
+def test_json_ld_product():
+    extractor = StructuredExtractor({'store_id': 'store', 'base_url': 'https://store.test'})
+
+    [draft] = extractor.extract(_json_ld(PRODUCT))
+    assert (draft.title, draft.price, draft.in_stock) == ('Каркассон', 1990.0, False)
+    assert draft.url == 'https://store.test/p/carcassonne'
+    assert draft.store_id == 'store'
+    assert extractor.stats == {'pages': 1, 'items': 1}
+
+
+def test_item_list_and_min_items():
+    item_list = {
+        '@type': 'ItemList',
+        'itemListElement': [{'@type': 'ListItem', 'item': {**PRODUCT, 'name': f'Игра {i}'}} for i in range(3)],
+    }
+    body = _json_ld(item_list)
+
+    assert len(StructuredExtractor({'min_items': 3}).extract(body)) == 3
+    assert StructuredExtractor({'min_items': 4}).extract(body) == []
+
+
+def test_next_data_items_path():
+    state = {'props': {'pageProps': {'catalog': {'items': [
+        {'title': 'Манчкин', 'price': {'current': 990, 'old': 1290}, 'link': '/p/munchkin'},
+    ]}}}}
+    body = f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(state)}</script>'
+    extractor = StructuredExtractor({'items_path': 'props.pageProps.catalog.items', 'base_url': 'https://store.test'})
+
+    [draft] = extractor.extract(body)
+    assert (draft.title, draft.price, draft.url) == ('Манчкин', 990.0, 'https://store.test/p/munchkin')
+
+
+def test_structured_is_opt_in_for_agents_with_extraction_spec():
+    assert _agent(HobbyGamesComingSoonAgent, {}).structured is None
+    assert _agent(HobbyGamesComingSoonAgent, {'structured': True}).structured is not None
+    assert _agent(HobbyGamesComingSoonAgent, {'structured': {'min_items': 5}}).structured.min_items == 5
+
+    # Без спецификации извлечения структурированные данные - единственный способ разбора
+    assert _agent(HTMLAgent, {'start_urls': []}).structured is not None
+    assert _agent(HTMLAgent, {'start_urls': [], 'structured': False}).structured is None
+
+
+async def test_json_ld_block_does_not_replace_css_extraction():
+    drafts = await _extract(_agent(HobbyGamesComingSoonAgent, {}), _json_ld(PRODUCT) + CARDS)
+
+    assert [draft.title for draft in drafts] == ['Игра 0', 'Игра 1', 'Игра 2']
+    assert {draft.kind for draft in drafts} == {'preorder'}
+    assert {draft.in_stock for draft in drafts} == {True}
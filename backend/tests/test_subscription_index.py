@@ -0,0 +1,120 @@
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from app.models.webpush_subscription import WebPushSubscription
+from app.services.subscription_index import SubscriptionIndex, normalize_preferences
+
+STORES = ['hobbygames', 'lavkaigr', 'gaga']
+KINDS = ['announce', 'preorder', 'release', 'discount', 'price']
+GAMES = [str(uuid.UUID(int=i)) for i in range(1, 5)]
+
+
+def naive_match(subscriptions, event_data):
+    """Подписки события проверкой предпочтений каждой подписки."""
+    matched = []
+    for subscription in subscriptions:
+        preferences = normalize_preferences(subscription.data)
+        checks = [
+            (preferences.stores, event_data.get('store_id')),
+            (preferences.kinds, event_data['kind'].lower() if event_data.get('kind') else None),
+            (preferences.games, event_data.get('game_id')),
+        ]
+        if any(values and (value is None or str(value) not in values) for values, value in checks):
+            continue
+        price = event_data.get('price')
+        if preferences.max_price is not None and price is not None and float(price) > preferences.max_price:
+            continue
+        matched.append(subscription.endpoint)
+    return sorted(matched)
+
+
+def _preferences(rng):
+    preferences = {}
+    if rng.random() < 0.6:
+        preferences['stores'] = rng.sample(STORES, rng.randint(1, 2))
+    if rng.random() < 0.5:
+        preferences['kinds'] = [kind.upper() for kind in rng.sample(KINDS, rng.randint(1, 3))]
+    if rng.random() < 0.3:
+        preferences['games'] = rng.sample(GAMES, rng.randint(1, 2))
+    if rng.random() < 0.5:
+        preferences['max_price'] = rng.choice([1000, 2500, '4000', 'дешево'])
+    return {'preferences': preferences} if rng.random() < 0.9 else {}
+
+
+def _event(rng):
+    return {
+        'store_id': rng.choice(STORES),
+        'kind': rng.choice(KINDS + ['Discount', 'PREORDER']),
+        'game_id': rng.choice(GAMES + [None]),
+        'price': rng.choice([None, 500, 1000, 1000.01, 3000, 5000]),
+    }
+
+
+def _check(index, db, rng):
+    active = db.query(WebPushSubscription).filter(WebPushSubscription.is_active == True).all()
+    for _ in range(300):
+        event_data = _event(rng)
+        assert sorted(info['endpoint'] for info in index.match(event_data)) == naive_match(active, event_data)
+
+
+def test_match_equals_naive_filtering_across_refreshes(db):
+    rng = random.Random(3)
+    subscriptions = [
+        WebPushSubscription(
+            user_agent='test', endpoint=f'https://push.test/{i}', p256dh_key='key', auth_key='auth',
+            data=_preferences(rng), is_active=rng.random() < 0.9, updated_at=datetime(2024, 1, 1)
+        )
+        for i in range(150)
+    ]
+    db.add_all(subscriptions)
+    db.commit()
+
+    index = SubscriptionIndex()
+    index.refresh(db)
+    assert len(index) == sum(subscription.is_active for subscription in subscriptions)
+    _check(index, db, rng)
+
+    # Изменения, отключения и новые подписки применяются к индексу на месте
+    for subscription in rng.sample(subscriptions, 40):
+        subscription.data = _preferences(rng)
+        subscription.is_active = rng.random() < 0.8
+        subscription.updated_at = datetime(2024, 1, 2)
+    db.add(WebPushSubscription(
+        user_agent='test', endpoint='https://push.test/new', p256dh_key='key', auth_key='auth', data={},
+        updated_at=datetime(2024, 1, 3)
+    ))
+    db.commit()
+
+    index.refresh(db)
+    assert len(index) == db.query(WebPushSubscription).filter(WebPushSubscription.is_active == True).count()
+    _check(index, db, rng)
+
+
+def test_refresh_skips_unchanged_signature(db, monkeypatch):
+    db.add(WebPushSubscription(user_agent='test', endpoint='https://push.test/1', p256dh_key='k', auth_key='a', data={}))
+    db.commit()
+    index = SubscriptionIndex()
+    index.refresh(db)
+
+    added = []
+    monkeypatch.setattr(index, '_add', added.append)
+    index.refresh(db)
+    assert added == []
+    assert len(index.match({'store_id': 'gaga', 'kind': 'price'})) == 1
+
+
+def test_kind_is_case_insensitive_on_both_sides(db):
+    db.add_all([
+        WebPushSubscription(user_agent='test', endpoint='https://push.test/upper', p256dh_key='k', auth_key='a',
+                            data={'preferences': {'kinds': ['DISCOUNT']}}),
+        WebPushSubscription(user_agent='test', endpoint='https://push.test/lower', p256dh_key='k', auth_key='a',
+                            data={'preferences': {'kinds': ['discount']}}),
+    ])
+    db.commit()
+    index = SubscriptionIndex()
+    index.refresh(db)
+
+    for kind in ('discount', 'Discount'):
+        assert len(index.match({'kind': kind})) == 2
+    assert index.match({'kind': 'release'}) == []
@@ -0,0 +1,88 @@
+from app.agents.base import PageResult
+from app.models import CrawlState, SourceAgent
+from app.tasks import agents as agent_tasks
+
+URL = 'https://store.test/catalog'
+
+
+class FakeAgent:
+    """Агент, возвращающий заданные страницы без сети."""
+
+    pages_to_return = []
+
+    def __init__(self, config, secrets, ctx):
+        self.config_updates = {}
+        self.pages = []
+
+    async def run(self):
+        self.pages = list(self.pages_to_return)
+        return [event for page in self.pages for event in page.events]
+
+
+def _agent(db):
+    agent = SourceAgent(id='fake', name='Fake', type='html', schedule={}, rate_limit={}, config={'start_urls': [URL]})
+    db.add(agent)
+    db.commit()
+    db.add(CrawlState(source_id='fake', url=URL, content_hash='old-hash', etag='"old"', last_modified='Mon',
+                      change_ewma=0.5, change_rate=0.0, fetch_count=1, change_count=0))
+    db.commit()
+    return agent
+
+
+def _state(db):
+    db.expire_all()
+    return db.query(CrawlState).filter_by(source_id='fake', url=URL).one()
+
+
+def test_failed_parse_keeps_previous_validators(db, monkeypatch):
+    agent = _agent(db)
+    monkeypatch.setattr(FakeAgent, 'pages_to_return', [
+        PageResult(url=URL, hash='new-hash', etag='"new"', last_modified='Tue', failed=True)
+    ])
+
+    result = agent_tasks._run_agent(db, agent, FakeAgent)
+
+    assert result['status'] == 'completed'
+    state = _state(db)
+    assert (state.content_hash, state.etag, state.last_modified) == ('old-hash', '"old"', 'Mon')
+    assert state.fetch_count == 2
+
+
+def test_failed_event_keeps_previous_validators(db, monkeypatch):
+    agent = _agent(db)
+    monkeypatch.setattr(FakeAgent, 'pages_to_return', [
+        PageResult(url=URL, hash='new-hash', etag='"new"', events=[object()])
+    ])
+
+    async def fail(db, draft, source_id, **kwargs):
+        raise RuntimeError('database is gone')
+    monkeypatch.setattr(agent_tasks.event_service, 'process_event', fail)
+
+    agent_tasks._run_agent(db, agent, FakeAgent)
+
+    assert _state(db).content_hash == 'old-hash'
+
+
+def test_failed_save_keeps_previous_validators(db, monkeypatch):
+    agent = _agent(db)
+    monkeypatch.setattr(FakeAgent, 'pages_to_return', [PageResult(url=URL, hash='new-hash', etag='"new"')])
+
+    async def fail(db, events):
+        raise RuntimeError('database is gone')
+    monkeypatch.setattr(agent_tasks.event_service, 'check_notification_rules_batch', fail)
+
+    agent_tasks._run_agent(db, agent, FakeAgent)
+
+    assert _state(db).content_hash == 'old-hash'
+
+
+def test_parsed_page_saves_validators(db, monkeypatch):
+    agent = _agent(db)
+    monkeypatch.setattr(FakeAgent, 'pages_to_return', [
+        PageResult(url=URL, hash='new-hash', etag='"new"', last_modified='Tue')
+    ])
+
+    agent_tasks._run_agent(db, agent, FakeAgent)
+
+    state = _state(db)
+    assert (state.content_hash, state.etag, state.last_modified) == ('new-hash', '"new"', 'Tue')
@@ -0,0 +1,107 @@
+import re
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core.config import settings
+from app.models.notification import Notification
+from app.services.notification_delivery import NotificationDelivery
+from app.services.notification_service import TelegramChannel
+from app.services.telegram_service import build_digests, format_digest, telegram_sender
+
+
+def _event(i, store='Hobby Games', kind='discount'):
+    return {'title': f'Игра {i}', 'url': f'https://store.test/p/{i}', 'price': 1000 + i, 'store_name': store, 'kind': kind}
+
+
+def _rule_digest(count):
+    return {'digest': 'daily', 'rule_id': 'rule', 'rule_name': 'Скидки', 'items': [_event(i) for i in range(count)]}
+
+
+class FakeSender:
+    """Отправленные сообщения; fail - номера вызовов, которые завершатся ошибкой."""
+
+    def __init__(self):
+        self.messages = []
+        self.calls = 0
+        self.fail = set()
+
+    async def send_message(self, api_url, chat_id, text):
+        self.calls += 1
+        if self.calls in self.fail:
+            raise RuntimeError('Bad Gateway')
+        self.messages.append(text)
+
+
+@pytest.fixture
+def sender(monkeypatch):
+    sender = FakeSender()
+    monkeypatch.setattr(telegram_sender, 'send_message', sender.send_message)
+    monkeypatch.setattr(settings, 'TELEGRAM_BOT_TOKEN', 'token')
+    monkeypatch.setattr(settings, 'TELEGRAM_CHAT_ID', 'chat')
+    return sender
+
+
+def test_build_digests_includes_each_notification_once():
+    payloads = [_event(i, store=f'Магазин {i % 2}', kind=('discount', 'release')[i % 3 == 0]) for i in range(60)]
+
+    digests = build_digests(payloads, limit=600)
+
+    assert len(digests) > 4
+    assert all(len(text) <= 600 for text, _ in digests)
+    assert sorted(index for _, indexes in digests for index in indexes) == list(range(60))
+    for text, indexes in digests:
+        assert {payloads[index]['store_name'] for index in indexes} == {re.search(r'Магазин \d', text).group()}
+
+
+def test_format_digest_splits_long_digest():
+    messages = format_digest(_rule_digest(40), limit=700)
+
+    assert len(messages) > 1
+    assert all(len(text) <= 700 for text in messages)
+    assert all(text.startswith('📬 <b>Скидки</b> — сводка за день (40)') for text in messages)
+    assert sum(text.count('• ') for text in messages) == 40
+
+
+def test_format_digest_truncates_overlong_line():
+    digest = {'digest': 'hourly', 'rule_name': 'R', 'items': [{'title': 'А' * 5000, 'store_name': 'S'}]}
+
+    [text] = format_digest(digest, limit=1000)
+    assert len(text) <= 1000
+
+
+async def test_send_batch_resends_only_unsent_digest_parts(sender):
+    channel = TelegramChannel()
+    payload = _rule_digest(150)
+    parts = len(format_digest(payload))
+    assert parts > 2
+
+    sender.fail = {2}
+    sent_parts = [set()]
+    assert (await channel.send_batch([payload], sent_parts))[0] == 'Bad Gateway'
+    assert sent_parts == [set(range(parts)) - {1}]
+
+    assert await channel.send_batch([payload], sent_parts) == [None]
+    assert sent_parts == [set(range(parts))]
+    assert sender.messages == [format_digest(payload)[part] for part in [0, *range(2, parts), 1]]
+
+
+async def test_delivery_keeps_sent_parts_between_attempts(db, sender):
+    payload = _rule_digest(150)
+    parts = len(format_digest(payload))
+    notification = Notification(
+        rule_id=uuid.uuid4(), event_id=uuid.uuid4(), status='sending', channel='telegram',
+        payload=payload, attempts=1, next_attempt_at=datetime.now(timezone.utc), meta={'digest': 'daily'}
+    )
+    db.add(notification)
+    db.commit()
+    delivery = NotificationDelivery()
+
+    sender.fail = {parts}
+    assert await delivery.deliver(db, [notification]) == {'sent': 0, 'retry': 1, 'dead': 0}
+    assert notification.meta == {'digest': 'daily', 'sent_parts': list(range(parts - 1))}
+
+    notification.attempts += 1
+    assert await delivery.deliver(db, [notification]) == {'sent': 1, 'retry': 0, 'dead': 0}
+    assert sender.messages == format_digest(payload)